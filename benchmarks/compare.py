@@ -0,0 +1,89 @@
+"""
+Compare two benchmark result files written by benchmarks/run_benchmarks.py.
+
+Usage:
+    $ python benchmarks/compare.py baseline.json current.json --threshold 1.2
+"""
+
+import argparse
+import json
+import sys
+
+# Fields identifying the same benchmark case in two runs
+KEY_FIELDS = ("benchmark", "algorithm", "mode", "pages", "images")
+
+
+def _case_key(record):
+    """
+    Build the key identifying a benchmark case.
+    """
+    return tuple(record.get(field) for field in KEY_FIELDS)
+
+
+def _describe(key):
+    """
+    Format a benchmark case key for display.
+    """
+    return " ".join(f"{field}={value}" for field, value in zip(KEY_FIELDS, key) if value is not None)
+
+
+def compare(baseline, current, threshold):
+    """
+    Compare minimum wall times and peak RSS of matching benchmark cases.
+
+    Args:
+        baseline (dict): Results of the baseline run.
+        current (dict): Results of the current run.
+        threshold (float): Ratio of current to baseline time considered a regression.
+
+    Returns:
+        tuple: (lines, regressions) with one formatted line per case and the number of regressions.
+    """
+    baseline_cases = {_case_key(record): record for record in baseline["results"]}
+    lines = []
+    regressions = 0
+    for record in current["results"]:
+        key = _case_key(record)
+        previous = baseline_cases.get(key)
+        if previous is None or not previous["min_seconds"]:
+            lines.append(f"  new        {_describe(key)}")
+            continue
+        time_ratio = record["min_seconds"] / previous["min_seconds"]
+        rss_ratio = record["peak_rss_bytes"] / previous["peak_rss_bytes"] if previous["peak_rss_bytes"] else 0
+        regressed = time_ratio > threshold
+        regressions += regressed
+        lines.append(f"{'! ' if regressed else '  '}x{time_ratio:6.2f} time  x{rss_ratio:6.2f} RSS  {_describe(key)}")
+    return lines, regressions
+
+
+def main(argv=None):
+    """
+    Command line entry point of the comparison.
+
+    Args:
+        argv (list): Command line arguments, sys.argv when None (default: None).
+
+    Returns:
+        int: Exit code, 1 when any benchmark regressed beyond the threshold.
+    """
+    parser = argparse.ArgumentParser(description="Compare two benchmark result files.")
+    parser.add_argument("baseline", help="Results of the baseline run")
+    parser.add_argument("current", help="Results of the current run")
+    parser.add_argument("--threshold", type=float, default=1.2,
+                        help="Ratio of current to baseline time reported as a regression")
+    args = parser.parse_args(argv)
+
+    with open(args.baseline, encoding="utf-8") as baseline_file:
+        baseline = json.load(baseline_file)
+    with open(args.current, encoding="utf-8") as current_file:
+        current = json.load(current_file)
+
+    print(f"Baseline {baseline['environment'].get('commit')} vs current {current['environment'].get('commit')}")
+    lines, regressions = compare(baseline, current, args.threshold)
+    print("\n".join(lines))
+    print(f"{regressions} regression(s) beyond x{args.threshold}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
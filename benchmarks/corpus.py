@@ -0,0 +1,111 @@
+"""
+Module generating synthetic PDF documents for benchmarks.
+
+Documents are written object by object straight to disk, so even multi-hundred-megabyte
+files can be generated without holding them in memory.
+"""
+
+import os
+
+# Width in pixels of the grayscale images embedded in pages
+IMAGE_WIDTH = 1024
+
+# Size of the chunks of random image data written at once
+_CHUNK_SIZE = 1024 * 1024
+
+
+class _PdfFileWriter:
+    """
+    Minimal PDF writer tracking object offsets for the cross-reference table.
+    """
+
+    def __init__(self, output_file):
+        """
+        Initialize the writer.
+
+        Args:
+            output_file: File opened in binary write mode.
+        """
+        self.output_file = output_file
+        self.offsets = {}
+        self.position = 0
+
+    def write(self, data):
+        """
+        Write raw bytes and advance the current position.
+        """
+        self.output_file.write(data)
+        self.position += len(data)
+
+    def begin_object(self, number):
+        """
+        Record the offset of an object and write its header.
+        """
+        self.offsets[number] = self.position
+        self.write(f"{number} 0 obj\n".encode("ascii"))
+
+    def write_object(self, number, body):
+        """
+        Write a complete object with the given body.
+        """
+        self.begin_object(number)
+        self.write(body.encode("latin-1") + b"\nendobj\n")
+
+
+def write_synthetic_pdf(path, pages=1, image_bytes=0):
+    """
+    Write a synthetic PDF document with text on every page and an optional random image per page.
+
+    Args:
+        path (str): Path where the document will be saved.
+        pages (int): Number of pages (default: 1).
+        image_bytes (int): Size of the uncompressed grayscale image on every page,
+            no images when 0 (default: 0).
+
+    Returns:
+        str: Path to the generated document.
+    """
+    image_height = max(1, image_bytes // IMAGE_WIDTH) if image_bytes else 0
+    objects_per_page = 3 if image_bytes else 2
+    first_page = 4
+    page_numbers = [first_page + index * objects_per_page for index in range(pages)]
+
+    with open(path, "wb") as output_file:
+        writer = _PdfFileWriter(output_file)
+        writer.write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+        writer.write_object(1, "<< /Type /Catalog /Pages 2 0 R >>")
+        kids = " ".join(f"{number} 0 R" for number in page_numbers)
+        writer.write_object(2, f"<< /Type /Pages /Kids [{kids}] /Count {pages} >>")
+        writer.write_object(3, "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+
+        for index, number in enumerate(page_numbers):
+            resources = "/Font << /F1 3 0 R >>"
+            content = f"BT /F1 24 Tf 72 720 Td (Synthetic page {index + 1}) Tj ET"
+            if image_bytes:
+                resources += f" /XObject << /Im1 {number + 2} 0 R >>"
+                content += f"\nq 468 0 0 600 72 72 cm /Im1 Do Q"
+            writer.write_object(number, f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+                                        f"/Resources << {resources} >> /Contents {number + 1} 0 R >>")
+            writer.write_object(number + 1, f"<< /Length {len(content)} >>\nstream\n{content}\nendstream")
+
+            if image_bytes:
+                length = IMAGE_WIDTH * image_height
+                writer.begin_object(number + 2)
+                writer.write(f"<< /Type /XObject /Subtype /Image /Width {IMAGE_WIDTH} /Height {image_height} "
+                             f"/ColorSpace /DeviceGray /BitsPerComponent 8 /Length {length} >>\n"
+                             f"stream\n".encode("ascii"))
+                remaining = length
+                while remaining:
+                    chunk = os.urandom(min(_CHUNK_SIZE, remaining))
+                    writer.write(chunk)
+                    remaining -= len(chunk)
+                writer.write(b"\nendstream\nendobj\n")
+
+        xref_offset = writer.position
+        size = max(writer.offsets) + 1
+        writer.write(f"xref\n0 {size}\n0000000000 65535 f \n".encode("ascii"))
+        for number in range(1, size):
+            writer.write(f"{writer.offsets[number]:010d} 00000 n \n".encode("ascii"))
+        writer.write(f"trailer\n<< /Size {size} /Root 1 0 R >>\nstartxref\n{xref_offset}\n%%EOF\n".encode("ascii"))
+
+    return path
@@ -0,0 +1,141 @@
+"""
+Benchmark guarding the startup time of the command line interface.
+
+Each case starts a fresh interpreter and measures its wall time, the minimum of the
+repeats is compared against a budget. It also checks that importing the CLI loads none
+of the heavy dependencies, which would be the usual cause of a regression.
+
+Usage:
+    $ python benchmarks/import_time.py --repeat 10 --budget 0.1 --output import_time.json
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.measure import environment
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules that must only be imported by the subcommands needing them
+HEAVY_MODULES = ("PyQt5", "PyPDF2", "cryptography", "psutil", "pyudev")
+
+# Interpreter arguments of each case, the bare interpreter is the reference
+CASES = {
+    "interpreter": ["-c", "pass"],
+    "import_cli": ["-c", "import pades_signer.cli"],
+    "cli_help": ["-m", "pades_signer", "--help"],
+}
+
+
+def _run(arguments):
+    """
+    Start an interpreter and measure its wall time in seconds.
+    """
+    start = time.perf_counter()
+    subprocess.run([sys.executable, *arguments], cwd=ROOT, check=True, stdout=subprocess.DEVNULL)
+    return time.perf_counter() - start
+
+
+def measure(repeat):
+    """
+    Measure the startup time of every case.
+
+    Args:
+        repeat (int): Number of interpreter starts per case.
+
+    Returns:
+        list: One record per case with its wall times and their minimum.
+    """
+    records = []
+    for name, arguments in CASES.items():
+        _run(arguments)
+        durations = [_run(arguments) for _ in range(repeat)]
+        records.append({"benchmark": name, "durations": durations, "min": min(durations)})
+    return records
+
+
+# Code run in a fresh interpreter for each invocation checked for heavy imports, the
+# output of the CLI is discarded so that only the list of loaded modules is printed
+_HEAVY_IMPORTS_CODE = """
+import contextlib, io, json, runpy, sys
+sys.argv = {argv!r}
+with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+    try:
+        {statement}
+    except SystemExit:
+        pass
+print(json.dumps([module for module in {modules!r} if module in sys.modules]))
+"""
+
+# Invocations that must not load any heavy module
+IMPORT_CHECKS = {
+    "import_cli": (["-c"], "import pades_signer.cli"),
+    "cli_help": (["pades_signer", "--help"], "runpy.run_module('pades_signer', run_name='__main__')"),
+}
+
+
+def heavy_imports():
+    """
+    List heavy modules loaded by importing the CLI and by printing its help.
+
+    Returns:
+        dict: Names of the heavy modules found in sys.modules of a fresh interpreter, by invocation.
+    """
+    loaded = {}
+    for name, (argv, statement) in IMPORT_CHECKS.items():
+        code = _HEAVY_IMPORTS_CODE.format(argv=argv, statement=statement, modules=HEAVY_MODULES)
+        output = subprocess.run([sys.executable, "-c", code], cwd=ROOT, check=True, capture_output=True, text=True)
+        loaded[name] = json.loads(output.stdout)
+    return loaded
+
+
+def main(argv=None):
+    """
+    Command line entry point of the startup benchmark.
+
+    Args:
+        argv (list): Command line arguments, sys.argv when None (default: None).
+
+    Returns:
+        int: Exit code, 1 when the CLI starts slower than the budget or imports heavy modules.
+    """
+    parser = argparse.ArgumentParser(description="Measure and guard the startup time of the CLI.")
+    parser.add_argument("--repeat", type=int, default=10, help="Interpreter starts per case")
+    parser.add_argument("--budget", type=float, default=0.1,
+                        help="Maximum startup time of the CLI above the bare interpreter, in seconds")
+    parser.add_argument("--output", help="JSON file for the results")
+    args = parser.parse_args(argv)
+
+    records = measure(args.repeat)
+    reference = records[0]["min"]
+    failures = []
+    for record in records:
+        record["overhead"] = record["min"] - reference
+        print(f"{record['benchmark']:<12} {record['min'] * 1000:8.1f} ms  (+{record['overhead'] * 1000:.1f} ms)")
+        if record["overhead"] > args.budget:
+            failures.append(f"{record['benchmark']} takes {record['overhead']:.3f}s over the interpreter, "
+                            f"budget {args.budget:.3f}s")
+
+    loaded = heavy_imports()
+    for name, modules in loaded.items():
+        if modules:
+            failures.append(f"{name} loads {', '.join(modules)}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as output_file:
+            json.dump({"environment": environment(), "budget": args.budget, "heavy_imports": loaded,
+                       "results": records}, output_file, indent=2)
+
+    for failure in failures:
+        print(f"FAILED {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,99 @@
+"""
+Module with measurement helpers shared by the benchmarks.
+"""
+
+import multiprocessing
+import platform
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+
+def peak_rss_bytes():
+    """
+    Return the peak resident set size of the current process.
+
+    Returns:
+        int: Peak RSS in bytes.
+    """
+    # Linux keeps ru_maxrss across fork and exec, a child started by a large process would
+    # report the peak of its parent; VmHWM belongs to the address space of this process
+    try:
+        with open("/proc/self/status", "r", encoding="ascii") as status:
+            for line in status:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux reports kilobytes, macOS reports bytes
+        return peak if sys.platform == "darwin" else peak * 1024
+    except ImportError:
+        import psutil
+        return psutil.Process().memory_info().peak_wset
+
+
+def _timed(function, args, repeat, warmup):
+    """
+    Call a function repeatedly and measure it, executed in a child process by run_isolated.
+    """
+    for _ in range(warmup):
+        function(*args)
+    baseline = peak_rss_bytes()
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(*args)
+        durations.append(time.perf_counter() - start)
+    return durations, baseline, peak_rss_bytes()
+
+
+def run_isolated(function, args=(), repeat=1, warmup=0):
+    """
+    Run a function in a fresh process, so its peak memory is not affected by earlier measurements.
+
+    Args:
+        function (callable): Module-level function to measure.
+        args (tuple): Arguments passed to the function (default: ()).
+        repeat (int): Number of measured calls (default: 1).
+        warmup (int): Number of unmeasured calls made first, e.g. to fill caches (default: 0).
+
+    Returns:
+        dict: Wall times of the calls, their total and minimum, calls per second,
+            peak RSS of the process and its growth during the calls.
+    """
+    context = multiprocessing.get_context("spawn")
+    with context.Pool(1) as pool:
+        durations, baseline, peak = pool.apply(_timed, (function, args, repeat, warmup))
+    total = sum(durations)
+    return {
+        "wall_seconds": round(total, 6),
+        "min_seconds": round(min(durations), 6),
+        "ops_per_second": round(repeat / total, 3) if total else None,
+        "peak_rss_bytes": peak,
+        "peak_rss_growth_bytes": peak - baseline,
+    }
+
+
+def environment():
+    """
+    Describe the environment of a benchmark run, so results can be compared across commits.
+
+    Returns:
+        dict: Commit, timestamp, Python version and platform.
+    """
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+                                check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "commit": commit,
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": multiprocessing.cpu_count(),
+    }
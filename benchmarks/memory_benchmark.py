@@ -0,0 +1,155 @@
+"""
+Benchmark comparing peak memory of buffered, streaming and mapped document reading.
+
+Every measurement runs in a fresh process, so the reported peak RSS growth belongs
+to a single strategy and a single document size. Streaming hashing should stay flat,
+while buffering the whole document grows with its size. Parsing a document from its
+path copies it into memory, parsing it from a mapping only reads the parts it needs.
+
+Usage:
+    $ python benchmarks/memory_benchmark.py --sizes 16 64 256 --output memory.json
+"""
+
+import argparse
+import hashlib
+import io
+import json
+import os
+import sys
+import tempfile
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.corpus import write_synthetic_pdf
+from benchmarks.measure import run_isolated
+from PyPDF2 import PdfReader
+from pades_signer.hashing import CHUNK_SIZE, hash_byte_ranges, hash_file
+from pades_signer.mapped_io import open_pdf, release_pdf
+
+
+def _hash_buffered(path):
+    """
+    Hash a document the way the signer used to, through an in-memory copy of it.
+    """
+    with open(path, "rb") as pdf_file:
+        temp_stream = io.BytesIO(pdf_file.read())
+    return hashlib.sha256(temp_stream.getvalue()).digest()
+
+
+def _hash_read(path):
+    """
+    Hash a document through a reusable read buffer, the way files that cannot be mapped are hashed.
+    """
+    hasher = hashlib.sha256()
+    buffer = bytearray(CHUNK_SIZE)
+    view = memoryview(buffer)
+    with open(path, "rb") as pdf_file:
+        while read := pdf_file.readinto(buffer):
+            hasher.update(view[:read])
+    return hasher.digest()
+
+
+def _inspect(reader):
+    """
+    Read what signing incrementally needs from a parsed document: trailer, metadata and page count.
+    """
+    return reader.trailer["/Size"], reader.metadata, len(reader.pages)
+
+
+def _parse_buffered(path):
+    """
+    Parse a document from its path, which reads it into memory.
+    """
+    return _inspect(PdfReader(path))
+
+
+def _parse_mapped(path):
+    """
+    Parse a document from a read-only mapping of its file.
+    """
+    reader = open_pdf(path)
+    try:
+        return _inspect(reader)
+    finally:
+        release_pdf(reader)
+
+
+def _hash_byte_ranges(path):
+    """
+    Hash a document through signed byte ranges excluding a gap in the middle, like a /Contents value.
+    """
+    size = os.path.getsize(path)
+    middle = size // 2
+    return hash_byte_ranges(path, [0, middle, middle + 1024, size - middle - 1024])
+
+
+STRATEGIES = {
+    "buffered": _hash_buffered,
+    "streaming_read": _hash_read,
+    "streaming": hash_file,
+    "byte_range": _hash_byte_ranges,
+    "parse_buffered": _parse_buffered,
+    "parse_mapped": _parse_mapped,
+}
+
+
+def run(sizes_mb, workdir):
+    """
+    Measure every hashing strategy on documents of the given sizes.
+
+    Args:
+        sizes_mb (list): Document sizes in megabytes.
+        workdir (str): Directory for generated documents.
+
+    Returns:
+        list: One dictionary per measurement with strategy, size, seconds and peak RSS growth.
+    """
+    results = []
+    for size_mb in sizes_mb:
+        path = write_synthetic_pdf(os.path.join(workdir, f"document_{size_mb}mb.pdf"),
+                                   image_bytes=size_mb * 1024 * 1024)
+        file_size = os.path.getsize(path)
+        for strategy, function in STRATEGIES.items():
+            measurement = run_isolated(function, (path,))
+            duration = measurement["wall_seconds"]
+            results.append({
+                "strategy": strategy,
+                "file_size": file_size,
+                "seconds": round(duration, 4),
+                "mb_per_second": round(file_size / duration / 1024 / 1024, 1) if duration else None,
+                "peak_rss_growth": measurement["peak_rss_growth_bytes"],
+            })
+        os.remove(path)
+    return results
+
+
+def main(argv=None):
+    """
+    Command line entry point of the memory benchmark.
+
+    Args:
+        argv (list): Command line arguments, sys.argv when None (default: None).
+
+    Returns:
+        int: Exit code.
+    """
+    parser = argparse.ArgumentParser(description="Compare peak memory of buffered, streaming and mapped reading.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[16, 64, 256], help="Document sizes in MB")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        results = run(args.sizes, workdir)
+
+    for result in results:
+        print(f"{result['strategy']:>14}  {result['file_size'] / 1024 / 1024:8.1f} MB  "
+              f"{result['seconds']:8.3f}s  peak RSS +{result['peak_rss_growth'] / 1024 / 1024:8.1f} MB")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as output_file:
+            json.dump(results, output_file, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
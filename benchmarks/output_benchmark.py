@@ -0,0 +1,126 @@
+"""
+Benchmark measuring the throughput of writing signed documents per durability level.
+
+Every document is written in small pieces, the way PDF serialization writes, once
+straight into the target file as the signer used to, and once through AtomicOutput
+at every durability level. Flushing to the device is what the levels differ in, so
+the directory should be on the filesystem the documents are signed on: tmpfs and
+some containers acknowledge fsync without writing anything.
+
+Usage:
+    $ python benchmarks/output_benchmark.py --sizes 1 16 64 --directory /media/usb --output output.json
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.measure import environment
+from common.atomic_output import DURABILITY_LEVELS, AtomicOutput
+
+# Size of the pieces documents are written in
+WRITE_SIZE = 4096
+
+
+def _write_pieces(output_file, data):
+    """
+    Write data in WRITE_SIZE pieces.
+    """
+    view = memoryview(data)
+    for offset in range(0, len(data), WRITE_SIZE):
+        output_file.write(view[offset:offset + WRITE_SIZE])
+
+
+def _write_direct(path, data):
+    """
+    Write a document straight into its target with default buffering, the way the signer used to.
+    """
+    with open(path, "wb") as output_file:
+        _write_pieces(output_file, data)
+
+
+def _writer(durability):
+    """
+    Create a function writing a document through AtomicOutput with a durability level.
+    """
+    def write(path, data):
+        with AtomicOutput(path, durability) as output_file:
+            _write_pieces(output_file, data)
+    return write
+
+
+STRATEGIES = {"direct": _write_direct}
+STRATEGIES.update({f"atomic_{durability}": _writer(durability) for durability in DURABILITY_LEVELS})
+
+
+def run(sizes_mb, files, directory):
+    """
+    Measure every write strategy on documents of the given sizes.
+
+    Args:
+        sizes_mb (list): Document sizes in megabytes.
+        files (int): Number of documents written per strategy and size.
+        directory (str): Directory the documents are written to.
+
+    Returns:
+        list: One dictionary per measurement with strategy, size, time per file and throughput.
+    """
+    results = []
+    for size_mb in sizes_mb:
+        data = os.urandom(size_mb * 1024 * 1024)
+        for strategy, function in STRATEGIES.items():
+            paths = [os.path.join(directory, f"{strategy}_{index}.pdf") for index in range(files)]
+            start = time.perf_counter()
+            for path in paths:
+                function(path, data)
+            duration = time.perf_counter() - start
+            for path in paths:
+                os.remove(path)
+            results.append({
+                "strategy": strategy,
+                "file_size": len(data),
+                "files": files,
+                "ms_per_file": round(duration / files * 1000, 3),
+                "mb_per_second": round(len(data) * files / duration / 1024 / 1024, 1),
+            })
+    return results
+
+
+def main(argv=None):
+    """
+    Command line entry point of the output benchmark.
+
+    Args:
+        argv (list): Command line arguments, sys.argv when None (default: None).
+
+    Returns:
+        int: Exit code.
+    """
+    parser = argparse.ArgumentParser(description="Measure the throughput of writing documents per durability level.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 16, 64], help="Document sizes in MB")
+    parser.add_argument("--files", type=int, default=10, help="Documents written per strategy and size")
+    parser.add_argument("--directory", default=".", help="Directory on the filesystem to measure")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory(dir=args.directory) as workdir:
+        results = run(args.sizes, args.files, workdir)
+
+    for result in results:
+        print(f"{result['strategy']:>16}  {result['file_size'] / 1024 / 1024:6.1f} MB  "
+              f"{result['ms_per_file']:9.3f} ms/file  {result['mb_per_second']:8.1f} MB/s")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as output_file:
+            json.dump({"environment": environment(), "directory": os.path.abspath(args.directory),
+                       "results": results}, output_file, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,220 @@
+"""
+Benchmark suite measuring signing, verification and key handling throughput.
+
+A synthetic corpus from a single page up to thousands of pages, with and without
+images, is generated first. Every benchmark then runs in a fresh process for every
+signature algorithm and records wall time, docs/sec and peak RSS. Results are
+written as JSON together with the commit they were measured on, see
+benchmarks/compare.py for comparing two runs.
+
+Usage:
+    $ python benchmarks/run_benchmarks.py --pages 1 10 100 1000 5000 --repeat 3 --output results.json
+"""
+
+import argparse
+import functools
+import json
+import os
+import sys
+import tempfile
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cryptography.hazmat.primitives import serialization
+from benchmarks.corpus import write_synthetic_pdf
+from benchmarks.measure import environment, run_isolated
+from key_manager import key_generator
+from key_manager.algorithms import ALGORITHMS
+from pades_signer.pdf_signer import PDFSigner
+from pades_signer.signature_verifier import SignatureVerifier
+
+BENCHMARK_PIN = "1234"
+
+# Signing modes: rewritten document, incremental update and detached signature file
+MODES = ("legacy", "incremental", "detached")
+
+
+@functools.lru_cache(maxsize=None)
+def _signer(private_key_pem):
+    """
+    Create a signer once per process, so key parsing is not part of the measured signing time.
+    """
+    return PDFSigner(private_key_pem)
+
+
+@functools.lru_cache(maxsize=None)
+def _verifier(public_key_pem):
+    """
+    Create a verifier once per process, so key parsing is not part of the measured verification time.
+    """
+    return SignatureVerifier(serialization.load_pem_public_key(public_key_pem))
+
+
+def sign_document(private_key_pem, pdf_path, output_path, mode):
+    """
+    Benchmark case: sign a document with PDFSigner.sign_document, or PDFSigner.sign_detached
+    writing the signature to output_path in the detached mode.
+    """
+    signer = _signer(private_key_pem)
+    if mode == "detached":
+        signer.sign_detached(pdf_path, "Benchmark", output_path)
+    else:
+        signer.sign_document(pdf_path, output_path, "Benchmark", incremental=mode == "incremental")
+
+
+def verify_signature(public_key_pem, pdf_path, signature_path, mode):
+    """
+    Benchmark case: verify a signed document with SignatureVerifier.verify_signature,
+    or SignatureVerifier.verify_detached in the detached mode.
+
+    Raises:
+        ValueError: When the signature is not valid, so broken results never look fast.
+    """
+    verifier = _verifier(public_key_pem)
+    if mode == "detached":
+        is_valid, message = verifier.verify_detached(pdf_path, signature_path)
+    else:
+        is_valid, message = verifier.verify_signature(signature_path)
+    if not is_valid:
+        raise ValueError(message)
+
+
+def decrypt_private_key(encrypted_key, pin):
+    """
+    Benchmark case: decrypt a private key with decrypt_private_key.
+    """
+    key_generator.decrypt_private_key(encrypted_key, pin)
+
+
+def generate_key_pair(algorithm):
+    """
+    Benchmark case: generate a key pair with KeyGenerator.generate_key_pair.
+    """
+    key_generator.KeyGenerator(algorithm).generate_key_pair()
+
+
+def _prepare_keys(algorithm):
+    """
+    Generate the key pair used by the signing and verification benchmarks.
+
+    Args:
+        algorithm (str): Identifier of the signature algorithm.
+
+    Returns:
+        tuple: (private_key_pem, public_key_pem, encrypted_key).
+    """
+    generator = key_generator.KeyGenerator(algorithm)
+    private_key, public_key = generator.generate_key_pair()
+    private_key_pem = private_key.private_bytes(
+        encoding=serialization.Encoding.PEM,
+        format=serialization.PrivateFormat.PKCS8,
+        encryption_algorithm=serialization.NoEncryption()
+    )
+    public_key_pem = public_key.public_bytes(
+        encoding=serialization.Encoding.PEM,
+        format=serialization.PublicFormat.SubjectPublicKeyInfo
+    )
+    return private_key_pem, public_key_pem, generator.encrypt_private_key(BENCHMARK_PIN)
+
+
+def _record(name, measurement, **params):
+    """
+    Build a result record from a measurement, reporting calls per second as docs/sec.
+    """
+    record = {"benchmark": name}
+    record.update(params)
+    record.update(measurement)
+    record["docs_per_second"] = record.pop("ops_per_second")
+    return record
+
+
+def run(pages_list, image_bytes, repeat, key_repeat, workdir, algorithms=tuple(ALGORITHMS), report=print):
+    """
+    Generate the corpus and run all benchmarks.
+
+    Document benchmarks make one unmeasured call first, so signer and verifier
+    setup is not attributed to the measured documents.
+
+    Args:
+        pages_list (list): Page counts of the generated documents.
+        image_bytes (int): Size of the image on every page of the documents with images.
+        repeat (int): Number of calls per document benchmark.
+        key_repeat (int): Number of calls per key benchmark.
+        workdir (str): Directory for generated and signed documents.
+        algorithms (tuple): Identifiers of the signature algorithms to measure (default: all).
+        report (callable): Called with a one-line description of every result (default: print).
+
+    Returns:
+        list: Result records.
+    """
+    keys = {algorithm: _prepare_keys(algorithm) for algorithm in algorithms}
+    results = []
+
+    def add(record):
+        results.append(record)
+        report(f"{record['benchmark']:<20} {record['algorithm']:<11} {record.get('mode', ''):<12} "
+               f"pages={record.get('pages', '-'):<6} "
+               f"images={str(record.get('images', '-')):<5} {record['min_seconds']:9.4f}s "
+               f"{record['docs_per_second'] or 0:9.2f}/s  peak RSS {record['peak_rss_bytes'] / 1024 / 1024:8.1f} MB")
+
+    for pages in pages_list:
+        for images in (False, True):
+            name = f"corpus_{pages}p_{'img' if images else 'txt'}"
+            pdf_path = write_synthetic_pdf(os.path.join(workdir, f"{name}.pdf"), pages,
+                                           image_bytes if images else 0)
+            params = {"pages": pages, "images": images, "file_size": os.path.getsize(pdf_path)}
+
+            for algorithm, (private_key_pem, public_key_pem, _) in keys.items():
+                for mode in MODES:
+                    output_path = os.path.join(workdir, f"{name}_{algorithm}_{mode}.pdf")
+                    measurement = run_isolated(sign_document, (private_key_pem, pdf_path, output_path, mode),
+                                               repeat, warmup=1)
+                    add(_record("sign_document", measurement, algorithm=algorithm, mode=mode, **params))
+
+                    measurement = run_isolated(verify_signature, (public_key_pem, pdf_path, output_path, mode),
+                                               repeat, warmup=1)
+                    add(_record("verify_signature", measurement, algorithm=algorithm, mode=mode, **params))
+                    os.remove(output_path)
+            os.remove(pdf_path)
+
+    for algorithm, (_, _, encrypted_key) in keys.items():
+        add(_record("decrypt_private_key", run_isolated(decrypt_private_key, (encrypted_key, BENCHMARK_PIN),
+                                                        key_repeat), algorithm=algorithm))
+        add(_record("generate_key_pair", run_isolated(generate_key_pair, (algorithm,), key_repeat),
+                    algorithm=algorithm))
+    return results
+
+
+def main(argv=None):
+    """
+    Command line entry point of the benchmark suite.
+
+    Args:
+        argv (list): Command line arguments, sys.argv when None (default: None).
+
+    Returns:
+        int: Exit code.
+    """
+    parser = argparse.ArgumentParser(description="Benchmark signing, verification and key handling.")
+    parser.add_argument("--pages", type=int, nargs="+", default=[1, 10, 100, 1000, 5000],
+                        help="Page counts of the generated documents")
+    parser.add_argument("--image-bytes", type=int, default=64 * 1024,
+                        help="Size of the image on every page of documents with images")
+    parser.add_argument("--repeat", type=int, default=3, help="Calls per document benchmark")
+    parser.add_argument("--key-repeat", type=int, default=3, help="Calls per key benchmark")
+    parser.add_argument("--algorithms", nargs="+", choices=list(ALGORITHMS), default=list(ALGORITHMS),
+                        help="Signature algorithms to measure")
+    parser.add_argument("--output", default="bench_results.json", help="JSON file for the results")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        results = run(args.pages, args.image_bytes, args.repeat, args.key_repeat, workdir, args.algorithms)
+
+    with open(args.output, "w", encoding="utf-8") as output_file:
+        json.dump({"environment": environment(), "results": results}, output_file, indent=2)
+    print(f"Results written to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
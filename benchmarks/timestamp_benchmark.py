@@ -0,0 +1,106 @@
+"""
+Benchmark measuring the latency timestamping adds per signature.
+
+Signatures are timestamped one request each and as one batched request over a Merkle
+root, through a pooled client. The local authority is used unless a URL is given, so
+by default the numbers show the cost of the client and the authority without network
+round trips; against a remote authority every saved request saves a round trip.
+
+Usage:
+    $ python benchmarks/timestamp_benchmark.py --batch-sizes 1 10 100 1000 --output timestamps.json
+"""
+
+import argparse
+import json
+import os
+import secrets
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.measure import environment
+from pades_signer.local_tsa import LocalTSA
+from pades_signer.timestamping import TimestampClient, signature_imprint
+
+
+def measure(client, batch_size, repeat):
+    """
+    Measure timestamping a batch of random signatures with single and batched requests.
+
+    Args:
+        client (TimestampClient): Client of the authority.
+        batch_size (int): Number of signatures per batch.
+        repeat (int): Number of measured batches per mode.
+
+    Returns:
+        list: One record per mode with the minimum batch time and the time per signature.
+    """
+    digests = [signature_imprint(secrets.token_bytes(256)) for _ in range(batch_size)]
+    modes = {
+        "single": lambda: [client.timestamp(digest) for digest in digests],
+        "batched": lambda: client.timestamp_batch(digests),
+    }
+    records = []
+    for mode, function in modes.items():
+        requests = client.requests
+        durations = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            function()
+            durations.append(time.perf_counter() - start)
+        records.append({"benchmark": mode, "batch_size": batch_size, "min_seconds": min(durations),
+                        "ms_per_signature": min(durations) / batch_size * 1000,
+                        "requests_per_batch": (client.requests - requests) // repeat})
+    return records
+
+
+def main(argv=None):
+    """
+    Command line entry point of the timestamp benchmark.
+
+    Args:
+        argv (list): Command line arguments, sys.argv when None (default: None).
+
+    Returns:
+        int: Exit code.
+    """
+    parser = argparse.ArgumentParser(description="Measure the latency of timestamping signatures.")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 10, 100, 1000],
+                        help="Number of signatures per batch")
+    parser.add_argument("--repeat", type=int, default=3, help="Measured batches per mode and size")
+    parser.add_argument("--url", help="Time-stamping authority to measure instead of the local one")
+    parser.add_argument("--output", help="JSON file for the results")
+    args = parser.parse_args(argv)
+
+    authority = None
+    if args.url:
+        client = TimestampClient(args.url)
+    else:
+        authority = LocalTSA()
+        client = TimestampClient(authority.serve(), certificates=[authority.certificate])
+
+    records = []
+    try:
+        client.timestamp(signature_imprint(b"warm-up"))
+        for batch_size in args.batch_sizes:
+            for record in measure(client, batch_size, args.repeat):
+                records.append(record)
+                print(f"{record['benchmark']:<8} batch={batch_size:<6} {record['min_seconds']:9.4f}s "
+                      f"{record['ms_per_signature']:8.3f} ms/signature  "
+                      f"{record['requests_per_batch']} requests")
+    finally:
+        client.close()
+        if authority:
+            authority.shutdown()
+    print(f"Connections opened: {client.connections}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as output_file:
+            json.dump({"environment": environment(), "authority": args.url or "local",
+                       "connections": client.connections, "results": records}, output_file, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,222 @@
+"""
+Module writing output files atomically, through a large buffer and a temporary file.
+
+The data is written to a temporary file in the directory of the target and renamed over
+the target only once it is complete, so a crash or a full disk never leaves a truncated
+signed document or key file behind: the target is either the previous file or the new
+one. Writes go through a single large buffer, which turns the many small writes of PDF
+serialization into a few large ones, what network filesystems and USB flash need.
+
+How much survives a power loss is set by the durability level:
+    none       the rename is atomic for running processes, but the operating system may
+               still hold the data in its cache, after a power loss the target may be
+               empty or the previous file.
+    fsync      the data is flushed to the device before the rename, so the target never
+               refers to unwritten data.
+    fsync+dir  the directory is flushed after the rename as well, so the new target
+               itself survives a power loss. Directories cannot be flushed on Windows,
+               there this level equals fsync.
+"""
+
+import os
+import secrets
+from common.instrumentation import stage
+
+DURABILITY_NONE = "none"
+DURABILITY_FSYNC = "fsync"
+DURABILITY_FSYNC_DIR = "fsync+dir"
+DURABILITY_LEVELS = (DURABILITY_NONE, DURABILITY_FSYNC, DURABILITY_FSYNC_DIR)
+
+# Size of the write buffer of output files
+OUTPUT_BUFFER_SIZE = 1024 * 1024
+
+
+def check_durability(durability):
+    """
+    Check a durability level.
+
+    Args:
+        durability (str): One of DURABILITY_LEVELS.
+
+    Returns:
+        str: The durability level.
+
+    Raises:
+        ValueError: When the level is not known.
+    """
+    if durability not in DURABILITY_LEVELS:
+        raise ValueError(f"Unknown durability level {durability}, expected one of {', '.join(DURABILITY_LEVELS)}")
+    return durability
+
+
+def sync_directory(directory):
+    """
+    Flush the entries of a directory to the device, so a file renamed into it survives a power loss.
+
+    Args:
+        directory (str): Path to the directory.
+    """
+    # Directories cannot be opened as files on Windows
+    if os.name == "nt":
+        return
+    descriptor = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(descriptor)
+    finally:
+        os.close(descriptor)
+
+
+class AtomicOutput:
+    """
+    Binary output file replacing its target atomically once it is complete.
+
+    Used as a context manager, it returns the buffered temporary file, which replaces the
+    target when the block completes and is removed when the block raises:
+
+        with AtomicOutput("signed.pdf") as output_file:
+            output_file.write(data)
+
+    Attributes:
+        path (str): Path to the target file.
+        durability (str): Durability level, one of DURABILITY_LEVELS.
+        temp_path (str): Path to the temporary file while it is written, None otherwise.
+        file: Buffered temporary file while it is written, None otherwise.
+    """
+
+    def __init__(self, path, durability=DURABILITY_FSYNC, buffer_size=OUTPUT_BUFFER_SIZE):
+        """
+        Initialize the output file, nothing is created before open is called.
+
+        Args:
+            path (str): Path to the target file.
+            durability (str): Durability level, one of DURABILITY_LEVELS (default: DURABILITY_FSYNC).
+            buffer_size (int): Size of the write buffer in bytes (default: OUTPUT_BUFFER_SIZE).
+
+        Raises:
+            ValueError: When the durability level is not known.
+        """
+        self.path = path
+        self.durability = check_durability(durability)
+        self.buffer_size = buffer_size
+        self.temp_path = None
+        self.file = None
+
+    def open(self):
+        """
+        Create the temporary file next to the target, so it can be renamed over it.
+
+        Returns:
+            BufferedWriter: The temporary file.
+        """
+        directory, name = os.path.split(os.path.abspath(self.path))
+        while True:
+            temp_path = os.path.join(directory, f".{name}.{secrets.token_hex(4)}.tmp")
+            try:
+                # Created with the permissions a regular open would give the target
+                descriptor = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, "O_BINARY", 0),
+                                     0o666)
+                break
+            except FileExistsError:
+                continue
+        self.temp_path = temp_path
+        self.file = os.fdopen(descriptor, "wb", buffering=self.buffer_size)
+        return self.file
+
+    @classmethod
+    def resume(cls, path, temp_path, durability=DURABILITY_FSYNC, buffer_size=OUTPUT_BUFFER_SIZE):
+        """
+        Reopen a temporary file left by detach for updating it in place before it is committed.
+
+        Args:
+            path (str): Path to the target file.
+            temp_path (str): Temporary file returned by detach.
+            durability (str): Durability level, one of DURABILITY_LEVELS (default: DURABILITY_FSYNC).
+            buffer_size (int): Size of the write buffer in bytes (default: OUTPUT_BUFFER_SIZE).
+
+        Returns:
+            AtomicOutput: Output whose file is the temporary file opened for reading and writing.
+
+        Raises:
+            OSError: When the temporary file no longer exists.
+        """
+        output = cls(path, durability, buffer_size)
+        output.file = open(temp_path, "r+b", buffering=buffer_size)
+        output.temp_path = temp_path
+        return output
+
+    def detach(self):
+        """
+        Close the temporary file without renaming it, so it can be completed later with resume.
+
+        Returns:
+            str: Path to the temporary file, the caller is responsible for removing it.
+        """
+        temp_path = self.temp_path
+        try:
+            self.file.close()
+        except BaseException:
+            self.abort()
+            raise
+        self.file = None
+        self.temp_path = None
+        return temp_path
+
+    def commit(self):
+        """
+        Flush the temporary file and rename it over the target.
+        """
+        with stage("output.commit", durability=self.durability) as commit:
+            try:
+                self.file.flush()
+                commit.add_bytes(self.file.tell())
+                if self.durability != DURABILITY_NONE:
+                    os.fsync(self.file.fileno())
+                self.file.close()
+                os.replace(self.temp_path, self.path)
+            except BaseException:
+                self.abort()
+                raise
+            if self.durability == DURABILITY_FSYNC_DIR:
+                sync_directory(os.path.dirname(os.path.abspath(self.path)))
+        self.file = None
+        self.temp_path = None
+
+    def abort(self):
+        """
+        Remove the temporary file, leaving the target untouched.
+        """
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+        if self.temp_path is not None:
+            try:
+                os.remove(self.temp_path)
+            except FileNotFoundError:
+                pass
+            self.temp_path = None
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.commit()
+        else:
+            self.abort()
+
+
+def write_atomic(path, data, durability=DURABILITY_FSYNC):
+    """
+    Replace a file with data atomically.
+
+    Args:
+        path (str): Path to the file.
+        data (bytes): Data to be written.
+        durability (str): Durability level, one of DURABILITY_LEVELS (default: DURABILITY_FSYNC).
+
+    Returns:
+        str: Path to the file.
+    """
+    with AtomicOutput(path, durability) as output_file:
+        output_file.write(data)
+    return path
@@ -0,0 +1,294 @@
+"""
+Module providing per-stage timers and byte counters for signing, verification and key handling.
+
+Code is instrumented with the stage context manager. Every finished stage is reported
+as a StageEvent to the registered hooks, which can be any callables: MetricsCollector
+aggregates events for Prometheus, JsonLogHook writes them as JSON lines. Without hooks
+stage returns a shared no-op object, so instrumentation costs a single check.
+
+Usage:
+    collector = MetricsCollector()
+    with hooks_installed(collector):
+        PDFSigner(private_key_pem).sign_document("input.pdf", "signed.pdf", "John Doe")
+    print(collector.prometheus_text())
+"""
+
+import json
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+# Registered hooks, replaced as a whole so readers never see a partial update
+_hooks = ()
+_hooks_lock = threading.Lock()
+
+
+class StageEvent:
+    """
+    Measurement of a single finished stage.
+
+    Attributes:
+        name (str): Stage name, e.g. 'sign.serialize_hash'.
+        seconds (float): Wall time of the stage.
+        bytes (int): Number of bytes processed by the stage, 0 when not counted.
+        labels (dict): Additional labels given to the stage, e.g. the algorithm.
+        error (str): Name of the exception raised in the stage, None when it succeeded.
+        timestamp (float): Time the stage finished, as returned by time.time().
+    """
+
+    def __init__(self, name, seconds, bytes_count=0, labels=None, error=None):
+        """
+        Initialize the stage event.
+
+        Args:
+            name (str): Stage name.
+            seconds (float): Wall time of the stage.
+            bytes_count (int): Number of bytes processed by the stage (default: 0).
+            labels (dict): Additional labels (default: None).
+            error (str): Name of the exception raised in the stage (default: None).
+        """
+        self.name = name
+        self.seconds = seconds
+        self.bytes = bytes_count
+        self.labels = labels or {}
+        self.error = error
+        self.timestamp = time.time()
+
+    def to_dict(self):
+        """
+        Convert the event to JSON-serializable values.
+
+        Returns:
+            dict: Event fields.
+        """
+        return {
+            "stage": self.name,
+            "seconds": self.seconds,
+            "bytes": self.bytes,
+            "labels": self.labels,
+            "error": self.error,
+            "timestamp": self.timestamp,
+        }
+
+
+class _Stage:
+    """
+    Running stage measured for the registered hooks.
+    """
+
+    def __init__(self, name, labels, hooks):
+        self.name = name
+        self.labels = labels
+        self.hooks = hooks
+        self.bytes = 0
+        self._start = None
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        event = StageEvent(self.name, time.perf_counter() - self._start, self.bytes, self.labels,
+                           exc_type.__name__ if exc_type else None)
+        for hook in self.hooks:
+            try:
+                hook(event)
+            except Exception:
+                # A failing hook must never break signing or verification
+                pass
+        return False
+
+    def add_bytes(self, count):
+        """
+        Count bytes processed by the stage.
+
+        Args:
+            count (int): Number of bytes.
+        """
+        self.bytes += count
+
+
+class _NullStage:
+    """
+    Stage used when no hooks are registered, it measures nothing.
+    """
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+    def add_bytes(self, count):
+        pass
+
+
+_NULL_STAGE = _NullStage()
+
+
+def stage(name, **labels):
+    """
+    Measure a stage of work.
+
+    Args:
+        name (str): Stage name, dotted by operation, e.g. 'verify.hash'.
+        **labels: Additional labels reported with the event.
+
+    Returns:
+        Context manager whose add_bytes method counts processed bytes.
+    """
+    hooks = _hooks
+    if not hooks:
+        return _NULL_STAGE
+    return _Stage(name, labels, hooks)
+
+
+def enabled():
+    """
+    Check whether any hook is registered.
+
+    Returns:
+        bool: True when stages are measured.
+    """
+    return bool(_hooks)
+
+
+def add_hook(hook):
+    """
+    Register a hook called with a StageEvent after every stage, from the thread running it.
+
+    Args:
+        hook (callable): Hook to register.
+    """
+    global _hooks
+    with _hooks_lock:
+        _hooks = _hooks + (hook,)
+
+
+def remove_hook(hook):
+    """
+    Unregister a hook, nothing happens when it is not registered.
+
+    Args:
+        hook (callable): Hook to unregister.
+    """
+    global _hooks
+    with _hooks_lock:
+        _hooks = tuple(registered for registered in _hooks if registered is not hook)
+
+
+@contextmanager
+def hooks_installed(*hooks):
+    """
+    Register hooks for the duration of a with block.
+
+    Args:
+        *hooks (callable): Hooks to register.
+    """
+    for hook in hooks:
+        add_hook(hook)
+    try:
+        yield
+    finally:
+        for hook in hooks:
+            remove_hook(hook)
+
+
+class MetricsCollector:
+    """
+    Hook aggregating stage events into counters per stage.
+    """
+
+    def __init__(self):
+        """
+        Initialize an empty collector.
+        """
+        self._lock = threading.Lock()
+        # stage name -> [count, errors, seconds total, seconds max, bytes total]
+        self._stages = {}
+
+    def __call__(self, event):
+        with self._lock:
+            totals = self._stages.setdefault(event.name, [0, 0, 0.0, 0.0, 0])
+            totals[0] += 1
+            totals[1] += 1 if event.error else 0
+            totals[2] += event.seconds
+            totals[3] = max(totals[3], event.seconds)
+            totals[4] += event.bytes
+
+    def snapshot(self):
+        """
+        Get the aggregated measurements.
+
+        Returns:
+            dict: Per stage name: count, errors, seconds_total, seconds_mean, seconds_max and bytes_total.
+        """
+        with self._lock:
+            return {
+                name: {
+                    "count": count,
+                    "errors": errors,
+                    "seconds_total": seconds_total,
+                    "seconds_mean": seconds_total / count,
+                    "seconds_max": seconds_max,
+                    "bytes_total": bytes_total,
+                }
+                for name, (count, errors, seconds_total, seconds_max, bytes_total) in sorted(self._stages.items())
+            }
+
+    def reset(self):
+        """
+        Discard all aggregated measurements.
+        """
+        with self._lock:
+            self._stages = {}
+
+    def prometheus_text(self, prefix="pades"):
+        """
+        Export the measurements in the Prometheus text exposition format.
+
+        Args:
+            prefix (str): Prefix of the metric names (default: "pades").
+
+        Returns:
+            str: Metrics labelled by stage.
+        """
+        metrics = [
+            ("stage_calls_total", "counter", "Number of finished stages.", "count"),
+            ("stage_errors_total", "counter", "Number of stages that raised an exception.", "errors"),
+            ("stage_seconds_total", "counter", "Total wall time spent in stages.", "seconds_total"),
+            ("stage_seconds_max", "gauge", "Longest wall time of a single stage.", "seconds_max"),
+            ("stage_bytes_total", "counter", "Total bytes processed by stages.", "bytes_total"),
+        ]
+        snapshot = self.snapshot()
+        lines = []
+        for name, metric_type, description, field in metrics:
+            lines.append(f"# HELP {prefix}_{name} {description}")
+            lines.append(f"# TYPE {prefix}_{name} {metric_type}")
+            for stage_name, values in snapshot.items():
+                lines.append(f'{prefix}_{name}{{stage="{stage_name}"}} {values[field]}')
+        return "\n".join(lines) + "\n"
+
+
+class JsonLogHook:
+    """
+    Hook writing every stage event as a line of JSON.
+    """
+
+    def __init__(self, stream=None):
+        """
+        Initialize the hook.
+
+        Args:
+            stream: Text stream the events are written to, sys.stderr when None (default: None).
+        """
+        self.stream = stream
+        self._lock = threading.Lock()
+
+    def __call__(self, event):
+        line = json.dumps(event.to_dict(), sort_keys=True)
+        with self._lock:
+            stream = self.stream or sys.stderr
+            stream.write(line + "\n")
+            stream.flush()
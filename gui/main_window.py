@@ -4,36 +4,55 @@ Module containing the graphical user interface for the PAdES Signer application.
 
 import os
 import sys
-import time
 from PyQt5.QtWidgets import (QMainWindow, QAction, QFileDialog, QLabel, QPushButton, 
                             QVBoxLayout, QHBoxLayout, QWidget, QMessageBox, 
-                            QInputDialog, QLineEdit, QTabWidget, QApplication)
-from PyQt5.QtCore import Qt, QThread, pyqtSignal
-from key_manager.usb_storage import UsbStorage
+                            QInputDialog, QLineEdit, QTabWidget, QComboBox)
+from PyQt5.QtCore import Qt, QThread, QThreadPool, pyqtSignal
+from gui.workers import Job
+from key_manager.usb_storage import PUBLIC_KEY_SUFFIX, KeyIndex, UsbMonitor, UsbStorage
 from pades_signer.pdf_signer import PDFSigner
 from pades_signer.signature_verifier import SignatureVerifier
 from cryptography.hazmat.primitives import serialization
-from key_manager.key_generator import KeyGenerator, decrypt_private_key
+from key_manager.algorithms import ALGORITHMS, DEFAULT_ALGORITHM
+from key_manager.key_generator import InvalidPinError, KeyGenerator
+from key_manager.key_registry import KeyRegistry
+from key_manager.unlock_session import UnlockSession
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+# Time the window waits for running jobs when it is closed
+JOB_SHUTDOWN_TIMEOUT_MS = 5000
+# Sign status shown while the connected drive holds no private key
+NO_KEY_MESSAGE = "No private key detected!"
+
 class USBDetectorThread(QThread):
     """
-    Thread for continuous USB drive detection.
+    Thread for USB drive detection driven by udev events, with polling as a fallback.
 
     Signals:
-        usb_detected (list): Signal emitted when USB drives are detected.
+        usb_detected (list): Signal emitted with the initial list of USB drives and whenever it changes.
     """
     usb_detected = pyqtSignal(list)
     
     def run(self):
         """
-        Thread execution method that continuously checks for USB drives.
+        Thread execution method that waits for USB drives to be added or removed until interrupted.
+        """
+        monitor = UsbMonitor()
+        usb_drives = UsbStorage.get_usb_drives()
+        self.usb_detected.emit(usb_drives)
+        while not self.isInterruptionRequested():
+            changed_drives = monitor.wait_for_change(usb_drives)
+            if changed_drives is not None:
+                usb_drives = changed_drives
+                self.usb_detected.emit(usb_drives)
+
+    def stop(self):
+        """
+        Stop the detection and wait for the thread to finish.
         """
-        while True:
-            usb_drives = UsbStorage.get_usb_drives()
-            self.usb_detected.emit(usb_drives)
-            time.sleep(2)
+        self.requestInterruption()
+        self.wait()
 
 class MainWindow(QMainWindow):
     """
@@ -50,6 +69,7 @@ class MainWindow(QMainWindow):
         self.public_key_path_label = None
         self.key_status = None
         self.pin_input = None
+        self.algorithm_input = None
         self.usb_detector_thread = None
         self.pin_label = None
         self.verify_status = None
@@ -68,8 +88,15 @@ class MainWindow(QMainWindow):
         
         self.private_key = None
         self.public_key = None
+        self.key_registry = None
         self.usb_path = None
         self.encrypted_key_path = None
+        self.key_index = KeyIndex()
+        self.key_files = []
+        self.key_lookup = 0
+        self.unlock_session = UnlockSession()
+        self.thread_pool = QThreadPool.globalInstance()
+        self.jobs = set()
         
         self.init_ui()
         self.start_usb_detection()
@@ -152,8 +179,11 @@ class MainWindow(QMainWindow):
         self.public_key_label = QLabel("No public key selected")
         select_key_button = QPushButton("Select Public Key")
         select_key_button.clicked.connect(self.select_public_key)
+        select_key_dir_button = QPushButton("Select Key Directory")
+        select_key_dir_button.clicked.connect(self.select_key_directory)
         key_layout.addWidget(self.public_key_label)
         key_layout.addWidget(select_key_button)
+        key_layout.addWidget(select_key_dir_button)
         
         verify_button = QPushButton("Verify Signature")
         verify_button.clicked.connect(self.verify_signature)
@@ -174,8 +204,8 @@ class MainWindow(QMainWindow):
         """
         Configure the Generate Key tab with necessary UI components.
 
-        Creates a layout with PIN entry field, public key save path selection,
-        key generation button and status indicator.
+        Creates a layout with PIN entry field, signature algorithm selection,
+        public key save path selection, key generation button and status indicator.
         """
         layout = QVBoxLayout()
 
@@ -186,6 +216,14 @@ class MainWindow(QMainWindow):
         pin_layout.addWidget(self.pin_label)
         pin_layout.addWidget(self.pin_input)
 
+        algorithm_layout = QHBoxLayout()
+        self.algorithm_input = QComboBox()
+        for algorithm in ALGORITHMS.values():
+            self.algorithm_input.addItem(algorithm.label, algorithm.name)
+        self.algorithm_input.setCurrentIndex(self.algorithm_input.findData(DEFAULT_ALGORITHM))
+        algorithm_layout.addWidget(QLabel("Algorithm:"))
+        algorithm_layout.addWidget(self.algorithm_input)
+
         path_layout = QHBoxLayout()
         self.public_key_path_label = QLabel("No public key path selected")
         select_path_button = QPushButton("Select Public Key Save Path")
@@ -200,6 +238,7 @@ class MainWindow(QMainWindow):
         self.key_status.setAlignment(Qt.AlignCenter)
 
         layout.addLayout(pin_layout)
+        layout.addLayout(algorithm_layout)
         layout.addLayout(path_layout)
         layout.addWidget(generate_key_button)
         layout.addWidget(self.key_status)
@@ -227,6 +266,10 @@ class MainWindow(QMainWindow):
         
         file_menu = menu_bar.addMenu("File")
         
+        cancel_action = QAction("Cancel Running Jobs", self)
+        cancel_action.triggered.connect(self.cancel_jobs)
+        file_menu.addAction(cancel_action)
+
         exit_action = QAction("Exit", self)
         exit_action.triggered.connect(self.close)
         file_menu.addAction(exit_action)
@@ -239,7 +282,7 @@ class MainWindow(QMainWindow):
         
     def start_usb_detection(self):
         """
-        Start the USB detection thread that continuously monitors for connected USB drives.
+        Start the USB detection thread that reports connected USB drives whenever they change.
         """
         self.usb_detector_thread = USBDetectorThread()
         self.usb_detector_thread.usb_detected.connect(self.update_usb_status)
@@ -252,34 +295,89 @@ class MainWindow(QMainWindow):
         Args:
             usb_drives (list): List of detected USB drive paths.
         """
+        self.unlock_session.check_device(usb_drives)
+        for volume in self.key_index.volumes():
+            if volume not in usb_drives:
+                self.key_index.forget(volume)
+
         if usb_drives:
             self.usb_path = usb_drives[0]
             self.usb_status.setText(f"USB Connected: {self.usb_path}")
-            self.check_for_keys()
+            self.refresh_keys()
         else:
             self.usb_path = None
             self.encrypted_key_path = None
+            self.key_files = []
             self.usb_status.setText("USB Status: Not Connected")
-            self.sign_status.setText("No private key detected!")
+            self.sign_status.setText(NO_KEY_MESSAGE)
             
-    def check_for_keys(self):
+    def refresh_keys(self):
         """
-        Check if any key files exist on the connected USB drive.
+        Check for key files on the connected USB drive in the background, see check_for_keys.
 
-        Updates the USB status label with key detection information.
+        A slow or stalled drive then does not block the UI when it is plugged in.
         """
         if not self.usb_path:
             return
-            
-        for filename in os.listdir(self.usb_path):
-            if filename.endswith('.key'):
-                self.encrypted_key_path = os.path.join(self.usb_path, filename)
+        self.key_lookup += 1
+        lookup = self.key_lookup
+        usb_path = self.usb_path
+        key_index = self.key_index
+
+        def refresh(job):
+            job.progress(f"USB Connected: {usb_path} (Looking for keys...)")
+            return lookup, usb_path, key_index.refresh(usb_path)
+
+        self.start_job(refresh, self.usb_status, self.on_keys_refreshed, "Error! Failed to read USB drive")
+
+    def on_keys_refreshed(self, result):
+        """
+        Show the key files found by refresh_keys, unless the drive changed or was checked again in the meantime.
+
+        Args:
+            result (tuple): (lookup, usb_path, key_files) with the lookup number, the scanned drive
+                and its KeyFileEntry objects.
+        """
+        lookup, usb_path, key_files = result
+        if lookup == self.key_lookup and usb_path == self.usb_path:
+            self.show_keys(key_files)
+
+    def check_for_keys(self):
+        """
+        Check if any key files exist on the connected USB drive, before a key is used.
+
+        The key index rescans the drive only when its contents changed.
+        """
+        if self.usb_path:
+            # A lookup still running in the background would report an older state
+            self.key_lookup += 1
+            self.show_keys(self.key_index.refresh(self.usb_path))
+
+    def show_keys(self, key_files):
+        """
+        Select a key among the key files of the connected USB drive.
+
+        The previously selected key stays selected as long as it is still present.
+        Updates the USB status label with key detection information.
+
+        Args:
+            key_files (list): KeyFileEntry objects found on the drive.
+        """
+        self.key_files = key_files
+        if self.key_files:
+            if self.encrypted_key_path not in [entry.path for entry in self.key_files]:
+                self.encrypted_key_path = self.key_files[0].path
+            if len(self.key_files) == 1:
                 self.usb_status.setText(f"USB Connected: {self.usb_path} (Key found)")
+            else:
+                self.usb_status.setText(f"USB Connected: {self.usb_path} ({len(self.key_files)} keys found)")
+            # The result of a signing job stays visible when the drive is checked again
+            if self.sign_status.text() == NO_KEY_MESSAGE:
                 self.sign_status.setText("Ready")
-                QApplication.processEvents()
-                return
+            return
 
-        self.sign_status.setText("No private key detected!")
+        self.encrypted_key_path = None
+        self.sign_status.setText(NO_KEY_MESSAGE)
         self.usb_status.setText(f"USB Connected: {self.usb_path} (No key found)")
     
     def select_pdf_file(self):
@@ -316,105 +414,202 @@ class MainWindow(QMainWindow):
             try:
                 with open(file_path, "rb") as key_file:
                     self.public_key = serialization.load_pem_public_key(key_file.read())
+                self.key_registry = None
                 self.public_key_label.setText(file_path)
             except Exception as e:
                 QMessageBox.critical(self, "Error", f"Failed to load public key: {str(e)}")
 
+    def select_key_directory(self):
+        """
+        Open a directory selection dialog to choose the public keys of several signers.
+
+        Each signature is then verified with the key matching the fingerprint stored in it.
+        """
+        folder_path = QFileDialog.getExistingDirectory(self, "Select Public Key Directory")
+        if folder_path:
+            registry = KeyRegistry.from_path(folder_path)
+            if not len(registry):
+                QMessageBox.critical(self, "Error", "No public keys found in the selected directory")
+                return
+            self.key_registry = registry
+            self.public_key = None
+            self.public_key_label.setText(f"{len(registry)} keys from {folder_path}")
+
+
+    def start_job(self, function, status_label, on_finished, error_prefix):
+        """
+        Run a long operation on the thread pool, reporting its progress on a status label.
+
+        Args:
+            function (callable): Function called with the Job on a pool thread.
+            status_label (QLabel): Label showing progress, errors and cancellation.
+            on_finished (callable): Called on the UI thread with the return value of the function.
+            error_prefix (str): Text shown before the error message when the function fails.
+
+        Returns:
+            Job: The started job.
+        """
+        job = Job(function)
+        job.signals.progress.connect(status_label.setText)
+        job.signals.finished.connect(on_finished)
+        job.signals.error.connect(lambda e: status_label.setText(f"{error_prefix}: {str(e)}"))
+        job.signals.cancelled.connect(lambda: status_label.setText("Operation cancelled"))
+        for signal in (job.signals.finished, job.signals.error, job.signals.cancelled):
+            signal.connect(lambda *args, finished_job=job: self.jobs.discard(finished_job))
+
+        self.jobs.add(job)
+        status_label.setText("Queued...")
+        self.thread_pool.start(job)
+        return job
+
+    def cancel_jobs(self):
+        """
+        Request cancellation of all queued and running jobs.
+
+        Running jobs stop at their next stage, an operation already in progress is not interrupted.
+        """
+        for job in list(self.jobs):
+            job.cancel()
+
+    def closeEvent(self, event):
+        """
+        Cancel pending jobs, wait for running ones and stop USB detection when the window is closed.
+
+        Remaining jobs are disconnected from the window, so their signals never reach it once
+        it is destroyed: jobs finished while waiting still have their final signal queued, and
+        jobs still running after JOB_SHUTDOWN_TIMEOUT_MS emit it later.
+
+        Args:
+            event (QCloseEvent): Close event.
+        """
+        self.cancel_jobs()
+        # Queued jobs that have not started are dropped, running ones stop at their next stage
+        self.thread_pool.clear()
+        self.thread_pool.waitForDone(JOB_SHUTDOWN_TIMEOUT_MS)
+        for job in list(self.jobs):
+            for signal in (job.signals.progress, job.signals.finished, job.signals.error,
+                           job.signals.cancelled):
+                try:
+                    signal.disconnect()
+                except TypeError:
+                    pass
+        self.jobs.clear()
+        self.usb_detector_thread.stop()
+        super().closeEvent(event)
 
     def sign_document(self):
         """
         Sign a PDF document using the private key stored on the USB drive.
 
-        Prompts for PIN to decrypt the private key, then signs the document
-        and saves it with a 'signed_' prefix.
+        When the drive holds several keys, asks which one to use. Prompts for PIN to decrypt the private key unless the unlock session still
+        holds it, then signs the document in the background and saves it with a 'signed_' prefix.
 
         Updates the sign_status label with progress and result information.
         """
+        self.check_for_keys()
         if not self.encrypted_key_path:
             self.sign_status.setText("No private key found on USB drive")
-            QApplication.processEvents()
             return
+
+        if len(self.key_files) > 1:
+            descriptions = [entry.describe() for entry in self.key_files]
+            current = [entry.path for entry in self.key_files].index(self.encrypted_key_path)
+            description, ok = QInputDialog.getItem(self, "Select Key", "Choose the private key to sign with:",
+                                                   descriptions, current, False)
+            if not ok:
+                return
+            self.encrypted_key_path = self.key_files[descriptions.index(description)].path
             
         pdf_path = self.pdf_path_label.text()
         if pdf_path == "No PDF selected" or not os.path.exists(pdf_path):
             self.sign_status.setText("No PDF file selected")
-            QApplication.processEvents()
-            return
-            
-        pin, ok = QInputDialog.getText(self, "PIN Required", "Enter your PIN to decrypt the private key:", QLineEdit.Password)
-        if not ok or not pin:
             return
             
-        try:
-            encrypted_data = UsbStorage.load_from_usb(self.encrypted_key_path)
-            
-            self.sign_status.setText("Decrypting private key...")
-            QApplication.processEvents()
-
-            try:
-                self.private_key = decrypt_private_key(encrypted_data, pin)
-            except ValueError:
-                QMessageBox.critical(self, "Invalid PIN", "The PIN you entered is incorrect. Please try again.")
-                self.sign_status.setText("Invalid PIN. Operation cancelled.")
-                QApplication.processEvents()
+        # Key unlocked from another key file must not be reused
+        if self.unlock_session.encrypted_key_path != self.encrypted_key_path:
+            self.unlock_session.lock()
+
+        pin = None
+        if not self.unlock_session.is_unlocked:
+            pin, ok = QInputDialog.getText(self, "PIN Required", "Enter your PIN to decrypt the private key:", QLineEdit.Password)
+            if not ok or not pin:
                 return
-            time.sleep(2)
-            
-            signer_name, ok = QInputDialog.getText(self, "Signer Information", "Enter signer name:")
-            if not ok:
-                signer_name = "Unknown"
-                
-            file_dir = os.path.dirname(pdf_path)
-            file_name = os.path.basename(pdf_path)
-            output_path = os.path.join(file_dir, f"signed_{file_name}")
-            
-            self.sign_status.setText("Signing document...")
-            pdf_signer = PDFSigner(self.private_key)
-            output_path = pdf_signer.sign_document(pdf_path, output_path, signer_name)
-            QApplication.processEvents()
-            time.sleep(2)
-
-            self.sign_status.setText(f"Document signed successfully and saved to: {output_path}")
-            QApplication.processEvents()
-            time.sleep(2)
-            
-        except Exception as e:
-            self.sign_status.setText(f"Error! Failed to sign document: {str(e)}")
-            print(str(e))
+
+        signer_name, ok = QInputDialog.getText(self, "Signer Information", "Enter signer name:")
+        if not ok:
+            signer_name = "Unknown"
+
+        file_dir = os.path.dirname(pdf_path)
+        file_name = os.path.basename(pdf_path)
+        output_path = os.path.join(file_dir, f"signed_{file_name}")
+        encrypted_key_path = self.encrypted_key_path
+        unlock_session = self.unlock_session
+
+        def sign(job):
+            if pin is not None:
+                job.progress("Decrypting private key...")
+                try:
+                    unlock_session.unlock(encrypted_key_path, pin)
+                except InvalidPinError:
+                    # A missing or damaged key file is reported as a failure with its own message
+                    return None
+
+            job.check_cancelled()
+            job.progress("Signing document...")
+            pdf_signer = PDFSigner(unlock_session.acquire_key())
+            return pdf_signer.sign_document(pdf_path, output_path, signer_name)
+
+        self.start_job(sign, self.sign_status, self.on_document_signed, "Error! Failed to sign document")
+
+    def on_document_signed(self, output_path):
+        """
+        Report the result of a signing job.
+
+        Args:
+            output_path (str): Path to the signed document, None when the PIN was invalid.
+        """
+        if output_path is None:
+            QMessageBox.critical(self, "Invalid PIN", "The PIN you entered is incorrect. Please try again.")
+            self.sign_status.setText("Invalid PIN. Operation cancelled.")
+            return
+        self.sign_status.setText(f"Document signed successfully and saved to: {output_path}")
             
     def verify_signature(self):
         """
-        Verify the digital signature in a PDF document using the selected public key.
+        Verify the digital signature in a PDF document using the selected public key or key directory.
 
-        Updates the verify_status label with verification results.
+        Verification runs in the background, the verify_status label is updated with its results.
         """
-        if not self.public_key:
-            self.sign_status.setText("Please select a public key first")
-            QApplication.processEvents()
+        if not self.public_key and not self.key_registry:
+            self.verify_status.setText("Please select a public key first")
             return
             
         pdf_path = self.verify_path_label.text()
         if pdf_path == "No PDF selected" or not os.path.exists(pdf_path):
-            self.sign_status.setText("Please select a valid PDF file")
-            QApplication.processEvents()
+            self.verify_status.setText("Please select a valid PDF file")
             return
-            
-        try:
-            self.verify_status.setText("Verifying signature...")
-            verifier = SignatureVerifier(self.public_key)
-            is_valid, message = verifier.verify_signature(pdf_path)
-            QApplication.processEvents()
-            time.sleep(2)
-
-            if is_valid:
-                self.verify_status.setText("Signature is valid")
-                QApplication.processEvents()
-            else:
-                self.verify_status.setText(f"Invalid signature: {message}")
-                QApplication.processEvents()
-                
-        except Exception as e:
-            self.verify_status.setText(f"Error: Failed to verify signature: {str(e)}")
+
+        verifier = SignatureVerifier(self.public_key, registry=self.key_registry)
+
+        def verify(job):
+            job.progress("Verifying signature...")
+            return verifier.verify_signature(pdf_path)
+
+        self.start_job(verify, self.verify_status, self.on_signature_verified,
+                       "Error: Failed to verify signature")
+
+    def on_signature_verified(self, result):
+        """
+        Report the result of a verification job.
+
+        Args:
+            result (tuple): (is_valid, message) returned by SignatureVerifier.verify_signature.
+        """
+        is_valid, message = result
+        if is_valid:
+            self.verify_status.setText("Signature is valid")
+        else:
+            self.verify_status.setText(f"Invalid signature: {message}")
             
     def show_about(self):
         """
@@ -432,52 +627,60 @@ class MainWindow(QMainWindow):
         Generate a new key pair, encrypt the private key with the provided PIN,
         and save the keys to appropriate locations.
 
-        The private key is encrypted and saved to the USB drive,
-        while the public key is saved to the selected path.
+        The private key is encrypted and saved to the USB drive together with its public key,
+        which is also saved to the selected path.
+        The work runs in the background and can be cancelled between its stages.
 
         Updates the key_status label with progress and result information.
         """
         pin = self.pin_input.text()
         if not pin:
             self.key_status.setText("Error! Please enter a PIN")
-            QApplication.processEvents()
             return
 
         if not self.usb_path:
             self.key_status.setText("Error! No USB drive detected")
-            QApplication.processEvents()
             return
 
         if not self.public_key_path:
             self.key_status.setText("Error! Specify where to save the private key")
-            QApplication.processEvents()
             return
 
-        try:
-            self.key_status.setText("Creating private and public keys pair...")
-            QApplication.processEvents()
-            key_generator = KeyGenerator()
+        usb_path = self.usb_path
+        public_key_file = os.path.join(self.public_key_path, "public_key.pem")
+        algorithm = self.algorithm_input.currentData()
+
+        def generate(job):
+            job.progress("Creating private and public keys pair...")
+            key_generator = KeyGenerator(algorithm)
             private_key, public_key = key_generator.generate_key_pair()
-            time.sleep(2)
 
-            self.key_status.setText("Encrypting private key...")
-            QApplication.processEvents()
+            job.check_cancelled()
+            job.progress("Encrypting private key...")
             encrypted_key = key_generator.encrypt_private_key(pin)
-            time.sleep(2)
 
-            self.key_status.setText("Saving key to USB drive...")
-            QApplication.processEvents()
-            UsbStorage.save_to_usb(self.usb_path, "private_key.key", encrypted_key)
-            public_key_file = os.path.join(self.public_key_path, "public_key.pem")
+            job.check_cancelled()
+            job.progress("Saving key to USB drive...")
+            public_key_pem = public_key.public_bytes(
+                encoding=serialization.Encoding.PEM,
+                format=serialization.PublicFormat.SubjectPublicKeyInfo
+            )
+            UsbStorage.save_to_usb(usb_path, "private_key.key", encrypted_key)
+            # Public key next to the private key lets the key index identify it without the PIN
+            UsbStorage.save_to_usb(usb_path, "private_key" + PUBLIC_KEY_SUFFIX, public_key_pem)
             with open(public_key_file, "wb") as f:
-                f.write(public_key.public_bytes(
-                    encoding=serialization.Encoding.PEM,
-                    format=serialization.PublicFormat.SubjectPublicKeyInfo
-                ))
+                f.write(public_key_pem)
+            return "Key generated and saved successfully"
+
+        self.start_job(generate, self.key_status, self.on_key_generated,
+                       "Error! Failed to generate and save key")
 
-            self.key_status.setText("Key generated and saved successfully")
-            QApplication.processEvents()
+    def on_key_generated(self, message):
+        """
+        Report the result of a key generation job and pick up the new key file from the USB drive.
 
-        except Exception as e:
-            self.key_status.setText(f"Error! Failed to generate and save key: {str(e)}")
-            QApplication.processEvents()
\ No newline at end of file
+        Args:
+            message (str): Result message of the job.
+        """
+        self.key_status.setText(message)
+        self.refresh_keys()
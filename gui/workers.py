@@ -0,0 +1,97 @@
+"""
+Module providing background workers that keep long-running operations off the Qt UI thread.
+"""
+
+import threading
+from PyQt5.QtCore import QObject, QRunnable, pyqtSignal
+
+
+class JobCancelled(Exception):
+    """
+    Exception raised inside a job when it has been cancelled.
+    """
+
+
+class WorkerSignals(QObject):
+    """
+    Signals emitted by a Job, delivered to the UI thread through queued connections.
+
+    Signals:
+        progress (str): Emitted with a status message when the job enters a new stage.
+        finished (object): Emitted with the return value of the job function.
+        error (object): Emitted with the exception raised by the job function.
+        cancelled: Emitted when the job stopped because it was cancelled.
+    """
+    progress = pyqtSignal(str)
+    finished = pyqtSignal(object)
+    error = pyqtSignal(object)
+    cancelled = pyqtSignal()
+
+
+class Job(QRunnable):
+    """
+    Runnable executing a function on a QThreadPool thread.
+
+    The function receives the job itself, so it can report progress with
+    job.progress and stop between stages with job.check_cancelled.
+    """
+
+    def __init__(self, function):
+        """
+        Initialize the job.
+
+        Args:
+            function (callable): Function called with the job as its only argument.
+        """
+        super().__init__()
+        # Lifetime is managed by the owner of the job, which keeps it until a final signal arrives
+        self.setAutoDelete(False)
+        self.function = function
+        self.signals = WorkerSignals()
+        self._cancelled = threading.Event()
+
+    def cancel(self):
+        """
+        Request cancellation, the job stops at its next cancellation check.
+        """
+        self._cancelled.set()
+
+    @property
+    def is_cancelled(self):
+        """
+        bool: True when cancellation has been requested.
+        """
+        return self._cancelled.is_set()
+
+    def check_cancelled(self):
+        """
+        Stop the job if cancellation has been requested.
+
+        Raises:
+            JobCancelled: When the job has been cancelled.
+        """
+        if self._cancelled.is_set():
+            raise JobCancelled()
+
+    def progress(self, message):
+        """
+        Report progress of the job.
+
+        Args:
+            message (str): Status message describing the current stage.
+        """
+        self.signals.progress.emit(message)
+
+    def run(self):
+        """
+        Execute the job function and emit the signal matching its outcome.
+        """
+        try:
+            self.check_cancelled()
+            result = self.function(self)
+        except JobCancelled:
+            self.signals.cancelled.emit()
+        except Exception as e:
+            self.signals.error.emit(e)
+        else:
+            self.signals.finished.emit(result)
@@ -0,0 +1,225 @@
+"""
+Module describing the signature algorithms supported for signing documents.
+
+Every algorithm signs the SHA-256 hash of a document. Signatures have a fixed size,
+so the space reserved for them in a document is known before signing.
+"""
+
+from cryptography.hazmat.primitives.asymmetric import ec, ed25519, padding, rsa
+from cryptography.hazmat.primitives.asymmetric.utils import decode_dss_signature, encode_dss_signature
+from cryptography.hazmat.primitives.hashes import SHA256
+
+
+class SignatureAlgorithm:
+    """
+    Base class of a signature algorithm.
+
+    Attributes:
+        name (str): Identifier of the algorithm stored in signatures.
+        label (str): Human readable name of the algorithm.
+        subfilter (str): /SubFilter value of incremental-update signatures made with it.
+        key_types (tuple): Private and public key classes of the algorithm.
+    """
+    name = None
+    label = None
+    subfilter = None
+    key_types = ()
+
+    def supports(self, key):
+        """
+        Check whether a key belongs to this algorithm.
+
+        Args:
+            key: Private or public key object.
+
+        Returns:
+            bool: True when the key can be used with this algorithm.
+        """
+        return isinstance(key, self.key_types)
+
+    def generate_private_key(self):
+        """
+        Generate a new private key.
+
+        Returns:
+            Private key object.
+        """
+        raise NotImplementedError
+
+    def signature_size(self, key):
+        """
+        Return the size of signatures made with a key.
+
+        Args:
+            key: Private or public key of this algorithm.
+
+        Returns:
+            int: Signature size in bytes.
+        """
+        raise NotImplementedError
+
+    def sign(self, private_key, doc_hash):
+        """
+        Sign a document hash.
+
+        Args:
+            private_key: Private key of this algorithm.
+            doc_hash (bytes): SHA-256 hash of the document.
+
+        Returns:
+            bytes: Signature of signature_size bytes.
+        """
+        raise NotImplementedError
+
+    def verify(self, public_key, signature, doc_hash):
+        """
+        Verify the signature of a document hash.
+
+        Args:
+            public_key: Public key of this algorithm.
+            signature (bytes): Signature to check.
+            doc_hash (bytes): SHA-256 hash of the document.
+
+        Raises:
+            cryptography.exceptions.InvalidSignature: When the signature is not valid.
+        """
+        raise NotImplementedError
+
+
+class RsaAlgorithm(SignatureAlgorithm):
+    """
+    RSA-4096 with PKCS#1 v1.5 padding, the algorithm used by all earlier versions.
+    """
+    name = "rsa"
+    label = "RSA-4096"
+    subfilter = "/raw.rsa_sha256"
+    key_types = (rsa.RSAPrivateKey, rsa.RSAPublicKey)
+
+    def generate_private_key(self):
+        return rsa.generate_private_key(public_exponent=65537, key_size=4096)
+
+    def signature_size(self, key):
+        return key.key_size // 8
+
+    def sign(self, private_key, doc_hash):
+        return private_key.sign(doc_hash, padding.PKCS1v15(), SHA256())
+
+    def verify(self, public_key, signature, doc_hash):
+        public_key.verify(signature, doc_hash, padding.PKCS1v15(), SHA256())
+
+
+class EcdsaP256Algorithm(SignatureAlgorithm):
+    """
+    ECDSA on the NIST P-256 curve, signatures are stored as raw r || s values.
+    """
+    name = "ecdsa-p256"
+    label = "ECDSA P-256"
+    subfilter = "/raw.ecdsa_p256_sha256"
+    key_types = (ec.EllipticCurvePrivateKey, ec.EllipticCurvePublicKey)
+
+    # Size of r and s in bytes
+    _COORDINATE_SIZE = 32
+
+    def supports(self, key):
+        return super().supports(key) and isinstance(key.curve, ec.SECP256R1)
+
+    def generate_private_key(self):
+        return ec.generate_private_key(ec.SECP256R1())
+
+    def signature_size(self, key):
+        return 2 * self._COORDINATE_SIZE
+
+    def sign(self, private_key, doc_hash):
+        r, s = decode_dss_signature(private_key.sign(doc_hash, ec.ECDSA(SHA256())))
+        return r.to_bytes(self._COORDINATE_SIZE, "big") + s.to_bytes(self._COORDINATE_SIZE, "big")
+
+    def verify(self, public_key, signature, doc_hash):
+        r = int.from_bytes(signature[:self._COORDINATE_SIZE], "big")
+        s = int.from_bytes(signature[self._COORDINATE_SIZE:], "big")
+        public_key.verify(encode_dss_signature(r, s), doc_hash, ec.ECDSA(SHA256()))
+
+
+class Ed25519Algorithm(SignatureAlgorithm):
+    """
+    Ed25519, signing the document hash as its message.
+    """
+    name = "ed25519"
+    label = "Ed25519"
+    subfilter = "/raw.ed25519_sha256"
+    key_types = (ed25519.Ed25519PrivateKey, ed25519.Ed25519PublicKey)
+
+    def generate_private_key(self):
+        return ed25519.Ed25519PrivateKey.generate()
+
+    def signature_size(self, key):
+        return 64
+
+    def sign(self, private_key, doc_hash):
+        return private_key.sign(doc_hash)
+
+    def verify(self, public_key, signature, doc_hash):
+        public_key.verify(signature, doc_hash)
+
+
+# Supported algorithms by their identifier
+ALGORITHMS = {algorithm.name: algorithm for algorithm in
+              (RsaAlgorithm(), EcdsaP256Algorithm(), Ed25519Algorithm())}
+
+DEFAULT_ALGORITHM = RsaAlgorithm.name
+
+
+def get_algorithm(name):
+    """
+    Look up a signature algorithm by its identifier.
+
+    Args:
+        name (str): Algorithm identifier, e.g. "rsa", "ecdsa-p256" or "ed25519".
+
+    Returns:
+        SignatureAlgorithm: The algorithm.
+
+    Raises:
+        ValueError: When the algorithm is not supported.
+    """
+    try:
+        return ALGORITHMS[name]
+    except KeyError:
+        raise ValueError(f"Unsupported signature algorithm: {name}")
+
+
+def algorithm_for_subfilter(subfilter):
+    """
+    Look up the signature algorithm of an incremental-update signature.
+
+    Args:
+        subfilter (str): /SubFilter value of the signature dictionary.
+
+    Returns:
+        SignatureAlgorithm: The algorithm.
+
+    Raises:
+        ValueError: When the algorithm is not supported.
+    """
+    for algorithm in ALGORITHMS.values():
+        if algorithm.subfilter == subfilter:
+            return algorithm
+    raise ValueError(f"Unsupported signature format: {subfilter}")
+
+
+def algorithm_for_key(key):
+    """
+    Detect the signature algorithm of a key, the algorithm is part of the key itself.
+
+    Args:
+        key: Private or public key object.
+
+    Returns:
+        SignatureAlgorithm: The algorithm.
+
+    Raises:
+        ValueError: When keys of this type are not supported.
+    """
+    for algorithm in ALGORITHMS.values():
+        if algorithm.supports(key):
+            return algorithm
+    raise ValueError(f"Unsupported key type: {type(key).__name__}")
@@ -2,59 +2,134 @@
 Module containing functions and classes for generating and managing cryptographic keys.
 """
 
+import hashlib
 import os
-from cryptography.hazmat.primitives.asymmetric import rsa
 from cryptography.hazmat.primitives import serialization, hashes
 from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
 from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
 from cryptography.hazmat.primitives.serialization import load_pem_private_key
+from key_manager.algorithms import DEFAULT_ALGORITHM, get_algorithm
+from common.instrumentation import stage
 
 
-def decrypt_private_key(encrypted_data, pin):
+class InvalidPinError(ValueError):
     """
-    Decrypts a private key using the provided PIN.
+    Exception raised when a private key cannot be decrypted with the given PIN.
+    """
+
+
+def public_key_fingerprint(public_key):
+    """
+    Computes the fingerprint of a public key.
+
+    Args:
+        public_key: Public key object.
+
+    Returns:
+        str: Hex-encoded SHA-256 hash of the DER-encoded SubjectPublicKeyInfo.
+    """
+    public_key_der = public_key.public_bytes(
+        encoding=serialization.Encoding.DER,
+        format=serialization.PublicFormat.SubjectPublicKeyInfo
+    )
+    return hashlib.sha256(public_key_der).hexdigest()
+
+
+def _decrypt_pem(encrypted_data, pin):
+    """
+    Decrypts the PEM bytes of a private key using the provided PIN, without parsing them.
 
     Args:
         encrypted_data (bytes): Encrypted key data.
         pin (str): PIN used for decryption.
 
     Returns:
-        bytes: Decrypted private key in PEM format.
+        bytes: Decrypted data, a private key in PEM format if the PIN is valid.
 
     Raises:
-        ValueError: When PIN is invalid or the key cannot be read.
+        ValueError: When the data is not a whole encrypted key.
     """
     # Extract salt, iv and encrypted private key from encrypted_data
     salt = encrypted_data[:16]
     iv = encrypted_data[16:32]
     encrypted_key = encrypted_data[32:]
+    if not encrypted_key or len(encrypted_key) % 16:
+        raise ValueError("Key file is damaged or is not an encrypted private key")
 
     # Hash the private key analogically to previous encryption, use the same salt
-    kdf = PBKDF2HMAC(
-        algorithm=hashes.SHA256(),
-        length=32,
-        salt=salt,
-        iterations=100000,
-    )
-    aes_key = kdf.derive(pin.encode('utf-8'))
+    with stage("key.pbkdf2"):
+        kdf = PBKDF2HMAC(
+            algorithm=hashes.SHA256(),
+            length=32,
+            salt=salt,
+            iterations=100000,
+        )
+        aes_key = kdf.derive(pin.encode('utf-8'))
 
-    # Creating cipher using aes_key (hashed pin) and iv
-    cipher = Cipher(algorithms.AES(aes_key), modes.CBC(iv))
-    decryptor = cipher.decryptor()
+    with stage("key.decrypt") as decrypt:
+        # Creating cipher using aes_key (hashed pin) and iv
+        cipher = Cipher(algorithms.AES(aes_key), modes.CBC(iv))
+        decryptor = cipher.decryptor()
 
-    # Decryption of encrypted private key
-    padded_data = decryptor.update(encrypted_key) + decryptor.finalize()
+        # Decryption of encrypted private key
+        padded_data = decryptor.update(encrypted_key) + decryptor.finalize()
+        decrypt.add_bytes(len(encrypted_key))
 
     # Deleting padding from decrypted private key
     padding_length = padded_data[-1]
-    private_key_pem = padded_data[:-padding_length]
+    return padded_data[:-padding_length]
+
+
+def load_private_key(encrypted_data, pin):
+    """
+    Decrypts and parses a private key using the provided PIN.
+
+    Unlike decrypt_private_key, the PEM data is parsed exactly once and the
+    ready-to-use key object is returned.
+
+    Args:
+        encrypted_data (bytes): Encrypted key data.
+        pin (str): PIN used for decryption.
+
+    Returns:
+        Private key object.
+
+    Raises:
+        InvalidPinError: When the PIN is invalid.
+        ValueError: When the key data is damaged.
+    """
+    private_key_pem = _decrypt_pem(encrypted_data, pin)
+    try:
+        with stage("key.parse"):
+            return load_pem_private_key(private_key_pem, password=None)
+    except Exception:
+        raise InvalidPinError("Invalid PIN. Unable to read the key.")
+
+
+def decrypt_private_key(encrypted_data, pin):
+    """
+    Decrypts a private key using the provided PIN.
+
+    Args:
+        encrypted_data (bytes): Encrypted key data.
+        pin (str): PIN used for decryption.
+
+    Returns:
+        bytes: Decrypted private key in PEM format.
+
+    Raises:
+        InvalidPinError: When the PIN is invalid.
+        ValueError: When the key data is damaged.
+    """
+    private_key_pem = _decrypt_pem(encrypted_data, pin)
 
     # Return decrypted private key in PEM format
     try:
-        load_pem_private_key(private_key_pem, password=None)
+        with stage("key.parse"):
+            load_pem_private_key(private_key_pem, password=None)
         return private_key_pem
     except Exception:
-        raise ValueError("Invalid PIN. Unable to read the key.")
+        raise InvalidPinError("Invalid PIN. Unable to read the key.")
 
 
 class KeyGenerator:
@@ -62,28 +137,41 @@ class KeyGenerator:
     Class for generating and managing cryptographic key pairs.
 
     Attributes:
+        algorithm (SignatureAlgorithm): Signature algorithm of the generated keys.
         private_key: The private key generated by this class.
         public_key: The public key generated by this class.
     """
 
-    def __init__(self):
+    def __init__(self, algorithm=DEFAULT_ALGORITHM, pool=None):
         """
         Initializes the key generator.
+
+        Args:
+            algorithm (str): Identifier of the signature algorithm, see key_manager.algorithms
+                (default: DEFAULT_ALGORITHM, RSA-4096).
+            pool (KeyPool): Pool of pre-generated key pairs to take keys from instead of
+                generating them, its algorithm is used (default: None).
+
+        Raises:
+            ValueError: When the algorithm is not supported.
         """
+        self.pool = pool
+        self.algorithm = pool.algorithm if pool else get_algorithm(algorithm)
         self.private_key = None
         self.public_key = None
         
     def generate_key_pair(self):
         """
-        Generates an RSA key pair.
+        Generates a key pair of the selected algorithm, or takes a ready one from the pool.
 
         Returns:
             tuple: A tuple (private_key, public_key) containing the generated keys.
         """
-        self.private_key = rsa.generate_private_key(
-            public_exponent=65537,
-            key_size=4096
-        )
+        if self.pool:
+            self.private_key, self.public_key = self.pool.take()
+            return self.private_key, self.public_key
+
+        self.private_key = self.algorithm.generate_private_key()
         self.public_key = self.private_key.public_key()
         return self.private_key, self.public_key
         
@@ -103,7 +191,7 @@ class KeyGenerator:
         if not self.private_key:
             raise ValueError("No private key available. Generate key pair first.")
 
-        # Converting 4096-bit private key to PEM format
+        # Converting private key to PEM format, the algorithm is identified by the key itself
         private_key_bytes = self.private_key.private_bytes(
             encoding=serialization.Encoding.PEM,
             format=serialization.PrivateFormat.PKCS8,
@@ -0,0 +1,239 @@
+"""
+Module providing a pool of key pairs pre-generated in the background.
+
+RSA-4096 key generation takes from several hundred milliseconds to several seconds.
+The pool keeps a number of ready key pairs, generated by worker processes, so
+provisioning many signers at once does not wait for each generation.
+
+Usage:
+    with KeyPool(target_depth=8) as pool:
+        key_generator = KeyGenerator(pool=pool)
+        private_key, public_key = key_generator.generate_key_pair()
+"""
+
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from cryptography.hazmat.primitives import serialization
+from key_manager.algorithms import DEFAULT_ALGORITHM, RsaAlgorithm, get_algorithm
+
+
+def _generate_key(algorithm_name):
+    """
+    Generate a private key in a worker process.
+
+    Args:
+        algorithm_name (str): Identifier of the signature algorithm.
+
+    Returns:
+        tuple: (private_key_der, seconds) with the unencrypted PKCS#8 DER key and the generation time.
+    """
+    start = time.perf_counter()
+    private_key = get_algorithm(algorithm_name).generate_private_key()
+    private_key_der = private_key.private_bytes(
+        encoding=serialization.Encoding.DER,
+        format=serialization.PrivateFormat.PKCS8,
+        encryption_algorithm=serialization.NoEncryption()
+    )
+    return private_key_der, time.perf_counter() - start
+
+
+class KeyPool:
+    """
+    Class handing out pre-generated key pairs and refilling itself in the background.
+
+    Generated private keys are kept unencrypted in memory until they are taken,
+    they never touch the disk. Keys taken from the pool are never handed out twice.
+
+    Attributes:
+        algorithm (SignatureAlgorithm): Signature algorithm of the generated keys.
+        target_depth (int): Number of ready key pairs the pool refills to.
+        workers (int): Number of worker processes generating keys.
+    """
+
+    def __init__(self, algorithm=DEFAULT_ALGORITHM, target_depth=4, workers=None):
+        """
+        Initialize the pool and start filling it.
+
+        Args:
+            algorithm (str): Identifier of the signature algorithm (default: DEFAULT_ALGORITHM).
+            target_depth (int): Number of ready key pairs the pool refills to (default: 4).
+            workers (int): Number of worker processes, the CPU count when None (default: None).
+
+        Raises:
+            ValueError: When the algorithm is not supported or target_depth is not positive.
+        """
+        if target_depth < 1:
+            raise ValueError("Target depth of the key pool must be positive")
+        self.algorithm = get_algorithm(algorithm)
+        self.target_depth = target_depth
+        self.workers = workers or os.cpu_count() or 1
+        self.executor = ProcessPoolExecutor(max_workers=self.workers)
+        self._condition = threading.Condition()
+        self._keys = deque()
+        self._pending = 0
+        self._closed = False
+        self._error = None
+        # Error of a pool broken by a crashed worker, no key is generated anymore
+        self._broken = None
+
+        # Metrics
+        self._generated = 0
+        self._taken = 0
+        self._misses = 0
+        self._generation_seconds = 0.0
+        self._generation_seconds_max = 0.0
+        self._wait_seconds = 0.0
+
+        self._refill()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _refill(self):
+        """
+        Submit generations until ready and pending keys reach the target depth.
+
+        The caller must not hold the lock: a broken pool fails its futures from its own
+        thread while submissions wait for it, and their callbacks take the lock.
+        """
+        with self._condition:
+            if self._closed or self._broken is not None:
+                return
+            count = max(0, self.target_depth - len(self._keys) - self._pending)
+            self._pending += count
+        for submitted in range(count):
+            try:
+                future = self.executor.submit(_generate_key, self.algorithm.name)
+            except RuntimeError as e:
+                # The pool was broken by a crashed worker or shut down by close
+                with self._condition:
+                    self._pending -= count - submitted
+                    if not self._closed:
+                        self._broken = e
+                    self._condition.notify_all()
+                return
+            future.add_done_callback(self._on_generated)
+
+    def _on_generated(self, future):
+        """
+        Store a key generated by a worker process, the pool is refilled when keys are taken.
+
+        Args:
+            future (Future): Finished generation.
+        """
+        private_key = None
+        seconds = None
+        error = None
+        if not future.cancelled():
+            try:
+                private_key_der, seconds = future.result()
+                # The key was generated by us, so the expensive RSA consistency check can be skipped
+                options = {"unsafe_skip_rsa_key_validation": True} \
+                    if isinstance(self.algorithm, RsaAlgorithm) else {}
+                private_key = serialization.load_der_private_key(private_key_der, password=None, **options)
+            except Exception as e:
+                error = e
+
+        with self._condition:
+            self._pending -= 1
+            if private_key is not None and not self._closed:
+                self._keys.append(private_key)
+                self._generated += 1
+                self._generation_seconds += seconds
+                self._generation_seconds_max = max(self._generation_seconds_max, seconds)
+            if isinstance(error, BrokenProcessPool):
+                self._broken = error
+            elif error is not None:
+                # Not refilling after a failure, the next take reports it and restarts generation
+                self._error = error
+            self._condition.notify_all()
+
+    def take(self, timeout=None):
+        """
+        Take a key pair out of the pool, waiting for a generation in progress when it is empty.
+
+        Args:
+            timeout (float): Maximum number of seconds to wait, unlimited when None (default: None).
+
+        Returns:
+            tuple: A tuple (private_key, public_key), as returned by KeyGenerator.generate_key_pair.
+
+        Raises:
+            ValueError: When the pool is closed, key generation failed, or a crashed worker
+                broke the pool and no generated key is left.
+            TimeoutError: When no key pair became ready within the timeout.
+        """
+        start = time.perf_counter()
+        error = None
+        with self._condition:
+            if not self._keys:
+                self._misses += 1
+            while not self._keys:
+                if self._closed:
+                    raise ValueError("Key pool is closed")
+                if self._broken is not None:
+                    raise ValueError(f"Key generation failed, a worker process crashed: {self._broken}")
+                if self._error is not None and not self._pending:
+                    error, self._error = self._error, None
+                    break
+                remaining = None if timeout is None else timeout - (time.perf_counter() - start)
+                if remaining is not None and remaining <= 0:
+                    raise TimeoutError("No key pair became ready in time")
+                self._condition.wait(remaining)
+
+            if error is None:
+                private_key = self._keys.popleft()
+                self._taken += 1
+                self._wait_seconds += time.perf_counter() - start
+        self._refill()
+        if error is not None:
+            raise ValueError(f"Key generation failed: {error}")
+        return private_key, private_key.public_key()
+
+    @property
+    def depth(self):
+        """
+        int: Number of key pairs ready to be taken.
+        """
+        with self._condition:
+            return len(self._keys)
+
+    def metrics(self):
+        """
+        Report the state of the pool and its generation latency.
+
+        Returns:
+            dict: Pool depth, target depth, generations in progress, keys generated and taken,
+                takes that had to wait (misses), total wait time, and the mean and maximum
+                generation time of a key pair in seconds.
+        """
+        with self._condition:
+            generated = self._generated
+            return {
+                "depth": len(self._keys),
+                "target_depth": self.target_depth,
+                "pending": self._pending,
+                "generated": self._generated,
+                "taken": self._taken,
+                "misses": self._misses,
+                "wait_seconds": round(self._wait_seconds, 6),
+                "generation_seconds_mean": round(self._generation_seconds / generated, 6) if generated else None,
+                "generation_seconds_max": round(self._generation_seconds_max, 6) if generated else None,
+            }
+
+    def close(self):
+        """
+        Stop generating keys and drop every key pair still in the pool.
+        """
+        with self._condition:
+            self._closed = True
+            self._keys.clear()
+            self._condition.notify_all()
+        self.executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,193 @@
+"""
+Module providing a registry of trusted public keys looked up by fingerprint.
+
+Signatures carry the fingerprint of the signing key, so a verifier holding a registry
+finds the right key for each document directly, even in archives signed by many
+people. Keys are parsed once when loaded; reloading a directory parses only files
+that are new or changed since.
+"""
+
+import hashlib
+import os
+from cryptography import x509
+from cryptography.hazmat.primitives import serialization
+from key_manager.key_generator import public_key_fingerprint
+
+_PEM_BEGIN = b"-----BEGIN "
+_PEM_END = b"-----END "
+
+
+def _pem_blocks(data):
+    """
+    Split PEM data into its blocks.
+
+    Args:
+        data (bytes): Content of a PEM file, possibly holding several keys or certificates.
+
+    Returns:
+        list: PEM blocks, each with its BEGIN and END lines.
+    """
+    blocks = []
+    start = data.find(_PEM_BEGIN)
+    while start != -1:
+        end = data.find(b"-----", data.find(_PEM_END, start) + len(_PEM_END))
+        if end == -1:
+            break
+        end += len(b"-----")
+        blocks.append(data[start:end])
+        start = data.find(_PEM_BEGIN, end)
+    return blocks
+
+
+def load_public_keys(data):
+    """
+    Parse every public key and certificate in PEM data.
+
+    Args:
+        data (bytes): Content of a PEM file or trust store.
+
+    Returns:
+        list: Public key objects, keys of certificates included.
+
+    Raises:
+        ValueError: When a block is neither a public key nor a certificate.
+    """
+    public_keys = []
+    for block in _pem_blocks(data):
+        if block.startswith(_PEM_BEGIN + b"CERTIFICATE-----"):
+            public_keys.append(x509.load_pem_x509_certificate(block).public_key())
+        else:
+            public_keys.append(serialization.load_pem_public_key(block))
+    return public_keys
+
+
+class KeyRegistry:
+    """
+    Class keeping parsed public keys indexed by their fingerprint.
+
+    Attributes:
+        errors (dict): Files that could not be read by the last load, mapped to the error message.
+    """
+
+    def __init__(self):
+        """
+        Initialize an empty registry.
+        """
+        # fingerprint -> public key
+        self._keys = {}
+        # path -> ((size, mtime_ns), fingerprints of the keys in the file)
+        self._files = {}
+        self.errors = {}
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __contains__(self, fingerprint):
+        return fingerprint in self._keys
+
+    @classmethod
+    def from_path(cls, path):
+        """
+        Create a registry from a directory or trust store file.
+
+        Args:
+            path (str): Directory of .pem files or a single PEM file, see load.
+
+        Returns:
+            KeyRegistry: Registry with the loaded keys.
+        """
+        registry = cls()
+        registry.load(path)
+        return registry
+
+    def add(self, public_key):
+        """
+        Register a public key.
+
+        Args:
+            public_key: Public key object.
+
+        Returns:
+            str: Fingerprint of the key.
+        """
+        fingerprint = public_key_fingerprint(public_key)
+        self._keys[fingerprint] = public_key
+        return fingerprint
+
+    def get(self, fingerprint):
+        """
+        Find the public key with the given fingerprint.
+
+        Args:
+            fingerprint (str): Fingerprint, see public_key_fingerprint.
+
+        Returns:
+            Public key object, or None when the key is not registered.
+        """
+        return self._keys.get(fingerprint)
+
+    def fingerprints(self):
+        """
+        Get the fingerprints of all registered keys.
+
+        Returns:
+            list: Sorted fingerprints.
+        """
+        return sorted(self._keys)
+
+    @property
+    def digest(self):
+        """
+        str: Hex-encoded SHA-256 hash of all fingerprints, it changes whenever the set of keys does.
+        """
+        return hashlib.sha256("".join(self.fingerprints()).encode("ascii")).hexdigest()
+
+    def load(self, path):
+        """
+        Load public keys from a directory of .pem files or from a single PEM file.
+
+        A PEM file may hold several public keys and certificates. Files already loaded
+        are parsed again only when their size or modification time changed. Files that
+        cannot be read are skipped and reported in errors.
+
+        Args:
+            path (str): Directory or PEM file.
+
+        Returns:
+            int: Number of registered keys.
+        """
+        if os.path.isdir(path):
+            paths = [os.path.join(path, name) for name in sorted(os.listdir(path)) if name.lower().endswith(".pem")]
+        else:
+            paths = [path]
+
+        self.errors = {}
+        for file_path in paths:
+            self._load_file(file_path)
+        return len(self._keys)
+
+    def _load_file(self, path):
+        """
+        Register the keys of a single PEM file unless it is unchanged since the last load.
+        """
+        try:
+            stat = os.stat(path)
+            identity = (stat.st_size, stat.st_mtime_ns)
+            known = self._files.get(path)
+            if known and known[0] == identity:
+                return
+
+            with open(path, "rb") as key_file:
+                public_keys = load_public_keys(key_file.read())
+            if not public_keys:
+                raise ValueError("No public key or certificate found")
+        except (OSError, ValueError, TypeError) as e:
+            self.errors[path] = str(e)
+            return
+
+        self._files[path] = (identity, [self.add(public_key) for public_key in public_keys])
+        if known:
+            # Keys removed from the file are dropped unless another file still provides them
+            remaining = {fingerprint for _, fingerprints in self._files.values() for fingerprint in fingerprints}
+            for fingerprint in set(known[1]) - remaining:
+                self._keys.pop(fingerprint, None)
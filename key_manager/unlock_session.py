@@ -0,0 +1,152 @@
+"""
+Module providing a time- and use-limited session holding an unlocked private key.
+"""
+
+import os
+import threading
+import time
+from key_manager.key_generator import load_private_key
+from key_manager.usb_storage import UsbStorage
+
+
+class UnlockSession:
+    """
+    Class keeping a decrypted private key in memory for a bounded time or number of signatures.
+
+    Unlocking pays for PBKDF2 and PEM parsing once, afterwards the parsed key is handed
+    out until the session expires, its signature budget is used up, the key file
+    disappears (e.g. the USB drive is removed) or it is locked explicitly.
+
+    Wiping drops every reference to the key object held by the session. The key material
+    itself lives inside the cryptography backend and is freed once no signer uses it.
+
+    Attributes:
+        max_age (float): Number of seconds the key stays unlocked.
+        max_signatures (int): Number of signatures allowed before the key is wiped, unlimited when None.
+        encrypted_key_path (str): Path to the encrypted key file the session was unlocked from.
+    """
+
+    def __init__(self, max_age=300, max_signatures=100, clock=time.monotonic):
+        """
+        Initialize a locked session.
+
+        Args:
+            max_age (float): Number of seconds the key stays unlocked (default: 300).
+            max_signatures (int): Number of signatures allowed before the key is wiped,
+                unlimited when None (default: 100).
+            clock (callable): Monotonic time source (default: time.monotonic).
+        """
+        self.max_age = max_age
+        self.max_signatures = max_signatures
+        self.encrypted_key_path = None
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._private_key = None
+        self._unlocked_at = None
+        self._signatures = 0
+
+    def unlock(self, encrypted_key_path, pin):
+        """
+        Decrypt the private key stored on the USB drive and keep it in the session.
+
+        Args:
+            encrypted_key_path (str): Path to the encrypted key file.
+            pin (str): PIN used for decryption.
+
+        Raises:
+            ValueError: When the key file does not exist, the PIN is invalid or the key cannot be read.
+        """
+        encrypted_data = UsbStorage.load_from_usb(encrypted_key_path)
+        private_key = load_private_key(encrypted_data, pin)
+        with self._lock:
+            self._private_key = private_key
+            self.encrypted_key_path = encrypted_key_path
+            self._unlocked_at = self._clock()
+            self._signatures = 0
+
+    def lock(self):
+        """
+        Wipe the private key from the session.
+        """
+        with self._lock:
+            self._wipe()
+
+    def _wipe(self):
+        """
+        Drop the key and reset the session state, the caller must hold the lock.
+        """
+        self._private_key = None
+        self._unlocked_at = None
+        self._signatures = 0
+
+    def _expired(self):
+        """
+        Check the session limits and wipe the key when any of them is exceeded, the caller must hold the lock.
+        """
+        if self._private_key is None:
+            return True
+        if self._clock() - self._unlocked_at >= self.max_age \
+                or (self.max_signatures is not None and self._signatures >= self.max_signatures) \
+                or not os.path.exists(self.encrypted_key_path):
+            self._wipe()
+            return True
+        return False
+
+    @property
+    def is_unlocked(self):
+        """
+        bool: True when the session holds a usable private key.
+        """
+        with self._lock:
+            return not self._expired()
+
+    @property
+    def remaining_signatures(self):
+        """
+        int: Number of signatures left before the key is wiped, None when unlimited.
+        """
+        with self._lock:
+            if self._expired():
+                return 0
+            if self.max_signatures is None:
+                return None
+            return self.max_signatures - self._signatures
+
+    @property
+    def public_key(self):
+        """
+        Public key belonging to the unlocked private key, None when locked. Not counted as a signature.
+        """
+        with self._lock:
+            if self._expired():
+                return None
+            return self._private_key.public_key()
+
+    def acquire_key(self):
+        """
+        Get the unlocked private key for one signature, counting it against the session budget.
+
+        Returns:
+            Private key object, ready to be passed to PDFSigner.
+
+        Raises:
+            ValueError: When the session is locked or expired.
+        """
+        with self._lock:
+            if self._expired():
+                raise ValueError("Private key is locked. Unlock it with the PIN first.")
+            self._signatures += 1
+            return self._private_key
+
+    def check_device(self, usb_drives):
+        """
+        Wipe the key when the USB drive it was unlocked from has been removed.
+
+        Args:
+            usb_drives (list): Currently detected USB drive paths.
+        """
+        with self._lock:
+            if self._private_key is None:
+                return
+            if not usb_drives or not os.path.exists(self.encrypted_key_path):
+                self._wipe()
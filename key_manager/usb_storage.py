@@ -6,6 +6,15 @@ import os
 import platform
 import psutil
 import string
+import time
+from cryptography.hazmat.primitives import serialization
+from key_manager.key_generator import public_key_fingerprint
+from common.atomic_output import DURABILITY_FSYNC_DIR, write_atomic
+from common.instrumentation import stage
+
+# Suffix of the public key stored next to an encrypted key file, private_key.key -> private_key.pub.pem.
+# Not a plain .pem, which would pass the public key off as an unencrypted private key
+PUBLIC_KEY_SUFFIX = '.pub.pem'
 
 class UsbStorage:
     """
@@ -51,14 +60,18 @@ class UsbStorage:
         return usb_drives
     
     @staticmethod
-    def save_to_usb(usb_path, filename, data):
+    def save_to_usb(usb_path, filename, data, durability=DURABILITY_FSYNC_DIR):
         """
         Save data to a file on the USB drive.
 
+        The file is replaced atomically and, by default, flushed together with its directory,
+        so a drive pulled out right after saving holds either the previous file or the new one.
+
         Args:
             usb_path (str): Path to the USB drive.
             filename (str): Name of the file to save data to.
             data (bytes): Data to be saved.
+            durability (str): Durability level, see common.atomic_output (default: DURABILITY_FSYNC_DIR).
 
         Returns:
             str: Full path to the saved file.
@@ -71,8 +84,9 @@ class UsbStorage:
             
         full_path = os.path.join(usb_path, filename)
         
-        with open(full_path, 'wb') as f:
-            f.write(data)
+        with stage("usb.write") as write:
+            write_atomic(full_path, data, durability)
+            write.add_bytes(len(data))
             
         return full_path
     
@@ -93,5 +107,243 @@ class UsbStorage:
         if not os.path.exists(filepath):
             raise ValueError(f"File {filepath} does not exist")
             
-        with open(filepath, 'rb') as f:
-            return f.read()
+        with stage("usb.read") as read, open(filepath, 'rb') as f:
+            data = f.read()
+            read.add_bytes(len(data))
+            return data
+
+
+class UsbMonitor:
+    """
+    Class waiting for USB drives to be added or removed.
+
+    On Linux udev events are received through a pyudev.Monitor, so drives are only
+    enumerated after an actual change. Bursts of events (one per partition, add and
+    change events) are debounced into a single re-enumeration. When pyudev is not
+    available, the drive list is polled and a change is reported only after it stays
+    stable for the debounce period.
+    """
+
+    def __init__(self, debounce=0.5, poll_timeout=1.0, fallback_interval=2.0):
+        """
+        Initialize the monitor.
+
+        Args:
+            debounce (float): Quiet period in seconds closing a burst of changes (default: 0.5).
+            poll_timeout (float): Maximum time in seconds a single wait for udev events blocks (default: 1.0).
+            fallback_interval (float): Polling interval in seconds without udev (default: 2.0).
+        """
+        self.debounce = debounce
+        self.poll_timeout = poll_timeout
+        self.fallback_interval = fallback_interval
+        self._monitor = None
+
+        if platform.system() == 'Linux':
+            try:
+                import pyudev
+                self._monitor = pyudev.Monitor.from_netlink(pyudev.Context())
+                self._monitor.filter_by(subsystem='block', device_type='partition')
+                self._monitor.start()
+            except Exception:
+                self._monitor = None
+
+    @property
+    def event_driven(self):
+        """
+        bool: True when changes are detected from udev events instead of polling.
+        """
+        return self._monitor is not None
+
+    def wait_for_change(self, current_drives):
+        """
+        Wait a bounded time for the list of USB drives to change.
+
+        Args:
+            current_drives (list): Currently known USB drive paths.
+
+        Returns:
+            list or None: New list of USB drive paths, None when nothing changed in the meantime.
+        """
+        if self._monitor is not None:
+            if self._monitor.poll(timeout=self.poll_timeout) is None:
+                return None
+            # Draining the rest of the burst before enumerating drives once
+            while self._monitor.poll(timeout=self.debounce) is not None:
+                pass
+            usb_drives = UsbStorage.get_usb_drives()
+        else:
+            time.sleep(self.fallback_interval)
+            usb_drives = UsbStorage.get_usb_drives()
+            if usb_drives == current_drives:
+                return None
+            # Reporting the change only once the drive list is stable
+            time.sleep(self.debounce)
+            if UsbStorage.get_usb_drives() != usb_drives:
+                return None
+
+        return usb_drives if usb_drives != current_drives else None
+
+
+class KeyFileEntry:
+    """
+    Encrypted private key file found on a USB drive.
+
+    Attributes:
+        path (str): Full path to the encrypted key file.
+        size (int): Size of the key file in bytes.
+        mtime_ns (int): Modification time of the key file in nanoseconds.
+        fingerprint (str): Fingerprint of the matching public key stored next to the key
+            file as <name>.pub.pem, None when there is no readable public key.
+    """
+
+    def __init__(self, path, size, mtime_ns, fingerprint=None):
+        """
+        Initialize the key file entry.
+
+        Args:
+            path (str): Full path to the encrypted key file.
+            size (int): Size of the key file in bytes.
+            mtime_ns (int): Modification time of the key file in nanoseconds.
+            fingerprint (str): Fingerprint of the matching public key (default: None).
+        """
+        self.path = path
+        self.size = size
+        self.mtime_ns = mtime_ns
+        self.fingerprint = fingerprint
+
+    @property
+    def name(self):
+        """
+        str: File name of the key file.
+        """
+        return os.path.basename(self.path)
+
+    def describe(self):
+        """
+        Format a short description of the key for choosing among several keys.
+
+        Returns:
+            str: File name followed by the beginning of the public key fingerprint.
+        """
+        if self.fingerprint:
+            return f"{self.name} ({self.fingerprint[:16]})"
+        return self.name
+
+
+class KeyIndex:
+    """
+    Class keeping an index of encrypted key files per mounted volume.
+
+    The root directory of a volume is listed again only when its modification time
+    changes, otherwise only the already known key files are checked with stat.
+    Public key fingerprints are recomputed only for files whose size or modification
+    time changed.
+    """
+
+    def __init__(self):
+        """
+        Initialize an empty index.
+        """
+        # volume -> (root directory mtime_ns, {key file name: (key stat, public key stat, KeyFileEntry)})
+        self._volumes = {}
+
+    @staticmethod
+    def _stat(path):
+        """
+        Get (size, mtime_ns) of a file, None when it does not exist.
+        """
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return stat.st_size, stat.st_mtime_ns
+
+    @staticmethod
+    def _fingerprint(public_key_path):
+        """
+        Compute the fingerprint of a public key file, None when it cannot be read.
+        """
+        try:
+            with open(public_key_path, 'rb') as key_file:
+                return public_key_fingerprint(serialization.load_pem_public_key(key_file.read()))
+        except (OSError, ValueError, TypeError):
+            return None
+
+    def refresh(self, volume):
+        """
+        Update the index of a volume and return its key files.
+
+        Args:
+            volume (str): Path to the root directory of the volume.
+
+        Returns:
+            list: KeyFileEntry objects sorted by file name, empty when the volume cannot be read.
+        """
+        try:
+            volume_mtime = os.stat(volume).st_mtime_ns
+        except OSError:
+            self.forget(volume)
+            return []
+
+        cached_mtime, cached = self._volumes.get(volume, (None, {}))
+        if cached_mtime == volume_mtime:
+            names = list(cached)
+        else:
+            try:
+                names = [entry.name for entry in os.scandir(volume)
+                         if entry.name.endswith('.key') and entry.is_file()]
+            except OSError:
+                self.forget(volume)
+                return []
+
+        index = {}
+        for name in names:
+            key_path = os.path.join(volume, name)
+            key_stat = self._stat(key_path)
+            if key_stat is None:
+                continue
+            public_key_path = os.path.splitext(key_path)[0] + PUBLIC_KEY_SUFFIX
+            public_key_stat = self._stat(public_key_path)
+
+            previous = cached.get(name)
+            if previous and previous[0] == key_stat and previous[1] == public_key_stat:
+                index[name] = previous
+                continue
+
+            fingerprint = self._fingerprint(public_key_path) if public_key_stat else None
+            entry = KeyFileEntry(key_path, key_stat[0], key_stat[1], fingerprint)
+            index[name] = (key_stat, public_key_stat, entry)
+
+        self._volumes[volume] = (volume_mtime, index)
+        return self.keys(volume)
+
+    def keys(self, volume):
+        """
+        Return the indexed key files of a volume without touching the disk.
+
+        Args:
+            volume (str): Path to the root directory of the volume.
+
+        Returns:
+            list: KeyFileEntry objects sorted by file name.
+        """
+        _, index = self._volumes.get(volume, (None, {}))
+        return [index[name][2] for name in sorted(index)]
+
+    def forget(self, volume):
+        """
+        Remove a volume from the index, e.g. after the USB drive has been removed.
+
+        Args:
+            volume (str): Path to the root directory of the volume.
+        """
+        self._volumes.pop(volume, None)
+
+    def volumes(self):
+        """
+        Return the indexed volumes.
+
+        Returns:
+            list: Paths of indexed volumes.
+        """
+        return list(self._volumes)
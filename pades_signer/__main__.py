@@ -0,0 +1,9 @@
+"""
+Entry point of `python -m pades_signer`, see pades_signer.cli.
+"""
+
+import sys
+from pades_signer.cli import main
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,256 @@
+"""
+Module providing asyncio counterparts of signing, verification, key decryption and USB storage.
+
+Parsing, hashing and key operations hold the GIL, so running them in threads would
+still stall the event loop. They are executed by AsyncExecutor on worker processes
+instead, with a bounded number of jobs in flight. USB reads and writes only wait
+for the disk and run on threads.
+
+Usage:
+    async with AsyncExecutor(workers=4) as executor:
+        private_key = await load_private_key(encrypted_data, pin, executor)
+        signer = AsyncPDFSigner(private_key, executor)
+        await signer.sign_document("input.pdf", "signed.pdf", "John Doe", incremental=True)
+"""
+
+import asyncio
+import functools
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.serialization import load_pem_private_key
+from key_manager.usb_storage import UsbStorage
+from common.atomic_output import DURABILITY_FSYNC_DIR
+from pades_signer.jobs import decrypt_job, init_service_worker, private_key_der, sign_job, verify_job, warm_up
+
+
+class AsyncExecutor:
+    """
+    Class running CPU-bound jobs on worker processes without blocking the event loop.
+
+    At most max_concurrency jobs are submitted to the workers at a time, further jobs
+    wait in the event loop. Cancelling the awaiting task withdraws a job that has not
+    started yet; a job already running finishes in its worker and keeps its slot until
+    then, its result is dropped.
+
+    Attributes:
+        workers (int): Number of worker processes.
+        max_concurrency (int): Maximum number of jobs submitted to the workers at a time.
+    """
+
+    def __init__(self, workers=None, max_concurrency=None):
+        """
+        Initialize the executor, worker processes are started with the first job.
+
+        Args:
+            workers (int): Number of worker processes, the CPU count when None (default: None).
+            max_concurrency (int): Maximum number of jobs submitted at a time, the number
+                of workers when None (default: None).
+        """
+        self.workers = workers or os.cpu_count() or 1
+        self.max_concurrency = max_concurrency or self.workers
+        # Spawned workers, forking a process running an event loop and its threads is not safe.
+        # Documents come from callers that may truncate them, workers do not map them
+        self.executor = ProcessPoolExecutor(max_workers=self.workers, initializer=init_service_worker,
+                                            mp_context=multiprocessing.get_context("spawn"))
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+    async def start(self):
+        """
+        Start the worker processes ahead of the first job, so it does not pay for their imports.
+        """
+        await self.run(warm_up)
+
+    async def run(self, function, *args):
+        """
+        Run a module-level function on a worker process.
+
+        Args:
+            function (callable): Function to run, it and its arguments must be picklable.
+            *args: Arguments passed to the function.
+
+        Returns:
+            Return value of the function.
+        """
+        await self._semaphore.acquire()
+        try:
+            future = self.executor.submit(function, *args)
+        except BaseException:
+            self._semaphore.release()
+            raise
+        # The slot is freed when the job is done, not when the awaiting task is cancelled
+        future.add_done_callback(functools.partial(self._release_slot, asyncio.get_running_loop()))
+        # Cancelling the wrapped future also cancels the job if it has not started yet
+        return await asyncio.wrap_future(future)
+
+    def _release_slot(self, loop, future):
+        """
+        Free the slot of a job once it is done, called by the thread completing its future.
+        """
+        try:
+            loop.call_soon_threadsafe(self._semaphore.release)
+        except RuntimeError:
+            # The event loop is closed, no job waits for the slot anymore
+            pass
+
+    async def close(self):
+        """
+        Withdraw jobs that have not started and wait for the worker processes to stop.
+        """
+        await asyncio.to_thread(self.executor.shutdown, wait=True, cancel_futures=True)
+
+
+async def decrypt_private_key(encrypted_data, pin, executor):
+    """
+    Decrypt a private key using the provided PIN, see key_generator.decrypt_private_key.
+
+    Args:
+        encrypted_data (bytes): Encrypted key data.
+        pin (str): PIN used for decryption.
+        executor (AsyncExecutor): Executor running the decryption.
+
+    Returns:
+        bytes: Decrypted private key in PEM format.
+
+    Raises:
+        ValueError: When PIN is invalid or the key cannot be read.
+    """
+    return await executor.run(decrypt_job, encrypted_data, pin)
+
+
+async def load_private_key(encrypted_data, pin, executor):
+    """
+    Decrypt and parse a private key using the provided PIN, see key_generator.load_private_key.
+
+    Args:
+        encrypted_data (bytes): Encrypted key data.
+        pin (str): PIN used for decryption.
+        executor (AsyncExecutor): Executor running the decryption.
+
+    Returns:
+        Private key object.
+
+    Raises:
+        ValueError: When PIN is invalid or the key cannot be read.
+    """
+    private_key_pem = await decrypt_private_key(encrypted_data, pin, executor)
+    # Validated by the worker, parsing it again without validation does not block the loop
+    return load_pem_private_key(private_key_pem, password=None, unsafe_skip_rsa_key_validation=True)
+
+
+class AsyncPDFSigner:
+    """
+    Asyncio counterpart of PDFSigner.
+    """
+
+    def __init__(self, private_key, executor):
+        """
+        Initialize the signer.
+
+        Args:
+            private_key: Parsed private key object, e.g. from load_private_key.
+            executor (AsyncExecutor): Executor running the signing jobs.
+        """
+        self.executor = executor
+        self._private_key_der = private_key_der(private_key)
+
+    async def sign_document(self, pdf_path, output_path, signer_name, incremental=False):
+        """
+        Sign a PDF document, see PDFSigner.sign_document.
+
+        Args:
+            pdf_path (str): Path to the PDF document to be signed.
+            output_path (str): Path where the signed document will be saved.
+            signer_name (str): Name of the person signing the document.
+            incremental (bool): Sign with an incremental update (default: False).
+
+        Returns:
+            str: Path to the signed document.
+        """
+        return await self.executor.run(sign_job, self._private_key_der, pdf_path, output_path, signer_name,
+                                       incremental)
+
+
+class AsyncSignatureVerifier:
+    """
+    Asyncio counterpart of SignatureVerifier.
+    """
+
+    def __init__(self, public_key, executor):
+        """
+        Initialize the verifier.
+
+        Args:
+            public_key: Public key used for signature verification.
+            executor (AsyncExecutor): Executor running the verification jobs.
+        """
+        self.executor = executor
+        self._public_key_pem = public_key.public_bytes(
+            encoding=serialization.Encoding.PEM,
+            format=serialization.PublicFormat.SubjectPublicKeyInfo
+        )
+
+    async def verify_signature(self, pdf_path):
+        """
+        Verify the digital signature in a PDF document, see SignatureVerifier.verify_signature.
+
+        Args:
+            pdf_path (str): Path to the signed PDF file.
+
+        Returns:
+            tuple: (is_valid, message) as returned by SignatureVerifier.verify_signature.
+        """
+        return await self.executor.run(verify_job, self._public_key_pem, pdf_path)
+
+
+class AsyncUsbStorage:
+    """
+    Asyncio counterpart of UsbStorage, file operations run on threads.
+    """
+
+    @staticmethod
+    async def get_usb_drives():
+        """
+        Detect connected USB drives, see UsbStorage.get_usb_drives.
+
+        Returns:
+            list: Paths to mounted USB drives.
+        """
+        return await asyncio.to_thread(UsbStorage.get_usb_drives)
+
+    @staticmethod
+    async def save_to_usb(usb_path, filename, data, durability=DURABILITY_FSYNC_DIR):
+        """
+        Save data to a file on a USB drive, see UsbStorage.save_to_usb.
+
+        Args:
+            usb_path (str): Path to the USB drive.
+            filename (str): Name of the file to create.
+            data (bytes): Data to save.
+            durability (str): Durability level, see common.atomic_output (default: DURABILITY_FSYNC_DIR).
+
+        Returns:
+            str: Path to the saved file.
+        """
+        return await asyncio.to_thread(UsbStorage.save_to_usb, usb_path, filename, data, durability)
+
+    @staticmethod
+    async def load_from_usb(filepath):
+        """
+        Load data from a file on a USB drive, see UsbStorage.load_from_usb.
+
+        Args:
+            filepath (str): Path to the file.
+
+        Returns:
+            bytes: Loaded data.
+        """
+        return await asyncio.to_thread(UsbStorage.load_from_usb, filepath)
@@ -0,0 +1,560 @@
+"""
+Module providing headless batch signing of PDF documents using a pool of worker processes.
+
+Usage:
+    Sign every PDF in a directory with the private key stored on a USB drive:
+    $ python -m pades_signer.batch_signer invoices/ --key /media/usb/private_key.key --signer "ACME"
+"""
+
+import argparse
+import getpass
+import glob
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+
+from common.atomic_output import DURABILITY_FSYNC, DURABILITY_LEVELS, check_durability
+from pades_signer.detached import DETACHED_SUFFIX
+from pades_signer.merkle import MerkleBatchSigner
+from pades_signer.pdf_signer import PDFSigner
+from pades_signer.timestamping import timestamp_prepared
+
+# Signer instance owned by a worker process, created once by _init_worker
+_worker_signer = None
+
+# Prefix added to the file name of signed copies
+SIGNED_PREFIX = "signed_"
+
+
+def _is_within(path, directory):
+    """
+    Check whether a path lies inside a directory.
+    """
+    path = os.path.normcase(os.path.abspath(path))
+    directory = os.path.normcase(os.path.abspath(directory))
+    return os.path.commonpath([path, directory]) == directory
+
+
+def collect_documents(source, prefix=SIGNED_PREFIX, output_dir=None):
+    """
+    Collect paths of PDF documents to sign from a directory, glob pattern or manifest file.
+
+    A manifest is a text file listing one PDF path per line. Empty lines and lines
+    starting with '#' are ignored, relative paths are resolved against the manifest directory.
+    Signed copies written by earlier runs are skipped when a directory is scanned, so running
+    a batch again over the same directory does not sign them a second time. Documents named
+    by a manifest or a glob pattern are always collected, whatever their name.
+
+    Args:
+        source (str): Directory, glob pattern or path to a manifest file.
+        prefix (str): File name prefix of signed copies skipped in directories, nothing is
+            skipped by name when None (default: SIGNED_PREFIX).
+        output_dir (str): Directory of signed copies, documents inside it are skipped (default: None).
+
+    Returns:
+        list: Sorted list of PDF document paths.
+
+    Raises:
+        ValueError: When the source does not match any document.
+    """
+    if os.path.isdir(source):
+        paths = [os.path.join(source, name) for name in os.listdir(source)
+                 if name.lower().endswith('.pdf') and not (prefix and name.startswith(prefix))]
+    elif os.path.isfile(source) and not source.lower().endswith('.pdf'):
+        manifest_dir = os.path.dirname(os.path.abspath(source))
+        paths = []
+        with open(source, 'r', encoding='utf-8') as manifest:
+            for line in manifest:
+                line = line.strip()
+                if not line or line.startswith('#'):
+                    continue
+                paths.append(line if os.path.isabs(line) else os.path.join(manifest_dir, line))
+    else:
+        paths = glob.glob(source, recursive=True)
+
+    paths = sorted(path for path in paths if os.path.isfile(path)
+                   and not (output_dir and _is_within(path, output_dir)))
+    if not paths:
+        raise ValueError(f"No PDF documents found in {source}")
+    return paths
+
+
+class SignResult:
+    """
+    Outcome of signing a single document in a batch.
+
+    Attributes:
+        pdf_path (str): Path to the input document.
+        output_path (str): Path to the signed document, None when signing failed.
+        error (str): Error message, None when signing succeeded.
+        duration (float): Time spent signing the document in seconds.
+        prepared: Signed document not written yet, see PDFSigner.prepare_rewrite, None once written.
+    """
+
+    def __init__(self, pdf_path, output_path=None, error=None, duration=0.0, prepared=None):
+        """
+        Initialize the result of signing a single document.
+
+        Args:
+            pdf_path (str): Path to the input document.
+            output_path (str): Path to the signed document (default: None).
+            error (str): Error message (default: None).
+            duration (float): Time spent signing the document in seconds (default: 0.0).
+            prepared: Signed document not written yet (default: None).
+        """
+        self.pdf_path = pdf_path
+        self.output_path = output_path
+        self.error = error
+        self.duration = duration
+        self.prepared = prepared
+
+    @property
+    def ok(self):
+        """
+        bool: True when the document was signed successfully.
+        """
+        return self.error is None
+
+
+class BatchResult:
+    """
+    Summary of a batch signing run.
+
+    Attributes:
+        results (list): List of SignResult objects, one per document.
+        elapsed (float): Wall time of the whole batch in seconds.
+    """
+
+    def __init__(self, results, elapsed):
+        """
+        Initialize the batch summary.
+
+        Args:
+            results (list): List of SignResult objects, one per document.
+            elapsed (float): Wall time of the whole batch in seconds.
+        """
+        self.results = results
+        self.elapsed = elapsed
+
+    @property
+    def succeeded(self):
+        """
+        int: Number of documents signed successfully.
+        """
+        return sum(1 for result in self.results if result.ok)
+
+    @property
+    def failed(self):
+        """
+        int: Number of documents that could not be signed.
+        """
+        return len(self.results) - self.succeeded
+
+    @property
+    def docs_per_second(self):
+        """
+        float: Throughput of successfully signed documents.
+        """
+        if self.elapsed <= 0:
+            return 0.0
+        return self.succeeded / self.elapsed
+
+    def summary(self):
+        """
+        Format a one-line human-readable summary of the batch.
+
+        Returns:
+            str: Summary with counts, elapsed time and throughput.
+        """
+        return (f"Signed {self.succeeded}/{len(self.results)} documents "
+                f"({self.failed} failed) in {self.elapsed:.2f}s, "
+                f"{self.docs_per_second:.2f} docs/sec")
+
+
+def _init_worker(private_key_pem, durability=DURABILITY_FSYNC):
+    """
+    Create the signer of a worker process, so the private key is parsed once per process.
+
+    Args:
+        private_key_pem (bytes): Decrypted private key in PEM format.
+        durability (str): Durability of the written files, see common.atomic_output (default: DURABILITY_FSYNC).
+    """
+    global _worker_signer
+    _worker_signer = PDFSigner(private_key_pem, durability=durability)
+
+
+def _sign_one(pdf_path, output_path, signer_name, incremental=False, detached=False, prepare=False):
+    """
+    Sign a single document with the worker signer, isolating any failure in the result.
+
+    Args:
+        pdf_path (str): Path to the PDF document to be signed.
+        output_path (str): Path where the signed document (or detached signature) will be saved.
+        signer_name (str): Name of the person signing the document.
+        incremental (bool): Append an incremental update instead of rewriting the document (default: False).
+        detached (bool): Write a detached signature file instead of a signed document (default: False).
+        prepare (bool): Sign without writing, the result carries the prepared document (default: False).
+
+    Returns:
+        SignResult: Outcome of signing the document.
+    """
+    start = time.perf_counter()
+    try:
+        prepared = None
+        if prepare and detached:
+            prepared = _worker_signer.prepare_detached(pdf_path, signer_name, output_path)
+        elif prepare:
+            prepared = _worker_signer.prepare_rewrite(pdf_path, output_path, signer_name)
+        elif detached:
+            _worker_signer.sign_detached(pdf_path, signer_name, output_path)
+        else:
+            _worker_signer.sign_document(pdf_path, output_path, signer_name, incremental)
+        return SignResult(pdf_path, output_path, duration=time.perf_counter() - start, prepared=prepared)
+    except Exception as e:
+        return SignResult(pdf_path, error=str(e), duration=time.perf_counter() - start)
+
+
+def _write_prepared(prepared):
+    """
+    Write a prepared document, isolating any failure.
+
+    Args:
+        prepared: Signed document, see PDFSigner.prepare_rewrite and PDFSigner.prepare_detached.
+
+    Returns:
+        tuple: (error, duration), error being None when the document was written.
+    """
+    start = time.perf_counter()
+    try:
+        prepared.write()
+        return None, time.perf_counter() - start
+    except Exception as e:
+        return str(e), time.perf_counter() - start
+
+
+class BatchSigner:
+    """
+    Class responsible for signing many PDF documents in parallel with a single private key.
+    """
+
+    def __init__(self, private_key_pem, signer_name, output_dir=None, workers=None, prefix=SIGNED_PREFIX,
+                 incremental=False, detached=False, merkle=False, timestamp_client=None,
+                 durability=DURABILITY_FSYNC):
+        """
+        Initialize the batch signer.
+
+        Args:
+            private_key_pem (bytes): Decrypted private key in PEM format, see decrypt_private_key.
+            signer_name (str): Name of the person signing the documents.
+            output_dir (str): Directory for signed documents, next to the inputs when None (default: None).
+            workers (int): Number of worker processes, CPU count when None (default: None).
+            prefix (str): Prefix added to the file name of signed documents (default: SIGNED_PREFIX).
+            incremental (bool): Append an incremental update instead of rewriting documents (default: False).
+            detached (bool): Write detached signature files named after the documents instead of
+                signed copies, the prefix is not used (default: False).
+            merkle (bool): Sign all documents incrementally with a single signature over a Merkle
+                tree of their digests, see MerkleBatchSigner (default: False).
+            timestamp_client (TimestampClient): Client of an RFC 3161 time-stamping authority; all
+                signatures of a batch are timestamped with a single request once they are made,
+                not supported with incremental or Merkle signatures (default: None).
+            durability (str): Durability of signed documents and signature files, see
+                common.atomic_output (default: DURABILITY_FSYNC).
+
+        Raises:
+            ValueError: When timestamps are requested for incremental or Merkle signatures, or
+                the durability level is not known.
+        """
+        if timestamp_client and (incremental or merkle):
+            raise ValueError("Timestamps are not supported for incremental signatures")
+        self.private_key_pem = private_key_pem
+        self.signer_name = signer_name
+        self.output_dir = output_dir
+        self.workers = workers or os.cpu_count() or 1
+        self.prefix = prefix
+        self.incremental = incremental
+        self.detached = detached
+        self.merkle = merkle
+        self.timestamp_client = timestamp_client
+        self.durability = check_durability(durability)
+
+    def output_path_for(self, pdf_path):
+        """
+        Compute the path where the signed copy of a document will be saved.
+
+        Args:
+            pdf_path (str): Path to the input document.
+
+        Returns:
+            str: Path to the signed document, or to its detached signature file.
+        """
+        file_dir = self.output_dir or os.path.dirname(pdf_path)
+        if self.detached:
+            return os.path.join(file_dir, os.path.basename(pdf_path) + DETACHED_SUFFIX)
+        return os.path.join(file_dir, f"{self.prefix}{os.path.basename(pdf_path)}")
+
+    def check_output_paths(self, pdf_paths):
+        """
+        Check that no two documents would be saved to the same path.
+
+        Args:
+            pdf_paths (list): Paths to the PDF documents to be signed.
+
+        Raises:
+            ValueError: When output paths collide, nothing has been written yet.
+        """
+        seen = {}
+        for pdf_path in pdf_paths:
+            output_path = os.path.normcase(os.path.abspath(self.output_path_for(pdf_path)))
+            if output_path in seen:
+                raise ValueError(f"{seen[output_path]} and {pdf_path} would both be saved to "
+                                 f"{self.output_path_for(pdf_path)}")
+            seen[output_path] = pdf_path
+
+    def sign(self, pdf_paths, on_result=None):
+        """
+        Sign all given documents, spreading the work across the worker pool.
+
+        A failure of one document never interrupts the batch, it is reported in its result.
+        With timestamps, results are reported once the whole batch is timestamped.
+
+        Args:
+            pdf_paths (list): Paths to the PDF documents to be signed.
+            on_result (callable): Called with each SignResult as soon as it is ready (default: None).
+
+        Returns:
+            BatchResult: Per-document results in input order and overall throughput.
+
+        Raises:
+            ValueError: When documents would be saved to the same output path, e.g. inputs
+                from different directories sharing a file name with output_dir.
+        """
+        self.check_output_paths(pdf_paths)
+        if self.output_dir:
+            os.makedirs(self.output_dir, exist_ok=True)
+
+        start = time.perf_counter()
+        report = None if self.timestamp_client else on_result
+        if self.merkle:
+            results = self._sign_merkle(pdf_paths, report)
+        elif self.workers == 1:
+            results = self._sign_in_process(pdf_paths, report)
+        else:
+            results = self._sign_in_pool(pdf_paths, report)
+        if self.timestamp_client and on_result:
+            for result in results:
+                on_result(result)
+        return BatchResult(results, time.perf_counter() - start)
+
+    def _timestamp(self, results, executor=None):
+        """
+        Timestamp every signature of the batch with one request, then write each signed document once.
+
+        Documents are prepared without being written, see PDFSigner.prepare_rewrite, so the
+        timestamp is stored in the same write as the signature. Failures are reported in the
+        results, documents whose signature could not be timestamped are not written.
+
+        Args:
+            results (list): Results of preparing the documents.
+            executor (ProcessPoolExecutor): Pool writing the documents, they are written in
+                the current process when None (default: None).
+        """
+        signed = [result for result in results if result.ok]
+        if not signed:
+            return
+        start = time.perf_counter()
+        try:
+            errors = timestamp_prepared([result.prepared for result in signed], self.timestamp_client)
+        except (OSError, ValueError) as e:
+            errors = [str(e)] * len(signed)
+        # The single request is shared by all documents of the batch
+        duration = (time.perf_counter() - start) / len(signed)
+        for result, error in zip(signed, errors):
+            result.duration += duration
+            if error:
+                result.prepared.discard()
+                result.prepared = None
+                result.output_path = None
+                result.error = f"Timestamping failed: {error}"
+        signed = [result for result in signed if result.ok]
+
+        futures = {}
+        if executor:
+            try:
+                for result in signed:
+                    futures[executor.submit(_write_prepared, result.prepared)] = result
+            except BrokenProcessPool:
+                # A worker crashed while signing, the remaining documents are written here
+                pass
+        outcomes = {}
+        for future in as_completed(futures):
+            try:
+                outcomes[futures[future]] = future.result()
+            except BrokenProcessPool as e:
+                futures[future].prepared.discard()
+                outcomes[futures[future]] = (f"Worker process crashed: {str(e)}", 0.0)
+        for result in signed:
+            error, duration = outcomes[result] if result in outcomes else _write_prepared(result.prepared)
+            result.prepared = None
+            result.duration += duration
+            if error:
+                result.output_path = None
+                result.error = error
+
+    @staticmethod
+    def _discard_unwritten(results):
+        """
+        Remove the temporary files of prepared documents an unexpected error left unwritten.
+        """
+        for result in results:
+            if result and result.prepared:
+                result.prepared.discard()
+                result.prepared = None
+                result.output_path = None
+                result.error = result.error or "Signed document was not written"
+
+    def _sign_in_process(self, pdf_paths, on_result):
+        """
+        Sign documents sequentially in the current process.
+        """
+        _init_worker(self.private_key_pem, self.durability)
+        results = []
+        try:
+            for pdf_path in pdf_paths:
+                result = _sign_one(pdf_path, self.output_path_for(pdf_path), self.signer_name, self.incremental,
+                                   self.detached, prepare=bool(self.timestamp_client))
+                results.append(result)
+                if on_result:
+                    on_result(result)
+            if self.timestamp_client:
+                self._timestamp(results)
+        finally:
+            self._discard_unwritten(results)
+        return results
+
+    def _sign_merkle(self, pdf_paths, on_result):
+        """
+        Sign documents as one Merkle batch, results are reported once the root is signed.
+        """
+        merkle_signer = MerkleBatchSigner(self.private_key_pem, self.signer_name, self.workers, self.durability)
+        results = merkle_signer.sign(pdf_paths, [self.output_path_for(pdf_path) for pdf_path in pdf_paths])
+        if on_result:
+            for result in results:
+                on_result(result)
+        return results
+
+    def _sign_in_pool(self, pdf_paths, on_result):
+        """
+        Sign documents in a pool of worker processes.
+        """
+        results = [None] * len(pdf_paths)
+        with ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                 initargs=(self.private_key_pem, self.durability)) as executor:
+            try:
+                futures = {
+                    executor.submit(_sign_one, pdf_path, self.output_path_for(pdf_path), self.signer_name,
+                                    self.incremental, self.detached, bool(self.timestamp_client)): index
+                    for index, pdf_path in enumerate(pdf_paths)
+                }
+                for future in as_completed(futures):
+                    index = futures[future]
+                    try:
+                        result = future.result()
+                    except BrokenProcessPool as e:
+                        result = SignResult(pdf_paths[index], error=f"Worker process crashed: {str(e)}")
+                    results[index] = result
+                    if on_result:
+                        on_result(result)
+                if self.timestamp_client:
+                    # Written by the same workers once the batch is timestamped
+                    self._timestamp(results, executor)
+            finally:
+                self._discard_unwritten(results)
+        return results
+
+
+def main(argv=None):
+    """
+    Command line entry point for batch signing.
+
+    Args:
+        argv (list): Command line arguments, sys.argv when None (default: None).
+
+    Returns:
+        int: Exit code, 0 when every document was signed.
+    """
+    parser = argparse.ArgumentParser(description="Sign many PDF documents with a single private key.")
+    parser.add_argument("source", help="Directory, glob pattern or manifest file listing PDF documents")
+    parser.add_argument("--key", required=True, help="Path to the encrypted private key (.key)")
+    parser.add_argument("--signer", default="Unknown", help="Name of the person signing the documents")
+    parser.add_argument("--output-dir", help="Directory for signed documents (default: next to inputs)")
+    parser.add_argument("--workers", type=int, default=None, help="Number of worker processes")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Append an incremental update with a /Sig dictionary instead of rewriting documents")
+    parser.add_argument("--detached", action="store_true",
+                        help="Write detached signature files (document.pdf.sig) without touching the documents")
+    parser.add_argument("--merkle", action="store_true",
+                        help="Sign incrementally with one signature over a Merkle tree of all documents")
+    parser.add_argument("--tsa", help="URL of an RFC 3161 time-stamping authority timestamping all signatures")
+    parser.add_argument("--tsa-cert", help="PEM certificates the time-stamping authority may sign with")
+    parser.add_argument("--durability", choices=DURABILITY_LEVELS, default=DURABILITY_FSYNC,
+                        help="Flush signed files to disk before replacing the outputs (fsync), and their "
+                             "directories after (fsync+dir)")
+    parser.add_argument("--pin-env", help="Read the PIN from this environment variable instead of prompting")
+    args = parser.parse_args(argv)
+    if args.merkle and args.detached:
+        parser.error("--merkle and --detached cannot be combined")
+    if args.tsa and (args.merkle or args.incremental):
+        parser.error("--tsa cannot be combined with --merkle or --incremental")
+
+    # Heavy key handling is only needed once the arguments are valid
+    from key_manager.key_generator import decrypt_private_key
+    from key_manager.usb_storage import UsbStorage
+
+    try:
+        pdf_paths = collect_documents(args.source, None if args.detached else SIGNED_PREFIX, args.output_dir)
+    except ValueError as e:
+        print(f"Error! {str(e)}", file=sys.stderr)
+        return 2
+
+    pin = os.environ.get(args.pin_env, "") if args.pin_env else getpass.getpass("PIN: ")
+    try:
+        private_key_pem = decrypt_private_key(UsbStorage.load_from_usb(args.key), pin)
+    except (OSError, ValueError) as e:
+        print(f"Error! {str(e)}", file=sys.stderr)
+        return 2
+
+    def report(result):
+        if result.ok:
+            print(f"OK     {result.pdf_path} -> {result.output_path} ({result.duration:.3f}s)")
+        else:
+            print(f"FAILED {result.pdf_path}: {result.error}")
+
+    timestamp_client = None
+    if args.tsa:
+        from pades_signer.timestamping import TimestampClient, load_tsa_certificates
+        try:
+            certificates = load_tsa_certificates(args.tsa_cert) if args.tsa_cert else None
+            timestamp_client = TimestampClient(args.tsa, certificates=certificates)
+        except (OSError, ValueError) as e:
+            print(f"Error! {str(e)}", file=sys.stderr)
+            return 2
+
+    batch_signer = BatchSigner(private_key_pem, args.signer, args.output_dir, args.workers,
+                               incremental=args.incremental, detached=args.detached, merkle=args.merkle,
+                               timestamp_client=timestamp_client, durability=args.durability)
+    try:
+        batch_result = batch_signer.sign(pdf_paths, on_result=report)
+    except (OSError, ValueError, BrokenProcessPool) as e:
+        print(f"Error! {str(e)}", file=sys.stderr)
+        return 2
+    finally:
+        if timestamp_client:
+            timestamp_client.close()
+    print(batch_result.summary())
+    return 0 if batch_result.failed == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
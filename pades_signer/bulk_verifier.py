@@ -0,0 +1,476 @@
+"""
+Module providing parallel verification of whole archives of signed PDF documents.
+
+Results are streamed as JSON Lines or CSV while the archive is processed. The result
+file doubles as a checkpoint: with resume enabled, documents already present in it are
+skipped, so an interrupted run continues where it stopped.
+
+Usage:
+    Verify an archive and resume after interruption:
+    $ python -m pades_signer.bulk_verifier /archive --public-key public_key.pem --output results.jsonl --resume
+"""
+
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+from cryptography.hazmat.primitives import serialization
+from key_manager.key_registry import KeyRegistry
+from pades_signer.signature_verifier import SignatureVerifier
+
+RESULT_FIELDS = ["path", "valid", "bucket", "message", "seconds"]
+
+# Verifier instance owned by a worker process, created once by _init_worker
+_worker_verifier = None
+# Whether the worker checks detached signature files instead of embedded signatures
+_worker_detached = False
+
+
+def iter_documents(sources, file_list=None):
+    """
+    Iterate over PDF documents in directory trees, single files and file lists.
+
+    Args:
+        sources (list): Directories walked recursively or paths to single documents.
+        file_list (str): Text file listing one document path per line, '-' for stdin (default: None).
+
+    Yields:
+        str: Path to a PDF document.
+    """
+    for source in sources:
+        if os.path.isdir(source):
+            for directory, subdirectories, filenames in os.walk(source):
+                subdirectories.sort()
+                for filename in sorted(filenames):
+                    if filename.lower().endswith('.pdf'):
+                        yield os.path.join(directory, filename)
+        else:
+            yield source
+
+    if file_list:
+        list_file = sys.stdin if file_list == '-' else open(file_list, 'r', encoding='utf-8')
+        try:
+            for line in list_file:
+                line = line.strip()
+                if line and not line.startswith('#'):
+                    yield line
+        finally:
+            if list_file is not sys.stdin:
+                list_file.close()
+
+
+def classify(is_valid, message):
+    """
+    Assign a verification outcome to an error bucket.
+
+    Args:
+        is_valid (bool): Result of the verification.
+        message (str): Message returned by SignatureVerifier.verify_signature.
+
+    Returns:
+        str: Bucket name.
+    """
+    if is_valid:
+        return "valid"
+    if message == "No signature provided":
+        return "unsigned"
+    if message in ("Signature verification failed!", "Document was modified after signing") or \
+            message.startswith(("Signature algorithm mismatch", "Unknown signing key")):
+        return "invalid_signature"
+    if message.startswith(("Invalid signing format", "Invalid byte range")):
+        return "malformed_signature"
+    return "verification_error"
+
+
+def _init_worker(public_key_pem, detached=False, trust_store=None):
+    """
+    Create the verifier of a worker process, so the public keys are parsed once per process.
+
+    Args:
+        public_key_pem (bytes): Public key in PEM format, may be None with a trust store.
+        detached (bool): Verify detached signature files next to the documents (default: False).
+        trust_store (str): Directory or PEM file of public keys chosen by fingerprint (default: None).
+    """
+    global _worker_verifier, _worker_detached
+    public_key = serialization.load_pem_public_key(public_key_pem) if public_key_pem else None
+    registry = KeyRegistry.from_path(trust_store) if trust_store else None
+    _worker_verifier = SignatureVerifier(public_key, registry=registry)
+    _worker_detached = detached
+
+
+def _verify_chunk(pdf_paths):
+    """
+    Verify a chunk of documents with the worker verifier, isolating failures of single documents.
+
+    Args:
+        pdf_paths (list): Paths to the documents to verify.
+
+    Returns:
+        list: One result dictionary per document with the keys listed in RESULT_FIELDS.
+    """
+    results = []
+    for pdf_path in pdf_paths:
+        start = time.perf_counter()
+        try:
+            if _worker_detached:
+                is_valid, message = _worker_verifier.verify_detached(pdf_path)
+            else:
+                is_valid, message = _worker_verifier.verify_signature(pdf_path)
+            bucket = classify(is_valid, message)
+        except Exception as e:
+            is_valid, message, bucket = False, f"{type(e).__name__}: {str(e)}", "unreadable"
+        results.append({
+            "path": pdf_path,
+            "valid": is_valid,
+            "bucket": bucket,
+            "message": message,
+            "seconds": round(time.perf_counter() - start, 6),
+        })
+    return results
+
+
+def load_checkpoint(output_path, output_format):
+    """
+    Read the paths of documents already verified in a previous run.
+
+    Incomplete records, e.g. a line cut short by an interruption, are ignored.
+
+    Args:
+        output_path (str): Path to the result file of the previous run.
+        output_format (str): Format of the result file, 'jsonl' or 'csv'.
+
+    Returns:
+        set: Paths of already verified documents.
+    """
+    done = set()
+    if not os.path.exists(output_path):
+        return done
+
+    with open(output_path, 'r', encoding='utf-8', newline='') as result_file:
+        if output_format == 'csv':
+            for row in csv.DictReader(result_file):
+                if row.get('path') and row.get('seconds'):
+                    done.add(row['path'])
+        else:
+            for line in result_file:
+                try:
+                    done.add(json.loads(line)['path'])
+                except (ValueError, KeyError, TypeError):
+                    continue
+    return done
+
+
+def _ends_with_newline(path):
+    """
+    Check whether a non-empty file ends with a newline character.
+    """
+    with open(path, 'rb') as result_file:
+        result_file.seek(-1, os.SEEK_END)
+        return result_file.read(1) == b"\n"
+
+
+class ResultWriter:
+    """
+    Class streaming verification results to a JSON Lines or CSV file.
+    """
+
+    def __init__(self, output_file, output_format, write_header=True):
+        """
+        Initialize the result writer.
+
+        Args:
+            output_file: Text file opened for writing or appending.
+            output_format (str): Output format, 'jsonl' or 'csv'.
+            write_header (bool): Write the CSV header row (default: True).
+        """
+        self.output_file = output_file
+        self.output_format = output_format
+        self.csv_writer = None
+        if output_format == 'csv':
+            self.csv_writer = csv.DictWriter(output_file, fieldnames=RESULT_FIELDS)
+            if write_header:
+                self.csv_writer.writeheader()
+
+    def write(self, result):
+        """
+        Write a single result record.
+
+        Args:
+            result (dict): Result dictionary with the keys listed in RESULT_FIELDS.
+        """
+        if self.csv_writer:
+            self.csv_writer.writerow(result)
+        else:
+            self.output_file.write(json.dumps(result, ensure_ascii=False) + "\n")
+
+
+class BulkReport:
+    """
+    Throughput and error bucket statistics of a bulk verification run.
+
+    Attributes:
+        buckets (Counter): Number of documents per bucket.
+        skipped (int): Number of documents skipped thanks to the checkpoint.
+        elapsed (float): Wall time of the run in seconds.
+    """
+
+    def __init__(self):
+        """
+        Initialize empty statistics.
+        """
+        self.buckets = Counter()
+        self.skipped = 0
+        self.elapsed = 0.0
+
+    @property
+    def verified(self):
+        """
+        int: Number of documents verified in this run.
+        """
+        return sum(self.buckets.values())
+
+    @property
+    def docs_per_second(self):
+        """
+        float: Verification throughput of this run.
+        """
+        if self.elapsed <= 0:
+            return 0.0
+        return self.verified / self.elapsed
+
+    def summary(self):
+        """
+        Format a human-readable summary of the run.
+
+        Returns:
+            str: Summary with counts, throughput and error buckets.
+        """
+        buckets = ", ".join(f"{bucket}: {count}" for bucket, count in self.buckets.most_common())
+        return (f"Verified {self.verified} documents ({self.skipped} skipped from checkpoint) "
+                f"in {self.elapsed:.2f}s, {self.docs_per_second:.2f} docs/sec\n"
+                f"Buckets: {buckets or 'none'}")
+
+
+class BulkVerifier:
+    """
+    Class responsible for verifying large numbers of documents in a pool of worker processes.
+    """
+
+    def __init__(self, public_key_pem, workers=None, chunk_size=32, detached=False, trust_store=None):
+        """
+        Initialize the bulk verifier.
+
+        Args:
+            public_key_pem (bytes): Public key in PEM format, may be None with a trust store.
+            workers (int): Number of worker processes, CPU count when None (default: None).
+            chunk_size (int): Number of documents sent to a worker at once (default: 32).
+            detached (bool): Verify detached signature files next to the documents (default: False).
+            trust_store (str): Directory or PEM file of public keys, each signature is checked with
+                the key matching its fingerprint, see KeyRegistry (default: None).
+        """
+        self.public_key_pem = public_key_pem
+        self.trust_store = trust_store
+        self.workers = workers or os.cpu_count() or 1
+        self.chunk_size = chunk_size
+        self.detached = detached
+
+    def _chunks(self, pdf_paths, skip):
+        """
+        Group document paths into chunks, leaving out paths to skip.
+        """
+        chunk = []
+        for pdf_path in pdf_paths:
+            if pdf_path in skip:
+                continue
+            chunk.append(pdf_path)
+            if len(chunk) == self.chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+    def iter_results(self, pdf_paths, skip=frozenset()):
+        """
+        Verify documents and yield results as soon as they are ready.
+
+        Only a bounded number of chunks is in flight at once, so arbitrarily long
+        path iterators are consumed lazily.
+
+        Args:
+            pdf_paths: Iterable of paths to the documents to verify.
+            skip (set): Paths that should not be verified (default: empty).
+
+        Yields:
+            dict: Result dictionary with the keys listed in RESULT_FIELDS.
+        """
+        chunks = self._chunks(pdf_paths, skip)
+        max_pending = self.workers * 4
+        executor = self._create_pool()
+        pending = {}
+        # Chunks that failed because a worker crashed, not necessarily while verifying them
+        crashed = []
+        try:
+            for chunk in chunks:
+                try:
+                    pending[executor.submit(_verify_chunk, chunk)] = chunk
+                except BrokenProcessPool:
+                    crashed.append(chunk)
+                if len(pending) >= max_pending and not crashed:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    yield from self._finished(done, pending, crashed)
+                if crashed:
+                    executor = yield from self._recover(executor, pending, crashed)
+                    crashed = []
+            yield from self._finished(list(pending), pending, crashed)
+            if crashed:
+                executor = yield from self._recover(executor, pending, crashed)
+        finally:
+            executor.shutdown(wait=not pending, cancel_futures=True)
+
+    def _create_pool(self):
+        """
+        Start a pool of worker processes with initialized verifiers.
+        """
+        return ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                   initargs=(self.public_key_pem, self.detached, self.trust_store))
+
+    @staticmethod
+    def _finished(futures, pending, crashed):
+        """
+        Yield the results of finished chunks, collecting the chunks whose pool broke in crashed.
+        """
+        for future in futures:
+            chunk = pending.pop(future)
+            try:
+                results = future.result()
+            except BrokenProcessPool:
+                crashed.append(chunk)
+                continue
+            yield from results
+
+    def _recover(self, executor, pending, crashed):
+        """
+        Replace a pool broken by a crashed worker and verify again the chunks it failed.
+
+        A crashed worker breaks the whole pool and fails every chunk in flight, most of them
+        healthy. They are verified one at a time on a new pool, so the chunk that crashed can
+        only fail itself, and it is split until the documents crashing on their own are found.
+        Only those are reported as crashed.
+
+        Returns:
+            ProcessPoolExecutor: The pool to continue with.
+        """
+        yield from self._finished(list(pending), pending, crashed)
+        executor.shutdown(wait=False)
+        executor = self._create_pool()
+        retries = list(reversed(crashed))
+        try:
+            while retries:
+                chunk = retries.pop()
+                try:
+                    results = executor.submit(_verify_chunk, chunk).result()
+                except BrokenProcessPool as e:
+                    executor.shutdown(wait=False)
+                    executor = self._create_pool()
+                    if len(chunk) > 1:
+                        middle = len(chunk) // 2
+                        retries += [chunk[middle:], chunk[:middle]]
+                        continue
+                    results = [{"path": chunk[0], "valid": False, "bucket": "worker_crash",
+                                "message": f"Worker process crashed: {str(e)}", "seconds": 0.0}]
+                yield from results
+        except BaseException:
+            executor.shutdown(wait=False, cancel_futures=True)
+            raise
+        return executor
+
+    def run(self, pdf_paths, output_path, output_format='jsonl', resume=False, on_result=None):
+        """
+        Verify documents and stream the results to a file.
+
+        Args:
+            pdf_paths: Iterable of paths to the documents to verify.
+            output_path (str): Path to the result file.
+            output_format (str): Output format, 'jsonl' or 'csv' (default: 'jsonl').
+            resume (bool): Skip documents already present in the result file and append to it (default: False).
+            on_result (callable): Called with each result dictionary (default: None).
+
+        Returns:
+            BulkReport: Statistics of the run.
+        """
+        report = BulkReport()
+        done = load_checkpoint(output_path, output_format) if resume else set()
+        append = resume and os.path.exists(output_path) and os.path.getsize(output_path) > 0
+
+        def counted(paths):
+            for pdf_path in paths:
+                if pdf_path in done:
+                    report.skipped += 1
+                else:
+                    yield pdf_path
+
+        start = time.perf_counter()
+        with open(output_path, 'a' if append else 'w', encoding='utf-8', newline='') as output_file:
+            if append and not _ends_with_newline(output_path):
+                # Terminating a record cut short by the interruption
+                output_file.write("\n")
+            writer = ResultWriter(output_file, output_format, write_header=not append)
+            for result in self.iter_results(counted(pdf_paths)):
+                writer.write(result)
+                output_file.flush()
+                report.buckets[result['bucket']] += 1
+                if on_result:
+                    on_result(result)
+        report.elapsed = time.perf_counter() - start
+        return report
+
+
+def main(argv=None):
+    """
+    Command line entry point for bulk verification.
+
+    Args:
+        argv (list): Command line arguments, sys.argv when None (default: None).
+
+    Returns:
+        int: Exit code, 0 when every verified document has a valid signature.
+    """
+    parser = argparse.ArgumentParser(description="Verify signatures of many PDF documents in parallel.")
+    parser.add_argument("sources", nargs="*", help="Directories walked recursively or single documents")
+    parser.add_argument("--file-list", help="Text file listing one document per line, '-' for stdin")
+    parser.add_argument("--public-key", help="Path to the public key (.pem)")
+    parser.add_argument("--trust-store", help="Directory or PEM file of public keys of mixed-signer archives")
+    parser.add_argument("--output", required=True, help="Result file, also used as checkpoint")
+    parser.add_argument("--format", choices=["jsonl", "csv"], default="jsonl", help="Result file format")
+    parser.add_argument("--resume", action="store_true", help="Skip documents already in the result file")
+    parser.add_argument("--workers", type=int, default=None, help="Number of worker processes")
+    parser.add_argument("--chunk-size", type=int, default=32, help="Documents sent to a worker at once")
+    parser.add_argument("--detached", action="store_true",
+                        help="Verify detached signature files (document.pdf.sig) instead of embedded signatures")
+    args = parser.parse_args(argv)
+
+    if not args.sources and not args.file_list:
+        parser.error("specify at least one source or --file-list")
+    if not args.public_key and not args.trust_store:
+        parser.error("specify --public-key or --trust-store")
+
+    public_key_pem = None
+    if args.public_key:
+        with open(args.public_key, "rb") as key_file:
+            public_key_pem = key_file.read()
+
+    bulk_verifier = BulkVerifier(public_key_pem, args.workers, args.chunk_size, args.detached, args.trust_store)
+    report = bulk_verifier.run(iter_documents(args.sources, args.file_list), args.output,
+                               args.format, args.resume)
+    print(report.summary())
+    return 0 if report.verified == report.buckets["valid"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
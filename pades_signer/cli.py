@@ -0,0 +1,262 @@
+"""
+Command line interface for signing, verifying and inspecting documents and generating keys.
+
+Only the standard library is imported at startup. PDF, cryptography and USB modules
+are imported by the subcommand that needs them, so `--help` and argument errors return
+immediately and no subcommand pays for modules it does not use. The GUI is never imported.
+
+Usage:
+    $ python -m pades_signer sign input.pdf --key /media/usb/private_key.key --signer "John Doe"
+    $ python -m pades_signer verify signed_input.pdf --public-key public_key.pem
+    $ python -m pades_signer inspect signed_input.pdf
+    $ python -m pades_signer keygen --private-key private_key.key --public-key public_key.pem
+"""
+
+import argparse
+import getpass
+import json
+import os
+import sys
+
+
+def _read_pin(pin_env, confirm=False):
+    """
+    Read the PIN from an environment variable or prompt for it.
+
+    Args:
+        pin_env (str): Name of the environment variable, prompt when None.
+        confirm (bool): Prompt twice and require both entries to match (default: False).
+
+    Returns:
+        str: The PIN.
+
+    Raises:
+        ValueError: When the PIN is empty or the entries do not match.
+    """
+    if pin_env:
+        pin = os.environ.get(pin_env, "")
+    else:
+        pin = getpass.getpass("PIN: ")
+        if confirm and getpass.getpass("Repeat PIN: ") != pin:
+            raise ValueError("PINs do not match")
+    if not pin:
+        raise ValueError("PIN must not be empty")
+    return pin
+
+
+def _tsa_certificates(args):
+    """
+    Load the trusted time-stamping authority certificates given with --tsa-cert, None without it.
+    """
+    if not args.tsa_cert:
+        return None
+    from pades_signer.timestamping import load_tsa_certificates
+    return load_tsa_certificates(args.tsa_cert)
+
+
+def _sign(args):
+    """
+    Sign a single document.
+    """
+    from key_manager.key_generator import load_private_key
+    from key_manager.usb_storage import UsbStorage
+    from pades_signer.pdf_signer import PDFSigner
+
+    private_key = load_private_key(UsbStorage.load_from_usb(args.key), _read_pin(args.pin_env))
+    timestamp_client = None
+    if args.tsa:
+        from pades_signer.timestamping import TimestampClient
+        timestamp_client = TimestampClient(args.tsa, certificates=_tsa_certificates(args))
+    signer = PDFSigner(private_key, timestamp_client, args.durability)
+    if args.detached:
+        output_path = signer.sign_detached(args.input, args.signer, args.output)
+    else:
+        output_path = args.output or os.path.join(os.path.dirname(args.input),
+                                                  f"signed_{os.path.basename(args.input)}")
+        signer.sign_document(args.input, output_path, args.signer, args.incremental)
+    print(f"Signed {args.input} -> {output_path}")
+    return 0
+
+
+def _verify(args):
+    """
+    Verify documents and report one line per document.
+    """
+    from cryptography.hazmat.primitives import serialization
+    from key_manager.key_registry import KeyRegistry
+    from pades_signer.signature_verifier import SignatureVerifier
+
+    public_key = None
+    if args.public_key:
+        with open(args.public_key, "rb") as key_file:
+            public_key = serialization.load_pem_public_key(key_file.read())
+    registry = KeyRegistry.from_path(args.trust_store) if args.trust_store else None
+    cache = None
+    if args.cache:
+        from pades_signer.verification_cache import VerificationCache
+        cache = VerificationCache(args.cache)
+
+    verifier = SignatureVerifier(public_key, cache=cache, registry=registry,
+                                 tsa_certificates=_tsa_certificates(args))
+    failed = 0
+    for pdf_path in args.documents:
+        if args.detached:
+            is_valid, message = verifier.verify_detached(pdf_path)
+        else:
+            is_valid, message = verifier.verify_signature(pdf_path)
+        failed += 0 if is_valid else 1
+        print(f"{'OK    ' if is_valid else 'FAILED'} {pdf_path}: {message}")
+    if cache:
+        cache.close()
+    return 0 if failed == 0 else 1
+
+
+def _inspect(args):
+    """
+    Print the signature data of a document as JSON, without verifying it.
+    """
+    if args.detached:
+        from pades_signer.detached import detached_signature_path, read_detached_signature
+
+        record = read_detached_signature(detached_signature_path(args.document))
+        if record is None:
+            print(f"{args.document}: no detached signature")
+            return 1
+        record["signature"] = f"{len(record['signature'])} bytes"
+        for field in ("timestamp", "timestamp_proof"):
+            if record.get(field):
+                record[field] = f"{len(record[field]) // 2} bytes"
+        print(json.dumps(dict(record, type="detached"), indent=2, ensure_ascii=False))
+        return 0
+
+    from pades_signer.incremental_update import find_signature_dictionary, find_signature_in_tail
+    from pades_signer.mapped_io import open_pdf
+    from pades_signer.signature_verifier import extract_signature_data
+
+    signature_data = find_signature_in_tail(args.document)
+    if not signature_data:
+        reader = open_pdf(args.document)
+        signature_data = find_signature_dictionary(reader)
+        if not signature_data:
+            legacy_data = extract_signature_data(reader)
+            if not legacy_data:
+                print(f"{args.document}: no signature")
+                return 1
+            legacy_data = {key: str(value) if value is not None else None for key, value in legacy_data.items()}
+            for field in ("signature", "timestamp", "timestamp_proof"):
+                if legacy_data.get(field):
+                    legacy_data[field] = f"{len(legacy_data[field]) // 2} bytes"
+            print(json.dumps(dict(legacy_data, type="metadata"), indent=2, ensure_ascii=False))
+            return 0
+
+    from pades_signer.merkle import decode_payload, split_subfilter
+
+    info = dict(signature_data, type="incremental")
+    byte_range = info["byte_range"]
+    info["covers_whole_file"] = byte_range[2] + byte_range[3] == os.path.getsize(args.document)
+    contents = info.pop("contents")
+    info["contents"] = f"{len(contents)} bytes reserved"
+    if split_subfilter(info["subfilter"])[1]:
+        try:
+            index, count, proof, _ = decode_payload(contents)
+            info["merkle"] = {"leaf": index, "leaves": count, "proof_steps": len(proof)}
+        except ValueError as e:
+            info["merkle"] = {"error": str(e)}
+    print(json.dumps(info, indent=2, ensure_ascii=False))
+    return 0
+
+
+def _keygen(args):
+    """
+    Generate a key pair, save the encrypted private key and the public key.
+    """
+    from cryptography.hazmat.primitives import serialization
+    from key_manager.key_generator import KeyGenerator, public_key_fingerprint
+    from common.atomic_output import DURABILITY_FSYNC_DIR, write_atomic
+
+    key_generator = KeyGenerator(args.algorithm)
+    pin = _read_pin(args.pin_env, confirm=True)
+    _, public_key = key_generator.generate_key_pair()
+    # Key files are small and hard to replace, so they are always flushed with their directory
+    write_atomic(args.private_key, key_generator.encrypt_private_key(pin), DURABILITY_FSYNC_DIR)
+    write_atomic(args.public_key, public_key.public_bytes(
+        encoding=serialization.Encoding.PEM,
+        format=serialization.PublicFormat.SubjectPublicKeyInfo
+    ), DURABILITY_FSYNC_DIR)
+    print(f"Generated {key_generator.algorithm.label} key {public_key_fingerprint(public_key)}")
+    return 0
+
+
+def build_parser():
+    """
+    Build the argument parser with all subcommands.
+
+    Returns:
+        argparse.ArgumentParser: Parser whose results carry the subcommand handler in 'handler'.
+    """
+    parser = argparse.ArgumentParser(prog="python -m pades_signer",
+                                     description="Sign and verify PDF documents without the GUI.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    sign = subparsers.add_parser("sign", help="Sign a document")
+    sign.add_argument("input", help="Document to sign")
+    sign.add_argument("-o", "--output", help="Signed document, or signature file with --detached "
+                                             "(default: signed_<name> next to the input)")
+    sign.add_argument("--key", required=True, help="Path to the encrypted private key (.key)")
+    sign.add_argument("--signer", default="Unknown", help="Name of the person signing the document")
+    mode = sign.add_mutually_exclusive_group()
+    mode.add_argument("--incremental", action="store_true", help="Append an incremental update with a /Sig dictionary")
+    mode.add_argument("--detached", action="store_true", help="Write a detached signature file (document.pdf.sig)")
+    sign.add_argument("--tsa", help="URL of an RFC 3161 time-stamping authority timestamping the signature")
+    sign.add_argument("--tsa-cert", help="PEM certificates the time-stamping authority may sign with")
+    sign.add_argument("--durability", choices=("none", "fsync", "fsync+dir"), default="fsync",
+                      help="Flush the signed file to disk before replacing the output (fsync), "
+                           "and its directory after (fsync+dir)")
+    sign.add_argument("--pin-env", help="Read the PIN from this environment variable instead of prompting")
+    sign.set_defaults(handler=_sign)
+
+    verify = subparsers.add_parser("verify", help="Verify signed documents")
+    verify.add_argument("documents", nargs="+", help="Documents to verify")
+    verify.add_argument("--public-key", help="Path to the public key (.pem)")
+    verify.add_argument("--trust-store", help="Directory or PEM file of public keys chosen by fingerprint")
+    verify.add_argument("--detached", action="store_true", help="Verify detached signature files")
+    verify.add_argument("--cache", help="Path to a verification cache database")
+    verify.add_argument("--tsa-cert", help="PEM certificates of trusted time-stamping authorities")
+    verify.set_defaults(handler=_verify)
+
+    inspect = subparsers.add_parser("inspect", help="Show the signature data of a document without verifying it")
+    inspect.add_argument("document", help="Document to inspect")
+    inspect.add_argument("--detached", action="store_true", help="Inspect the detached signature file")
+    inspect.set_defaults(handler=_inspect)
+
+    keygen = subparsers.add_parser("keygen", help="Generate a key pair")
+    keygen.add_argument("--private-key", required=True, help="Path of the encrypted private key (.key)")
+    keygen.add_argument("--public-key", required=True, help="Path of the public key (.pem)")
+    keygen.add_argument("--algorithm", default="rsa", help="Signature algorithm: rsa, ecdsa-p256 or ed25519")
+    keygen.add_argument("--pin-env", help="Read the PIN from this environment variable instead of prompting")
+    keygen.set_defaults(handler=_keygen)
+    return parser
+
+
+def main(argv=None):
+    """
+    Command line entry point.
+
+    Args:
+        argv (list): Command line arguments, sys.argv when None (default: None).
+
+    Returns:
+        int: Exit code, 0 on success, 1 when a document is not valid, 2 on errors.
+    """
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.command == "verify" and not args.public_key and not args.trust_store:
+        parser.error("specify --public-key or --trust-store")
+    if args.command == "sign" and args.tsa and args.incremental:
+        parser.error("--tsa cannot be combined with --incremental")
+
+    try:
+        return args.handler(args)
+    except (OSError, ValueError) as e:
+        print(f"Error! {str(e)}", file=sys.stderr)
+        return 2
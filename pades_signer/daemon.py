@@ -0,0 +1,550 @@
+"""
+Module providing a headless signing service with a local HTTP JSON API.
+
+The service keeps unlocked keys and a pool of warm worker processes resident, so
+backend systems can sign and verify documents without starting a new interpreter
+and importing PyPDF2 and cryptography for every document. Jobs are queued up to a
+fixed capacity, requests beyond it are rejected with 503 so callers can back off.
+
+Every request must carry the bearer token of the service, a random one written to a
+file readable only by the user unless given explicitly, and name the service by its
+loopback address in the Host header. POST bodies must be sent as application/json.
+Together these keep web pages open in a browser, which can send simple cross-origin
+POSTs to localhost or rebind a DNS name to it, away from the unlocked keys.
+
+Endpoints (JSON bodies, paths refer to files on the local machine):
+    POST /unlock  {"key": "/media/usb/private_key.key", "pin": "1234"}
+    POST /lock    {"key": "/media/usb/private_key.key"}
+    POST /sign    {"input": "in.pdf", "output": "out.pdf", "signer": "ACME", "key": ..., "incremental": true}
+    POST /sign-digests  {"digests": ["<64 hex digits>", ...], "key": ...}
+    POST /verify  {"path": "out.pdf", "public_key": "public_key.pem"}
+    GET  /health
+    GET  /metrics
+
+Usage:
+    $ PADES_PIN=1234 python -m pades_signer.daemon --key /media/usb/private_key.key --pin-env PADES_PIN --port 8750
+    $ curl -H "Authorization: Bearer $(cat ~/.pades-signer-daemon.token)" localhost:8750/health
+"""
+
+import argparse
+import getpass
+import hmac
+import json
+import multiprocessing
+import os
+import secrets
+import signal
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from key_manager.key_generator import public_key_fingerprint
+from key_manager.unlock_session import UnlockSession
+from pades_signer.jobs import init_service_worker, private_key_der, sign_digests_job, sign_job, verify_job, \
+    warm_up
+
+# File the generated access token is written to by default
+DEFAULT_TOKEN_FILE = os.path.join(os.path.expanduser("~"), ".pades-signer-daemon.token")
+
+# Host names the service accepts in the Host header, besides the address it listens on
+LOCAL_HOSTS = ("127.0.0.1", "localhost")
+
+class ServiceBusy(Exception):
+    """
+    Exception raised when the job queue of the service is full.
+    """
+
+
+class SigningService:
+    """
+    Class executing sign and verify jobs on warm worker processes with bounded queueing.
+
+    Attributes:
+        workers (int): Number of worker processes.
+        max_queue (int): Maximum number of jobs running or waiting, further jobs are rejected.
+        job_timeout (float): Maximum number of seconds a request waits for its job.
+        sessions (dict): Unlock sessions by path to the encrypted key file.
+    """
+
+    def __init__(self, workers=None, max_queue=64, job_timeout=300, session_max_age=8 * 3600,
+                 session_max_signatures=None):
+        """
+        Initialize the service and start its worker processes.
+
+        Args:
+            workers (int): Number of worker processes, the CPU count when None (default: None).
+            max_queue (int): Maximum number of jobs running or waiting (default: 64).
+            job_timeout (float): Maximum number of seconds a request waits for its job (default: 300).
+            session_max_age (float): Number of seconds an unlocked key stays usable (default: 8 hours).
+            session_max_signatures (int): Number of signatures per unlock, unlimited when None (default: None).
+        """
+        self.workers = workers or os.cpu_count() or 1
+        self.max_queue = max_queue
+        self.job_timeout = job_timeout
+        self.session_max_age = session_max_age
+        self.session_max_signatures = session_max_signatures
+        self.sessions = {}
+        self.started_at = time.time()
+
+        # Spawned workers, forking a process that already runs request threads is not safe.
+        # The initializer imports the job modules in every worker and disables memory mappings,
+        # and one job per worker starts all of them now instead of on the first requests
+        self.executor = ProcessPoolExecutor(max_workers=self.workers, initializer=init_service_worker,
+                                            mp_context=multiprocessing.get_context("spawn"))
+        for future in [self.executor.submit(warm_up) for _ in range(self.workers)]:
+            future.result()
+
+        self._slots = threading.BoundedSemaphore(max_queue)
+        self._lock = threading.Lock()
+        self._queued = 0
+        self._counters = {operation: {"completed": 0, "failed": 0, "rejected": 0, "seconds": 0.0}
+                          for operation in ("sign", "sign_digests", "verify")}
+
+    def unlock(self, key_path, pin):
+        """
+        Decrypt a private key and keep it unlocked for signing.
+
+        Args:
+            key_path (str): Path to the encrypted key file.
+            pin (str): PIN used for decryption.
+
+        Returns:
+            str: Fingerprint of the public key belonging to the unlocked key.
+
+        Raises:
+            ValueError: When the key file does not exist or the PIN is invalid.
+        """
+        session = UnlockSession(max_age=self.session_max_age, max_signatures=self.session_max_signatures)
+        session.unlock(key_path, pin)
+        with self._lock:
+            self.sessions[key_path] = session
+        return public_key_fingerprint(session.public_key)
+
+    def lock(self, key_path):
+        """
+        Wipe an unlocked private key.
+
+        Args:
+            key_path (str): Path to the encrypted key file.
+
+        Returns:
+            bool: True when the key was unlocked.
+        """
+        with self._lock:
+            session = self.sessions.pop(key_path, None)
+        if session is None:
+            return False
+        session.lock()
+        return True
+
+    def _session(self, key_path):
+        """
+        Find the unlock session of a key, the only one when no key is given.
+
+        Raises:
+            ValueError: When the key is not unlocked or no key was given and several are.
+        """
+        with self._lock:
+            if key_path is None:
+                if len(self.sessions) != 1:
+                    raise ValueError("Specify the key, none or several keys are unlocked")
+                key_path = next(iter(self.sessions))
+            session = self.sessions.get(key_path)
+        if session is None:
+            raise ValueError(f"Key is not unlocked: {key_path}")
+        return session
+
+    def _run(self, operation, function, *args, session=None):
+        """
+        Run a job on a worker process, rejecting it when the queue is full.
+
+        A job keeps its queue slot until it has finished or was cancelled before starting,
+        also when its request gave up waiting, so running jobs never exceed max_queue.
+
+        Args:
+            session (UnlockSession): Session whose key signs in the job, passed to the function
+                in DER format before args. The signature only counts against the session
+                budget once the job has a queue slot (default: None).
+
+        Raises:
+            ServiceBusy: When max_queue jobs are already running or waiting.
+            TimeoutError: When the job did not finish within job_timeout.
+            ValueError: When the session is no longer unlocked.
+        """
+        counters = self._counters[operation]
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                counters["rejected"] += 1
+            raise ServiceBusy(f"Queue is full ({self.max_queue} jobs)")
+        if session is not None:
+            try:
+                args = (private_key_der(session.acquire_key()),) + args
+            except Exception:
+                self._slots.release()
+                raise
+
+        start = time.perf_counter()
+        with self._lock:
+            self._queued += 1
+        try:
+            future = self.executor.submit(function, *args)
+        except Exception:
+            self._release_slot()
+            with self._lock:
+                counters["failed"] += 1
+            raise
+        future.add_done_callback(self._release_slot)
+
+        try:
+            try:
+                result = future.result(timeout=self.job_timeout)
+            except FutureTimeoutError:
+                # Only stops a job that has not started, a running one keeps its slot until it finishes
+                future.cancel()
+                raise TimeoutError(f"Job did not finish within {self.job_timeout} seconds")
+        except Exception:
+            with self._lock:
+                counters["failed"] += 1
+            raise
+        with self._lock:
+            counters["completed"] += 1
+            counters["seconds"] += time.perf_counter() - start
+        return result
+
+    def _release_slot(self, future=None):
+        """
+        Free the queue slot of a job once it is done.
+        """
+        with self._lock:
+            self._queued -= 1
+        self._slots.release()
+
+    def sign(self, pdf_path, output_path, signer_name, key_path=None, incremental=False):
+        """
+        Sign a document with an unlocked key.
+
+        Args:
+            pdf_path (str): Path to the PDF document to be signed.
+            output_path (str): Path where the signed document will be saved.
+            signer_name (str): Name of the person signing the document.
+            key_path (str): Path of the unlocked key, may be omitted when a single key is unlocked.
+            incremental (bool): Sign with an incremental update (default: False).
+
+        Returns:
+            str: Path to the signed document.
+
+        Raises:
+            ValueError: When the key is not unlocked or the document cannot be signed.
+            ServiceBusy: When the queue is full.
+        """
+        return self._run("sign", sign_job, pdf_path, output_path, signer_name, incremental,
+                         session=self._session(key_path))
+
+    def sign_digests(self, digests, key_path=None):
+        """
+        Sign a batch of to-be-signed digests, see pades_signer.remote_signing.
+
+        The whole batch counts as one signature of the unlock session.
+
+        Args:
+            digests (list): SHA-256 digests of 32 bytes each.
+            key_path (str): Path of the unlocked key, may be omitted when a single key is unlocked.
+
+        Returns:
+            list: Signatures in the order of the digests.
+
+        Raises:
+            ValueError: When the key is not unlocked or a digest is not 32 bytes long.
+            ServiceBusy: When the queue is full.
+        """
+        return self._run("sign_digests", sign_digests_job, list(digests), session=self._session(key_path))
+
+    def verify(self, pdf_path, public_key_path):
+        """
+        Verify the signature of a document.
+
+        Args:
+            pdf_path (str): Path to the signed document.
+            public_key_path (str): Path to the public key in PEM format.
+
+        Returns:
+            tuple: (is_valid, message) as returned by SignatureVerifier.verify_signature.
+
+        Raises:
+            ServiceBusy: When the queue is full.
+        """
+        with open(public_key_path, "rb") as key_file:
+            public_key_pem = key_file.read()
+        return self._run("verify", verify_job, public_key_pem, pdf_path)
+
+    def health(self):
+        """
+        Report whether the service is able to accept jobs.
+
+        Returns:
+            dict: Status, uptime and the unlocked keys.
+        """
+        with self._lock:
+            sessions = dict(self.sessions)
+        return {
+            "status": "ok",
+            "uptime_seconds": round(time.time() - self.started_at, 3),
+            "unlocked_keys": [key_path for key_path, session in sessions.items() if session.is_unlocked],
+        }
+
+    def metrics(self):
+        """
+        Report queue usage and per-operation job statistics.
+
+        Returns:
+            dict: Workers, queue capacity and usage, and completed, failed and rejected jobs
+                with their mean latency for every operation.
+        """
+        with self._lock:
+            operations = {}
+            for operation, counters in self._counters.items():
+                operations[operation] = {
+                    "completed": counters["completed"],
+                    "failed": counters["failed"],
+                    "rejected": counters["rejected"],
+                    "mean_seconds": round(counters["seconds"] / counters["completed"], 6)
+                    if counters["completed"] else None,
+                }
+            return {
+                "workers": self.workers,
+                "queue_capacity": self.max_queue,
+                "queued": self._queued,
+                "operations": operations,
+            }
+
+    def close(self):
+        """
+        Wipe all unlocked keys and stop the worker processes.
+        """
+        with self._lock:
+            sessions = list(self.sessions.values())
+            self.sessions.clear()
+        for session in sessions:
+            session.lock()
+        self.executor.shutdown(wait=True, cancel_futures=True)
+
+
+class RequestHandler(BaseHTTPRequestHandler):
+    """
+    HTTP handler translating JSON requests to SigningService calls.
+
+    The service, the access token and the accepted Host headers are attributes of the server.
+    """
+
+    def _send_json(self, status, body, headers=None):
+        """
+        Send a JSON response.
+        """
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _authorized(self):
+        """
+        Check the bearer token.
+        """
+        header = self.headers.get("Authorization", "")
+        return hmac.compare_digest(header.encode("utf-8"), f"Bearer {self.server.token}".encode("utf-8"))
+
+    def _rejected(self):
+        """
+        Send the error response of a request that must not reach the service.
+
+        Returns:
+            bool: True when the request was rejected.
+        """
+        # A rebound DNS name carries its own name in the Host header
+        if self.headers.get("Host", "").lower() not in self.server.allowed_hosts:
+            self._send_json(403, {"error": "Invalid Host header"})
+            return True
+        if not self._authorized():
+            self._send_json(401, {"error": "Unauthorized"})
+            return True
+        return False
+
+    def do_GET(self):
+        """
+        Handle the health and metrics endpoints.
+        """
+        if self._rejected():
+            return
+        service = self.server.service
+        if self.path == "/health":
+            return self._send_json(200, service.health())
+        if self.path == "/metrics":
+            return self._send_json(200, service.metrics())
+        return self._send_json(404, {"error": f"Unknown endpoint: {self.path}"})
+
+    def do_POST(self):
+        """
+        Handle the unlock, lock, sign and verify endpoints.
+        """
+        if self._rejected():
+            return
+        # Browsers send cross-origin form and text/plain POSTs without a preflight, JSON needs one
+        content_type = self.headers.get("Content-Type", "").split(";")[0].strip().lower()
+        if content_type != "application/json":
+            return self._send_json(415, {"error": "Request body must be application/json"})
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            params = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            return self._send_json(400, {"error": "Request body is not valid JSON"})
+
+        service = self.server.service
+        try:
+            if self.path == "/unlock":
+                fingerprint = service.unlock(params["key"], params["pin"])
+                return self._send_json(200, {"key": params["key"], "fingerprint": fingerprint})
+            if self.path == "/lock":
+                return self._send_json(200, {"locked": service.lock(params["key"])})
+            if self.path == "/sign":
+                output_path = service.sign(params["input"], params["output"], params.get("signer", "Unknown"),
+                                           params.get("key"), bool(params.get("incremental", False)))
+                return self._send_json(200, {"output": output_path})
+            if self.path == "/sign-digests":
+                digests = [bytes.fromhex(digest) for digest in params["digests"]]
+                signatures = service.sign_digests(digests, params.get("key"))
+                return self._send_json(200, {"signatures": [signature.hex() for signature in signatures]})
+            if self.path == "/verify":
+                is_valid, message = service.verify(params["path"], params["public_key"])
+                return self._send_json(200, {"valid": is_valid, "message": message})
+            return self._send_json(404, {"error": f"Unknown endpoint: {self.path}"})
+        except KeyError as e:
+            return self._send_json(400, {"error": f"Missing parameter: {str(e)}"})
+        except ServiceBusy as e:
+            return self._send_json(503, {"error": str(e)}, {"Retry-After": "1"})
+        except TimeoutError as e:
+            return self._send_json(504, {"error": str(e)})
+        except (ValueError, OSError) as e:
+            return self._send_json(400, {"error": str(e)})
+        except Exception as e:
+            return self._send_json(500, {"error": f"{type(e).__name__}: {str(e)}"})
+
+    def log_message(self, format, *args):
+        """
+        Log requests only in verbose mode, request bodies are never logged.
+        """
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+def write_token_file(path, token):
+    """
+    Save the access token to a file readable and writable only by the current user.
+
+    Args:
+        path (str): Path to the token file, replaced when it exists.
+        token (str): Access token.
+    """
+    descriptor = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    try:
+        # An existing file keeps its permissions on open, they are narrowed before writing
+        if hasattr(os, "fchmod"):
+            os.fchmod(descriptor, 0o600)
+        os.write(descriptor, token.encode("utf-8"))
+    finally:
+        os.close(descriptor)
+
+
+def create_server(service, host="127.0.0.1", port=8750, token=None, verbose=False):
+    """
+    Create the HTTP server of a signing service.
+
+    Args:
+        service (SigningService): Service executing the jobs.
+        host (str): Address to listen on, only the local machine by default (default: "127.0.0.1").
+        port (int): Port to listen on, 0 picks a free one (default: 8750).
+        token (str): Bearer token required on every request, a random one stored in the
+            token attribute of the server when None (default: None).
+        verbose (bool): Log every request (default: False).
+
+    Returns:
+        ThreadingHTTPServer: Server handling every request on its own thread.
+    """
+    server = ThreadingHTTPServer((host, port), RequestHandler)
+    server.daemon_threads = True
+    server.service = service
+    server.token = token or secrets.token_urlsafe(32)
+    server.verbose = verbose
+    bound_port = server.server_address[1]
+    hosts = set(LOCAL_HOSTS)
+    if host not in ("", "0.0.0.0", "::"):
+        hosts.add(host)
+    server.allowed_hosts = {f"{name}:{bound_port}".lower() for name in hosts}
+    return server
+
+
+def main(argv=None):
+    """
+    Command line entry point of the signing service.
+
+    Args:
+        argv (list): Command line arguments, sys.argv when None (default: None).
+
+    Returns:
+        int: Exit code.
+    """
+    parser = argparse.ArgumentParser(description="Run a local signing and verification service.")
+    parser.add_argument("--host", default="127.0.0.1", help="Address to listen on")
+    parser.add_argument("--port", type=int, default=8750, help="Port to listen on")
+    parser.add_argument("--workers", type=int, default=None, help="Number of worker processes")
+    parser.add_argument("--max-queue", type=int, default=64, help="Jobs running or waiting before rejecting")
+    parser.add_argument("--job-timeout", type=float, default=300, help="Seconds a request waits for its job")
+    parser.add_argument("--key", help="Encrypted private key (.key) to unlock at startup")
+    parser.add_argument("--pin-env", help="Read the PIN from this environment variable instead of prompting")
+    parser.add_argument("--token-env", help="Require the bearer token stored in this environment variable "
+                                            "instead of a random one")
+    parser.add_argument("--token-file", default=DEFAULT_TOKEN_FILE,
+                        help="File the bearer token is written to, readable only by the current user")
+    parser.add_argument("--verbose", action="store_true", help="Log every request")
+    args = parser.parse_args(argv)
+
+    service = SigningService(args.workers, args.max_queue, args.job_timeout)
+    if args.key:
+        pin = os.environ.get(args.pin_env, "") if args.pin_env else getpass.getpass("PIN: ")
+        try:
+            fingerprint = service.unlock(args.key, pin)
+        except ValueError as e:
+            print(f"Error! {str(e)}", file=sys.stderr)
+            service.close()
+            return 2
+        print(f"Unlocked {args.key} ({fingerprint})")
+
+    token = os.environ.get(args.token_env) if args.token_env else None
+    server = create_server(service, args.host, args.port, token, args.verbose)
+    try:
+        write_token_file(args.token_file, server.token)
+    except OSError as e:
+        print(f"Error! Cannot write the token file: {str(e)}", file=sys.stderr)
+        server.server_close()
+        service.close()
+        return 2
+    # Shutting down from another thread, serve_forever blocks the main one
+    signal.signal(signal.SIGTERM, lambda signum, frame: threading.Thread(target=server.shutdown).start())
+    print(f"Listening on http://{server.server_address[0]}:{server.server_address[1]} "
+          f"with {service.workers} workers, token in {args.token_file}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,127 @@
+"""
+Module providing detached signatures stored next to a document instead of inside it.
+
+The document is streamed through SHA-256 and never parsed, so signing and verifying
+are limited only by disk and hash speed. The signature file is a small JSON document
+with the digest and size of the signed file, the signer, the signing date and the
+algorithm. All of these fields are covered by the signature.
+"""
+
+import hashlib
+import json
+import os
+from datetime import datetime
+from common.atomic_output import DURABILITY_FSYNC, write_atomic
+
+DETACHED_FORMAT = "pades-signer-detached"
+DETACHED_VERSION = 1
+
+# Suffix appended to the document path to get its default signature path
+DETACHED_SUFFIX = ".sig"
+
+# Fields covered by the signature, in the order they are serialized
+_SIGNED_FIELDS = ("format", "version", "algorithm", "hash", "digest", "size", "signed_by", "signing_date")
+
+
+def detached_signature_path(pdf_path):
+    """
+    Compute the default path of the detached signature of a document.
+
+    Args:
+        pdf_path (str): Path to the document.
+
+    Returns:
+        str: Path to the signature file, e.g. document.pdf.sig.
+    """
+    return pdf_path + DETACHED_SUFFIX
+
+
+def signed_payload_hash(record):
+    """
+    Hash the signed fields of a detached signature record.
+
+    Args:
+        record (dict): Detached signature record.
+
+    Returns:
+        bytes: SHA-256 hash of the canonical JSON encoding of the signed fields.
+
+    Raises:
+        KeyError: When a signed field is missing.
+    """
+    payload = json.dumps([record[field] for field in _SIGNED_FIELDS], ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).digest()
+
+
+def build_detached_record(doc_hash, size, signer_name, algorithm_name, signing_date=None):
+    """
+    Build an unsigned detached signature record.
+
+    Args:
+        doc_hash (bytes): SHA-256 hash of the whole document.
+        size (int): Size of the document in bytes.
+        signer_name (str): Name of the person signing the document.
+        algorithm_name (str): Identifier of the signature algorithm.
+        signing_date (datetime): Signing date, current time when None (default: None).
+
+    Returns:
+        dict: Record with every signed field, the signature is added by the caller.
+    """
+    return {
+        "format": DETACHED_FORMAT,
+        "version": DETACHED_VERSION,
+        "algorithm": algorithm_name,
+        "hash": "sha256",
+        "digest": doc_hash.hex(),
+        "size": size,
+        "signed_by": signer_name,
+        "signing_date": (signing_date or datetime.now()).strftime("%Y-%m-%d %H:%M:%S"),
+    }
+
+
+def write_detached_signature(signature_path, record, durability=DURABILITY_FSYNC):
+    """
+    Save a signed detached signature record, replacing the signature file atomically.
+
+    Args:
+        signature_path (str): Path to the signature file.
+        record (dict): Record including its 'signature' field.
+        durability (str): Durability level, see common.atomic_output (default: DURABILITY_FSYNC).
+
+    Returns:
+        str: Path to the signature file.
+    """
+    data = json.dumps(record, ensure_ascii=False, indent=2).encode("utf-8")
+    return write_atomic(signature_path, data, durability)
+
+
+def read_detached_signature(signature_path):
+    """
+    Load a detached signature record.
+
+    Args:
+        signature_path (str): Path to the signature file.
+
+    Returns:
+        dict or None: Record with the signature decoded to bytes, None when the file does not exist.
+
+    Raises:
+        ValueError: When the file is not a detached signature of a supported version.
+    """
+    if not os.path.exists(signature_path):
+        return None
+    with open(signature_path, "r", encoding="utf-8") as signature_file:
+        try:
+            record = json.load(signature_file)
+        except ValueError:
+            raise ValueError("Signature file is not valid JSON")
+    if not isinstance(record, dict) or record.get("format") != DETACHED_FORMAT:
+        raise ValueError("File is not a detached signature")
+    if record.get("version") != DETACHED_VERSION or record.get("hash") != "sha256":
+        raise ValueError(f"Unsupported detached signature version {record.get('version')}")
+    try:
+        record["signature"] = bytes.fromhex(record["signature"])
+        signed_payload_hash(record)
+    except (KeyError, TypeError, ValueError) as e:
+        raise ValueError(f"Incomplete detached signature: {str(e)}")
+    return record
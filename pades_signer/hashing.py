@@ -0,0 +1,155 @@
+"""
+Module providing streaming SHA-256 hashing of PDF documents.
+
+Documents are never materialized in memory: files are hashed from mapped windows, see
+pades_signer.mapped_io, or read through a single reusable chunk buffer when they cannot
+be mapped, and serialized documents are hashed as they are written.
+"""
+
+import hashlib
+from pades_signer.mapped_io import mapped_chunks
+
+# Size of the chunks used when reading documents
+CHUNK_SIZE = 1024 * 1024
+
+
+class HashingStream:
+    """
+    Write-only stream that feeds everything written to it into SHA-256.
+
+    It can be passed to PdfWriter.write instead of a BytesIO, so a serialized
+    document is hashed without ever being held in memory.
+
+    Attributes:
+        hasher: SHA-256 hash object fed with the written bytes.
+        sink: Binary file receiving a copy of the written bytes, or None.
+    """
+
+    def __init__(self, sink=None):
+        """
+        Initialize an empty hashing stream.
+
+        Args:
+            sink: Optional binary file receiving a copy of the written bytes (default: None).
+        """
+        self.hasher = hashlib.sha256()
+        self.sink = sink
+        self._position = 0
+
+    def write(self, data):
+        """
+        Hash the written bytes and copy them to the sink.
+
+        Args:
+            data (bytes): Bytes to hash.
+
+        Returns:
+            int: Number of bytes written.
+        """
+        self.hasher.update(data)
+        if self.sink is not None:
+            self.sink.write(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        """
+        Return the number of bytes written so far, used by PdfWriter for object offsets.
+
+        Returns:
+            int: Current position in the stream.
+        """
+        return self._position
+
+    def digest(self):
+        """
+        Return the SHA-256 digest of the written bytes.
+
+        Returns:
+            bytes: SHA-256 digest.
+        """
+        return self.hasher.digest()
+
+
+def update_from_file(hasher, file, length=None, chunk_size=CHUNK_SIZE, sink=None):
+    """
+    Feed bytes from an open file into a hash object, from mapped windows or through a single reusable buffer.
+
+    Args:
+        hasher: Hash object to update.
+        file: File opened in binary mode, read from its current position.
+        length (int): Number of bytes to hash, until the end of the file when None (default: None).
+        chunk_size (int): Size of the read buffer in bytes, when the file is not mapped (default: CHUNK_SIZE).
+        sink: Optional binary file receiving a copy of the hashed bytes (default: None).
+
+    Returns:
+        int: Number of bytes hashed.
+
+    Raises:
+        ValueError: When the file ends before the requested length.
+    """
+    chunks = mapped_chunks(file, length)
+    if chunks is not None:
+        total = 0
+        for chunk in chunks:
+            hasher.update(chunk)
+            if sink is not None:
+                sink.write(chunk)
+            total += len(chunk)
+        return total
+
+    buffer = bytearray(chunk_size)
+    view = memoryview(buffer)
+    total = 0
+    while length is None or total < length:
+        size = chunk_size if length is None else min(chunk_size, length - total)
+        read = file.readinto(view[:size])
+        if not read:
+            if length is not None:
+                raise ValueError("Signed byte range exceeds document size")
+            break
+        hasher.update(view[:read])
+        if sink is not None:
+            sink.write(view[:read])
+        total += read
+    return total
+
+
+def hash_file(path, chunk_size=CHUNK_SIZE):
+    """
+    Compute the SHA-256 digest of a whole file.
+
+    Args:
+        path (str): Path to the file.
+        chunk_size (int): Size of the read buffer in bytes (default: CHUNK_SIZE).
+
+    Returns:
+        bytes: SHA-256 digest of the file.
+    """
+    hasher = hashlib.sha256()
+    with open(path, "rb") as file:
+        update_from_file(hasher, file, chunk_size=chunk_size)
+    return hasher.digest()
+
+
+def hash_byte_ranges(path, byte_range, chunk_size=CHUNK_SIZE):
+    """
+    Compute the SHA-256 digest of the signed byte ranges of a document.
+
+    Args:
+        path (str): Path to the signed document.
+        byte_range (list): Signed byte ranges as pairs [start1, length1, start2, length2, ...].
+        chunk_size (int): Size of the read buffer in bytes (default: CHUNK_SIZE).
+
+    Returns:
+        bytes: SHA-256 digest of the signed content.
+
+    Raises:
+        ValueError: When the byte ranges exceed the document size.
+    """
+    hasher = hashlib.sha256()
+    with open(path, "rb") as file:
+        for start, length in zip(byte_range[0::2], byte_range[1::2]):
+            file.seek(start)
+            update_from_file(hasher, file, length, chunk_size)
+    return hasher.digest()
@@ -0,0 +1,419 @@
+"""
+Module providing incremental-update signatures for PDF documents.
+
+Instead of rewriting the whole document, the original bytes are left untouched and
+a small incremental-update section is appended. The section contains a /Sig dictionary
+whose /ByteRange covers the whole file except the hex-encoded /Contents value, where
+the signature itself is stored.
+"""
+
+import hashlib
+import io
+import os
+import re
+from datetime import datetime
+from PyPDF2.errors import PdfReadError
+from PyPDF2.generic import ArrayObject, DictionaryObject, IndirectObject, NameObject, \
+    NumberObject, TextStringObject, read_object
+from key_manager.algorithms import DEFAULT_ALGORITHM, get_algorithm
+from pades_signer.hashing import update_from_file
+
+SIGNATURE_FILTER = "/PAdESSigner"
+
+# Fixed-width placeholder, so the final /ByteRange values do not move any offsets
+_BYTE_RANGE_PLACEHOLDER = b"[0 0000000000 0000000000 0000000000]"
+
+# Size of the end of the file searched for the last signature dictionary
+TAIL_SIZE = 64 * 1024
+
+_PDF_DATE_PATTERN = re.compile(r"D:(\d{14})")
+_SIGNATURE_MARKER = b"/Type /Sig\n/Filter " + SIGNATURE_FILTER.encode("ascii")
+
+
+def pdf_date(moment):
+    """
+    Format a datetime as a PDF date string.
+
+    Args:
+        moment (datetime): Date and time to format.
+
+    Returns:
+        str: Date in PDF format, e.g. D:20240101120000+01'00'.
+    """
+    moment = moment.astimezone()
+    offset = moment.strftime("%z")
+    return f"D:{moment.strftime('%Y%m%d%H%M%S')}{offset[0]}{offset[1:3]}'{offset[3:5]}'"
+
+
+def readable_date(value):
+    """
+    Convert a PDF date string to the format used in signature metadata.
+
+    Args:
+        value (str): Date in PDF format.
+
+    Returns:
+        str: Date formatted as YYYY-MM-DD HH:MM:SS, or the original value if it cannot be parsed.
+    """
+    match = _PDF_DATE_PATTERN.match(str(value))
+    if not match:
+        return str(value)
+    return datetime.strptime(match.group(1), "%Y%m%d%H%M%S").strftime("%Y-%m-%d %H:%M:%S")
+
+
+def _serialize(pdf_object):
+    """
+    Serialize a PyPDF2 object to bytes.
+    """
+    stream = io.BytesIO()
+    pdf_object.write_to_stream(stream, None)
+    return stream.getvalue()
+
+
+def _find_startxref(pdf_path):
+    """
+    Read the offset of the last cross-reference section from the end of the file.
+
+    Args:
+        pdf_path (str): Path to the PDF document.
+
+    Returns:
+        int: Value of the last startxref entry.
+
+    Raises:
+        ValueError: When no startxref entry can be found.
+    """
+    with open(pdf_path, "rb") as pdf_file:
+        pdf_file.seek(max(0, os.path.getsize(pdf_path) - 4096))
+        tail = pdf_file.read()
+    match = None
+    for match in re.finditer(rb"startxref\s+(\d+)", tail):
+        pass
+    if not match:
+        raise ValueError("Cannot find startxref entry in document")
+    return int(match.group(1))
+
+
+def _object_count(reader):
+    """
+    Compute the /Size of a document, the highest object number in use plus one.
+
+    PyPDF2 keeps /Size only for classic trailers, so the parsed cross-reference
+    sections are taken into account for documents using cross-reference streams.
+
+    Args:
+        reader (PdfReader): Parsed document.
+
+    Returns:
+        int: Number of objects in the document.
+    """
+    numbers = [number for generation in reader.xref.values() for number in generation]
+    numbers.extend(reader.xref_objStm)
+    return max([int(reader.trailer.get("/Size", 0))] + [number + 1 for number in numbers])
+
+
+class SignatureUpdate:
+    """
+    Incremental-update section carrying a signature placeholder.
+
+    Attributes:
+        section (bytes): Bytes to append to the original document.
+        contents_start (int): Offset of the /Contents hex string within the section.
+        contents_end (int): Offset just after the /Contents hex string within the section.
+        byte_range (list): Signed byte ranges of the final document [start1, length1, start2, length2].
+    """
+
+    def __init__(self, section, contents_start, contents_end, byte_range):
+        """
+        Initialize the update section.
+
+        Args:
+            section (bytes): Bytes to append to the original document.
+            contents_start (int): Offset of the /Contents hex string within the section.
+            contents_end (int): Offset just after the /Contents hex string within the section.
+            byte_range (list): Signed byte ranges of the final document.
+        """
+        self.section = section
+        self.contents_start = contents_start
+        self.contents_end = contents_end
+        self.byte_range = byte_range
+
+    @property
+    def signed_parts(self):
+        """
+        tuple: Parts of the section covered by the signature (before and after /Contents).
+        """
+        return self.section[:self.contents_start], self.section[self.contents_end:]
+
+    @property
+    def contents_capacity(self):
+        """
+        int: Number of signature bytes the /Contents placeholder can hold.
+        """
+        return (self.contents_end - self.contents_start - 2) // 2
+
+
+def build_signature_update(reader, pdf_path, signer_name, contents_size, signing_date=None,
+                           subfilter=None, key_fingerprint=None):
+    """
+    Build the incremental-update section adding a signature field to a document.
+
+    The section contains the /Sig dictionary, a signature field with an invisible widget
+    on the first page, the updated catalog (or /AcroForm) and page, a cross-reference
+    section and a trailer pointing to the previous one.
+
+    Args:
+        reader (PdfReader): Parsed original document.
+        pdf_path (str): Path to the original document.
+        signer_name (str): Name of the person signing the document.
+        contents_size (int): Number of bytes reserved for the signature.
+        signing_date (datetime): Signing date, current time when None (default: None).
+        subfilter (str): /SubFilter identifying the signature algorithm, the one of DEFAULT_ALGORITHM
+            when None (default: None).
+        key_fingerprint (str): Fingerprint of the signing key stored as /KeyFingerprint, so verifiers
+            can find the key in a registry, omitted when None (default: None).
+
+    Returns:
+        SignatureUpdate: Section to append with an empty signature placeholder.
+
+    Raises:
+        ValueError: When the document is encrypted or has no pages.
+    """
+    if reader.is_encrypted:
+        raise ValueError("Encrypted documents cannot be signed incrementally")
+    if len(reader.pages) == 0:
+        raise ValueError("Document has no pages")
+    subfilter = subfilter or get_algorithm(DEFAULT_ALGORITHM).subfilter
+
+    file_size = os.path.getsize(pdf_path)
+    prev_xref = _find_startxref(pdf_path)
+    trailer = reader.trailer
+    size = _object_count(reader)
+    sig_number = size
+    field_number = size + 1
+
+    root_ref = trailer.raw_get("/Root")
+    root = DictionaryObject(reader.trailer["/Root"])
+    page_ref = reader.pages[0].indirect_reference
+    page = DictionaryObject(reader.pages[0])
+    field_ref = IndirectObject(field_number, 0, reader)
+
+    # Objects rewritten by this update, the catalog itself or an indirect /AcroForm
+    updated_objects = []
+    acroform_ref = root.raw_get("/AcroForm") if "/AcroForm" in root else None
+    acroform = DictionaryObject(root["/AcroForm"]) if acroform_ref is not None else DictionaryObject()
+    fields = ArrayObject(acroform.get("/Fields", ArrayObject()))
+    field_name = f"Signature{len(fields) + 1}"
+    fields.append(field_ref)
+    acroform[NameObject("/Fields")] = fields
+    acroform[NameObject("/SigFlags")] = NumberObject(3)
+    if isinstance(acroform_ref, IndirectObject):
+        updated_objects.append((acroform_ref.idnum, acroform_ref.generation, _serialize(acroform)))
+    else:
+        root[NameObject("/AcroForm")] = acroform
+        updated_objects.append((root_ref.idnum, root_ref.generation, _serialize(root)))
+
+    annots = ArrayObject(page.get("/Annots", ArrayObject()))
+    annots.append(field_ref)
+    page[NameObject("/Annots")] = annots
+    updated_objects.append((page_ref.idnum, page_ref.generation, _serialize(page)))
+
+    date = pdf_date(signing_date or datetime.now())
+    sig_object = (
+        b"<<\n/Type /Sig\n/Filter " + SIGNATURE_FILTER.encode("ascii")
+        + b"\n/SubFilter " + subfilter.encode("ascii")
+        + b"\n/Name " + _serialize(TextStringObject(signer_name))
+        + b"\n/M " + _serialize(TextStringObject(date))
+        + (b"\n/KeyFingerprint " + _serialize(TextStringObject(key_fingerprint)) if key_fingerprint else b"")
+        + b"\n/ByteRange " + _BYTE_RANGE_PLACEHOLDER
+        + b"\n/Contents <" + b"0" * (contents_size * 2) + b">\n>>"
+    )
+    field_object = (
+        f"<<\n/Type /Annot\n/Subtype /Widget\n/FT /Sig\n/T ({field_name})\n/V {sig_number} 0 R\n"
+        f"/Rect [0 0 0 0]\n/F 132\n/P {page_ref.idnum} {page_ref.generation} R\n>>"
+    ).encode("ascii")
+
+    objects = [(sig_number, 0, sig_object), (field_number, 0, field_object)] + updated_objects
+
+    # Writing objects and remembering their offsets for the cross-reference section
+    section = io.BytesIO()
+    section.write(b"\n")
+    offsets = {}
+    for number, generation, body in objects:
+        offsets[number] = (file_size + section.tell(), generation)
+        section.write(f"{number} {generation} obj\n".encode("ascii") + body + b"\nendobj\n")
+
+    xref_offset = file_size + section.tell()
+    section.write(b"xref\n")
+    for number in sorted(offsets):
+        offset, generation = offsets[number]
+        section.write(f"{number} 1\n{offset:010d} {generation:05d} n \n".encode("ascii"))
+
+    new_trailer = DictionaryObject()
+    new_trailer[NameObject("/Size")] = NumberObject(max(size, field_number + 1))
+    new_trailer[NameObject("/Root")] = root_ref
+    if "/Info" in trailer:
+        new_trailer[NameObject("/Info")] = trailer.raw_get("/Info")
+    if "/ID" in trailer:
+        new_trailer[NameObject("/ID")] = trailer.raw_get("/ID")
+    new_trailer[NameObject("/Prev")] = NumberObject(prev_xref)
+    section.write(b"trailer\n" + _serialize(new_trailer) + f"\nstartxref\n{xref_offset}\n%%EOF\n".encode("ascii"))
+    section = section.getvalue()
+
+    # Filling in the byte range, which covers everything except the /Contents hex string
+    contents_start = section.index(b"/Contents <") + len(b"/Contents ")
+    contents_end = section.index(b">", contents_start) + 1
+    total_size = file_size + len(section)
+    byte_range = [0, file_size + contents_start, file_size + contents_end, total_size - file_size - contents_end]
+    byte_range_text = f"[{' '.join(str(value) for value in byte_range)}]".encode("ascii")
+    section = section.replace(_BYTE_RANGE_PLACEHOLDER, byte_range_text.ljust(len(_BYTE_RANGE_PLACEHOLDER)), 1)
+
+    return SignatureUpdate(section, contents_start, contents_end, byte_range)
+
+
+def copy_and_hash(pdf_path, target):
+    """
+    Copy the original document to the output file, hashing it on the way.
+
+    The copy is written to a separate file even when the document is signed in place,
+    so the original stays intact until the signed document replaces it.
+
+    Args:
+        pdf_path (str): Path to the original document.
+        target: Binary file the copy is written to.
+
+    Returns:
+        hashlib._Hash: SHA-256 hasher fed with the whole original document.
+    """
+    hasher = hashlib.sha256()
+    with open(pdf_path, "rb") as source:
+        update_from_file(hasher, source, sink=target)
+    return hasher
+
+
+def _signature_data(signature):
+    """
+    Convert a /Sig dictionary to signature data.
+
+    Args:
+        signature (DictionaryObject): Signature dictionary.
+
+    Returns:
+        dict: Dictionary with 'byte_range', 'contents', 'subfilter', 'signed_by', 'signing_date'
+            and 'key_fingerprint' (None when not stored).
+    """
+    contents = signature["/Contents"]
+    # PyPDF2 decodes hex strings that happen to be valid text, short signatures often are
+    if isinstance(contents, TextStringObject):
+        contents = contents.original_bytes
+    return {
+        'byte_range': [int(value) for value in signature["/ByteRange"]],
+        'contents': bytes(contents),
+        # Signatures made before other algorithms were supported carry no /SubFilter of their own
+        'subfilter': str(signature.get("/SubFilter", get_algorithm(DEFAULT_ALGORITHM).subfilter)),
+        'signed_by': str(signature.get("/Name", "")),
+        'signing_date': readable_date(signature.get("/M", "")),
+        'key_fingerprint': str(signature["/KeyFingerprint"]) if "/KeyFingerprint" in signature else None,
+    }
+
+
+def find_signature_dictionary(reader):
+    """
+    Find the most recent incremental-update signature in a parsed document.
+
+    Args:
+        reader (PdfReader): Parsed signed document.
+
+    Returns:
+        dict or None: Signature data of the last signature field as returned by
+            _signature_data, None if the document has no such signature.
+    """
+    root = reader.trailer["/Root"]
+    if "/AcroForm" not in root:
+        return None
+
+    signature = None
+    for field in root["/AcroForm"].get("/Fields", []):
+        field = field.get_object()
+        if field.get("/FT") == "/Sig" and "/V" in field:
+            value = field["/V"].get_object()
+            if value.get("/Filter") == SIGNATURE_FILTER and "/ByteRange" in value:
+                signature = value
+
+    if signature is None:
+        return None
+    return _signature_data(signature)
+
+
+def find_signature_in_tail(pdf_path, tail_size=TAIL_SIZE):
+    """
+    Find the signature covering the whole document by scanning only the end of the file.
+
+    The signature dictionary is written at the start of the last incremental update,
+    so it can be read without parsing the document. Signatures followed by later
+    modifications of the document are not found this way.
+
+    Args:
+        pdf_path (str): Path to the signed document.
+        tail_size (int): Number of bytes at the end of the file to search (default: TAIL_SIZE).
+
+    Returns:
+        dict or None: Signature data as returned by _signature_data, None if no signature
+            covering the whole document was found.
+    """
+    file_size = os.path.getsize(pdf_path)
+    tail_start = max(0, file_size - tail_size)
+    with open(pdf_path, "rb") as pdf_file:
+        pdf_file.seek(tail_start)
+        tail = pdf_file.read()
+
+    marker = tail.rfind(_SIGNATURE_MARKER)
+    start = tail.rfind(b"<<", 0, marker) if marker != -1 else -1
+    if start == -1:
+        return None
+
+    try:
+        signature = read_object(io.BytesIO(tail[start:]), None)
+        signature_data = _signature_data(signature)
+    except (PdfReadError, KeyError, TypeError, ValueError):
+        return None
+
+    byte_range = signature_data['byte_range']
+    if len(byte_range) != 4 or byte_range[2] + byte_range[3] != file_size:
+        return None
+    return signature_data
+
+
+def check_signature_coverage(pdf_path, signature_data):
+    """
+    Check that a signature covers the whole document except its own /Contents value.
+
+    A byte range that stops before the end of the file leaves room for incremental updates
+    appended after signing, which may change the displayed content without touching the
+    signed bytes. The excluded gap must be exactly the hex string of /Contents, so nothing
+    else can hide in it.
+
+    Args:
+        pdf_path (str): Path to the signed document.
+        signature_data (dict): Signature data as returned by _signature_data.
+
+    Raises:
+        ValueError: When the byte range does not cover the document.
+    """
+    byte_range = signature_data['byte_range']
+    if (len(byte_range) != 4 or byte_range[0] != 0 or min(byte_range) < 0 or byte_range[1] >= byte_range[2]
+            or byte_range[2] + byte_range[3] != os.path.getsize(pdf_path)):
+        raise ValueError("Document was modified after signing")
+
+    with open(pdf_path, "rb") as pdf_file:
+        pdf_file.seek(max(0, byte_range[1] - len(b"/Contents") - 16))
+        before = pdf_file.read(byte_range[1] - pdf_file.tell())
+        gap = pdf_file.read(byte_range[2] - byte_range[1])
+    if not before.rstrip().endswith(b"/Contents") or gap[:1] != b"<" or gap[-1:] != b">":
+        raise ValueError("Document was modified after signing")
+    try:
+        contents = bytes.fromhex(gap[1:-1].decode("ascii"))
+    except ValueError:
+        raise ValueError("Document was modified after signing")
+    if contents != signature_data['contents']:
+        raise ValueError("Document was modified after signing")
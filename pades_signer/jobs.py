@@ -0,0 +1,116 @@
+"""
+Module with job functions executed in worker processes by the signing service and the asyncio API.
+
+Job arguments and results are plain bytes and strings, so they can be sent to worker
+processes. Private keys are passed with every job and dropped afterwards, so worker
+processes never keep a key after its owner has locked or released it.
+"""
+
+from cryptography.hazmat.primitives import serialization
+from key_manager.key_generator import decrypt_private_key
+from pades_signer.mapped_io import set_mmap_enabled
+from pades_signer.pdf_signer import PDFSigner
+from pades_signer.remote_signing import DigestSigner
+from pades_signer.signature_verifier import SignatureVerifier
+
+# Verifiers of a worker process by public key, public keys are not secret and can be kept
+_verifiers = {}
+
+
+def private_key_der(private_key):
+    """
+    Serialize a private key for sending it to a worker process.
+
+    Args:
+        private_key: Private key object.
+
+    Returns:
+        bytes: Unencrypted PKCS#8 DER encoding of the key.
+    """
+    return private_key.private_bytes(
+        encoding=serialization.Encoding.DER,
+        format=serialization.PrivateFormat.PKCS8,
+        encryption_algorithm=serialization.NoEncryption()
+    )
+
+
+def load_trusted_private_key(private_key_der):
+    """
+    Parse a private key that has already been validated when it was first loaded.
+
+    The RSA consistency check takes hundreds of milliseconds, parsing without it takes microseconds.
+
+    Args:
+        private_key_der (bytes): Key serialized by private_key_der.
+
+    Returns:
+        Private key object.
+    """
+    return serialization.load_der_private_key(private_key_der, password=None,
+                                              unsafe_skip_rsa_key_validation=True)
+
+
+def warm_up():
+    """
+    Make sure a worker process is running, its imports happen when it starts.
+    """
+    return True
+
+
+def init_service_worker():
+    """
+    Initialize a worker of the signing service or AsyncExecutor, its imports happen when it starts.
+
+    Documents named in requests belong to other processes, which may truncate them while
+    a job reads them. They are read without memory mappings, so a truncation fails the
+    job instead of terminating the worker with SIGBUS.
+    """
+    set_mmap_enabled(False)
+
+
+def sign_job(private_key_der, pdf_path, output_path, signer_name, incremental):
+    """
+    Sign a document in a worker process.
+
+    Returns:
+        str: Path to the signed document.
+    """
+    signer = PDFSigner(load_trusted_private_key(private_key_der))
+    return signer.sign_document(pdf_path, output_path, signer_name, incremental=incremental)
+
+
+def sign_digests_job(private_key_der, digests):
+    """
+    Sign a batch of to-be-signed digests in a worker process.
+
+    Returns:
+        list: Signatures in the order of the digests.
+    """
+    return DigestSigner(load_trusted_private_key(private_key_der)).sign_digests(digests)
+
+
+def verify_job(public_key_pem, pdf_path):
+    """
+    Verify a document in a worker process, reusing the verifier of a public key.
+
+    Returns:
+        tuple: (is_valid, message) as returned by SignatureVerifier.verify_signature.
+    """
+    verifier = _verifiers.get(public_key_pem)
+    if verifier is None:
+        verifier = SignatureVerifier(serialization.load_pem_public_key(public_key_pem))
+        _verifiers[public_key_pem] = verifier
+    return verifier.verify_signature(pdf_path)
+
+
+def decrypt_job(encrypted_data, pin):
+    """
+    Decrypt a private key in a worker process, PBKDF2 and key validation hold the GIL.
+
+    Returns:
+        bytes: Decrypted private key in PEM format.
+
+    Raises:
+        ValueError: When PIN is invalid or the key cannot be read.
+    """
+    return decrypt_private_key(encrypted_data, pin)
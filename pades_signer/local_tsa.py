@@ -0,0 +1,294 @@
+"""
+Module providing a local RFC 3161 time-stamping authority for tests and benchmarks.
+
+The authority issues real tokens, signed with an ECDSA P-256 key and a self-signed
+certificate restricted to time-stamping, and serves them over HTTP with keep-alive
+like a public TSA. Its time is the local clock, so its tokens are only as trustworthy
+as the machine it runs on: verifiers must be given its certificate explicitly.
+
+Usage:
+    $ python -m pades_signer.local_tsa --port 3180 --certificate tsa.pem
+"""
+
+import argparse
+import hashlib
+import itertools
+import signal
+import sys
+import threading
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import ec
+from cryptography.x509.oid import ExtendedKeyUsageOID, NameOID
+from pades_signer.rfc3161 import FAILURE_BAD_ALG, FAILURE_BAD_DATA_FORMAT, OID_CONTENT_TYPE, \
+    OID_ECDSA_WITH_SHA256, OID_MESSAGE_DIGEST, OID_SHA256, OID_SIGNED_DATA, OID_SIGNING_CERTIFICATE_V2, \
+    OID_TST_INFO, REQUEST_CONTENT_TYPE, RESPONSE_CONTENT_TYPE, STATUS_GRANTED, STATUS_REJECTION, \
+    TimestampRequest, algorithm_identifier, build_response, encode, encode_generalized_time, encode_integer, \
+    encode_octet_string, encode_oid, encode_sequence, encode_set, message_imprint
+
+# Policy identifier of the tokens, under the arc reserved for examples (RFC 7229)
+LOCAL_POLICY = "1.3.6.1.5.5.7.13.1"
+
+
+def generate_certificate(private_key, common_name="Local Time-Stamping Authority", days=365):
+    """
+    Create a self-signed certificate restricted to time-stamping.
+
+    Args:
+        private_key: Private key of the authority.
+        common_name (str): Common name of the certificate (default: "Local Time-Stamping Authority").
+        days (int): Validity of the certificate in days (default: 365).
+
+    Returns:
+        Certificate: The certificate.
+    """
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, common_name)])
+    now = datetime.now(timezone.utc)
+    return (x509.CertificateBuilder()
+            .subject_name(name)
+            .issuer_name(name)
+            .public_key(private_key.public_key())
+            .serial_number(x509.random_serial_number())
+            .not_valid_before(now - timedelta(minutes=5))
+            .not_valid_after(now + timedelta(days=days))
+            .add_extension(x509.ExtendedKeyUsage([ExtendedKeyUsageOID.TIME_STAMPING]), critical=True)
+            .add_extension(x509.BasicConstraints(ca=False, path_length=None), critical=True)
+            .sign(private_key, hashes.SHA256()))
+
+
+class LocalTSA:
+    """
+    Class issuing RFC 3161 time-stamp tokens from the local clock.
+
+    Attributes:
+        private_key: ECDSA private key signing the tokens.
+        certificate (Certificate): Certificate of the authority, to be trusted by verifiers.
+        policy (str): Policy identifier of the tokens.
+        issued (int): Number of tokens issued.
+        url (str): Address of the HTTP endpoint once serve is called, None before.
+    """
+
+    def __init__(self, private_key=None, certificate=None, policy=LOCAL_POLICY):
+        """
+        Initialize the authority.
+
+        Args:
+            private_key: ECDSA private key, a new P-256 key when None (default: None).
+            certificate (Certificate): Certificate of private_key, a new self-signed one when None (default: None).
+            policy (str): Policy identifier of the tokens (default: LOCAL_POLICY).
+        """
+        self.private_key = private_key or ec.generate_private_key(ec.SECP256R1())
+        self.certificate = certificate or generate_certificate(self.private_key)
+        self.policy = policy
+        self.issued = 0
+        self.url = None
+        self._certificate_der = self.certificate.public_bytes(serialization.Encoding.DER)
+        self._serial_numbers = itertools.count(1)
+        self._lock = threading.Lock()
+        self._server = None
+
+    def certificate_pem(self):
+        """
+        Return the certificate of the authority.
+
+        Returns:
+            bytes: Certificate in PEM format.
+        """
+        return self.certificate.public_bytes(serialization.Encoding.PEM)
+
+    def issue(self, digest, nonce=None, include_certificate=True, gen_time=None):
+        """
+        Issue a token for a SHA-256 digest.
+
+        Args:
+            digest (bytes): SHA-256 digest to be time-stamped.
+            nonce (int): Nonce of the request, echoed in the token (default: None).
+            include_certificate (bool): Include the certificate of the authority (default: True).
+            gen_time (datetime): Asserted time, the current time when None (default: None).
+
+        Returns:
+            bytes: DER encoded token.
+        """
+        with self._lock:
+            serial_number = next(self._serial_numbers)
+            self.issued += 1
+        fields = [encode_integer(1), encode_oid(self.policy), message_imprint(digest), encode_integer(serial_number),
+                  encode_generalized_time(gen_time or datetime.now(timezone.utc))]
+        if nonce is not None:
+            fields.append(encode_integer(nonce))
+        tst_info = encode_sequence(*fields)
+
+        # ESSCertIDv2 with the default SHA-256 hash algorithm, RFC 5816
+        certificate_id = encode_sequence(encode_sequence(encode_sequence(
+            encode_octet_string(hashlib.sha256(self._certificate_der).digest()))))
+        signed_attributes = encode_set(
+            encode_sequence(encode_oid(OID_CONTENT_TYPE), encode_set(encode_oid(OID_TST_INFO))),
+            encode_sequence(encode_oid(OID_MESSAGE_DIGEST),
+                            encode_set(encode_octet_string(hashlib.sha256(tst_info).digest()))),
+            encode_sequence(encode_oid(OID_SIGNING_CERTIFICATE_V2), encode_set(certificate_id)),
+        )
+        signature = self.private_key.sign(signed_attributes, ec.ECDSA(hashes.SHA256()))
+
+        signer_info = encode_sequence(
+            encode_integer(1),
+            encode_sequence(self.certificate.issuer.public_bytes(), encode_integer(self.certificate.serial_number)),
+            algorithm_identifier(OID_SHA256),
+            # Signed attributes are stored with an implicit [0] tag instead of the SET tag they are signed with
+            bytes((0xA0,)) + signed_attributes[1:],
+            algorithm_identifier(OID_ECDSA_WITH_SHA256, null_parameters=False),
+            encode_octet_string(signature),
+        )
+        signed_data = [
+            encode_integer(3),
+            encode_set(algorithm_identifier(OID_SHA256)),
+            encode_sequence(encode_oid(OID_TST_INFO), encode(0xA0, encode_octet_string(tst_info))),
+        ]
+        if include_certificate:
+            signed_data.append(encode(0xA0, self._certificate_der))
+        signed_data.append(encode_set(signer_info))
+        return encode_sequence(encode_oid(OID_SIGNED_DATA), encode(0xA0, encode_sequence(*signed_data)))
+
+    def respond(self, request_der):
+        """
+        Answer an encoded TimeStampReq.
+
+        Args:
+            request_der (bytes): DER encoded request.
+
+        Returns:
+            bytes: DER encoded TimeStampResp, a rejection when the request cannot be served.
+        """
+        try:
+            request = TimestampRequest.from_der(request_der)
+        except ValueError as e:
+            failure = FAILURE_BAD_ALG if "algorithm" in str(e) else FAILURE_BAD_DATA_FORMAT
+            return build_response(STATUS_REJECTION, status_text=str(e), failure=failure)
+        token = self.issue(request.digest, request.nonce, request.cert_req)
+        return build_response(STATUS_GRANTED, token)
+
+    def serve(self, host="127.0.0.1", port=0):
+        """
+        Serve requests over HTTP on a background thread.
+
+        Args:
+            host (str): Address to listen on (default: "127.0.0.1").
+            port (int): Port to listen on, 0 picks a free one (default: 0).
+
+        Returns:
+            str: URL of the endpoint, also stored in url.
+        """
+        self._server = create_server(self, host, port)
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        self.url = f"http://{self._server.server_address[0]}:{self._server.server_address[1]}/"
+        return self.url
+
+    def shutdown(self):
+        """
+        Stop serving requests.
+        """
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+            self.url = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.shutdown()
+
+
+class RequestHandler(BaseHTTPRequestHandler):
+    """
+    HTTP handler answering time-stamp requests, the authority is an attribute of the server.
+    """
+
+    # HTTP/1.1, so clients keep their connections open between requests
+    protocol_version = "HTTP/1.1"
+    # Headers and body are written separately, without TCP_NODELAY the body waits for a delayed ACK
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        """
+        Answer a time-stamp request.
+        """
+        length = int(self.headers.get("Content-Length", 0))
+        body = self.rfile.read(length)
+        if self.headers.get("Content-Type") != REQUEST_CONTENT_TYPE:
+            self.send_response(415)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        data = self.server.authority.respond(body)
+        self.send_response(200)
+        self.send_header("Content-Type", RESPONSE_CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        """
+        Log requests only in verbose mode.
+        """
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+def create_server(authority, host="127.0.0.1", port=3180, verbose=False):
+    """
+    Create the HTTP server of an authority.
+
+    Args:
+        authority (LocalTSA): Authority issuing the tokens.
+        host (str): Address to listen on (default: "127.0.0.1").
+        port (int): Port to listen on, 0 picks a free one (default: 3180).
+        verbose (bool): Log every request (default: False).
+
+    Returns:
+        ThreadingHTTPServer: Server handling every connection on its own thread.
+    """
+    server = ThreadingHTTPServer((host, port), RequestHandler)
+    server.daemon_threads = True
+    server.authority = authority
+    server.verbose = verbose
+    return server
+
+
+def main(argv=None):
+    """
+    Command line entry point of the local authority.
+
+    Args:
+        argv (list): Command line arguments, sys.argv when None (default: None).
+
+    Returns:
+        int: Exit code.
+    """
+    parser = argparse.ArgumentParser(description="Run a local RFC 3161 time-stamping authority.")
+    parser.add_argument("--host", default="127.0.0.1", help="Address to listen on")
+    parser.add_argument("--port", type=int, default=3180, help="Port to listen on")
+    parser.add_argument("--certificate", help="Save the certificate of the authority to this PEM file")
+    parser.add_argument("--verbose", action="store_true", help="Log every request")
+    args = parser.parse_args(argv)
+
+    authority = LocalTSA()
+    if args.certificate:
+        with open(args.certificate, "wb") as certificate_file:
+            certificate_file.write(authority.certificate_pem())
+    server = create_server(authority, args.host, args.port, args.verbose)
+    signal.signal(signal.SIGTERM, lambda signum, frame: threading.Thread(target=server.shutdown).start())
+    print(f"Listening on http://{server.server_address[0]}:{server.server_address[1]}/")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
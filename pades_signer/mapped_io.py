@@ -0,0 +1,235 @@
+"""
+Module reading input documents through read-only memory mappings.
+
+Parsing a document from a path makes PyPDF2 read the whole file into memory, although
+signing incrementally or finding a signature only touches the trailer and a few objects.
+Parsed from a mapping, only the pages of the file actually read are loaded, straight
+from the page cache and without a private copy. Hashing maps the file in windows and
+feeds them to the hash and the copy target as memoryviews, which saves copying every
+byte into a read buffer and keeps memory bound by the window size.
+
+Files smaller than MMAP_THRESHOLD, and files that cannot be mapped (pipes, some network
+filesystems), are read with regular I/O. Reading past the end of a mapped file that was
+truncated terminates the process with SIGBUS, so files on network shares, FUSE mounts and
+removable drives, which can shrink or disappear without this process truncating them, are
+never mapped. Services reading documents other processes may truncate disable mappings
+with set_mmap_enabled, and setting PADES_SIGNER_NO_MMAP disables them everywhere.
+"""
+
+import io
+import mmap
+import os
+import stat
+from PyPDF2 import PdfReader
+
+# Files smaller than this are read with regular I/O, mapping them saves nothing
+MMAP_THRESHOLD = 1024 * 1024
+
+# Size of the mapped windows used when streaming a file
+MAP_WINDOW = 16 * 1024 * 1024
+
+# Environment variable disabling memory mappings when set to a non-empty value
+NO_MMAP_ENV = "PADES_SIGNER_NO_MMAP"
+
+# Filesystems of network shares and removable drives, files on FUSE mounts are not mapped either
+UNMAPPED_FILESYSTEMS = frozenset(("nfs", "nfs4", "cifs", "smb3", "smbfs", "9p", "afs", "ceph", "glusterfs",
+                                  "vfat", "msdos", "exfat", "ntfs", "ntfs3", "fuseblk"))
+
+_mmap_enabled = not os.environ.get(NO_MMAP_ENV)
+
+# Whether files of a device may be mapped, by device number
+_device_decisions = {}
+
+
+def set_mmap_enabled(enabled):
+    """
+    Enable or disable memory mappings in the current process.
+
+    Args:
+        enabled (bool): Map input files, when False they are read with regular I/O.
+    """
+    global _mmap_enabled
+    _mmap_enabled = enabled
+
+
+def mmap_allowed(path):
+    """
+    Check whether a file may be mapped, mappings must be enabled and the file on a local fixed disk.
+
+    The filesystem is looked up once per device and process, later files of the same
+    device reuse the decision.
+
+    Args:
+        path (str): Path to the file.
+
+    Returns:
+        bool: False when mappings are disabled or the file is on a network, FUSE or removable filesystem.
+    """
+    if not _mmap_enabled:
+        return False
+    try:
+        device = os.stat(path).st_dev
+    except OSError:
+        return False
+    allowed = _device_decisions.get(device)
+    if allowed is None:
+        allowed = _device_decisions[device] = _mappable_device(path, device)
+    return allowed
+
+
+def _mappable_device(path, device):
+    """
+    Check the filesystem holding a path and the device it is stored on.
+    """
+    # Imported on first use, small files and the command line never need it
+    import psutil
+    try:
+        partitions = psutil.disk_partitions(all=True)
+    except OSError:
+        partitions = []
+    path = os.path.normcase(os.path.realpath(path))
+    mount = None
+    for partition in partitions:
+        mountpoint = os.path.normcase(partition.mountpoint)
+        if path != mountpoint and not path.startswith(mountpoint.rstrip(os.sep) + os.sep):
+            continue
+        if mount is None or len(mountpoint) > len(mount.mountpoint):
+            mount = partition
+    if mount is not None:
+        fstype = mount.fstype.lower()
+        # Windows reports removable drives in the mount options
+        if fstype in UNMAPPED_FILESYSTEMS or fstype.startswith("fuse") or "removable" in mount.opts.lower():
+            return False
+    return not _removable_device(device)
+
+
+def _removable_device(device):
+    """
+    Check whether a block device, or the disk its partition belongs to, is removable, on Linux.
+    """
+    if not hasattr(os, "major"):
+        return False
+    block = os.path.realpath(f"/sys/dev/block/{os.major(device)}:{os.minor(device)}")
+    # Partitions have no removable attribute, their disk is the parent directory
+    for directory in (block, os.path.dirname(block)):
+        try:
+            with open(os.path.join(directory, "removable"), "r", encoding="ascii") as removable:
+                return removable.read().strip() == "1"
+        except OSError:
+            continue
+    return False
+
+
+def _regular_file_size(file):
+    """
+    Return the size of an open regular file, None for other kinds of files.
+    """
+    try:
+        status = os.fstat(file.fileno())
+    except (AttributeError, OSError, io.UnsupportedOperation):
+        return None
+    return status.st_size if stat.S_ISREG(status.st_mode) else None
+
+
+def map_file(path):
+    """
+    Map a whole file read-only.
+
+    Args:
+        path (str): Path to the file.
+
+    Returns:
+        mmap.mmap or None: Mapping of the file, None when the file is smaller than
+            MMAP_THRESHOLD or cannot or may not be mapped, see mmap_allowed.
+    """
+    with open(path, "rb") as file:
+        size = _regular_file_size(file)
+        if size is None or size < MMAP_THRESHOLD or not mmap_allowed(path):
+            return None
+        try:
+            return mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            return None
+
+
+def open_pdf(path):
+    """
+    Parse a PDF document from a read-only mapping of its file.
+
+    The mapping is released with release_pdf, or when the reader is garbage collected.
+
+    Args:
+        path (str): Path to the document.
+
+    Returns:
+        PdfReader: Reader of the document, reading from the mapping or, when the file
+            is not mapped, from an in-memory copy as PdfReader(path) does.
+    """
+    mapping = map_file(path)
+    return PdfReader(mapping if mapping is not None else path)
+
+
+def release_pdf(reader):
+    """
+    Release the mapping of a reader returned by open_pdf, the reader cannot be used afterwards.
+
+    Args:
+        reader (PdfReader): Reader returned by open_pdf.
+    """
+    if isinstance(reader.stream, mmap.mmap):
+        reader.stream.close()
+
+
+def mapped_chunks(file, length=None, window=MAP_WINDOW):
+    """
+    Read a file through mapped windows, from its current position.
+
+    Each chunk is a memoryview into the mapping, valid only until the next one is
+    requested. The file position is moved past the bytes read once all chunks are consumed.
+
+    Args:
+        file: File opened in binary mode.
+        length (int): Number of bytes to read, until the end of the file when None (default: None).
+        window (int): Size of the mapped windows in bytes (default: MAP_WINDOW).
+
+    Returns:
+        generator or None: Chunks of the requested bytes, None when the file cannot or may
+            not be mapped, see mmap_allowed, or the range is smaller than MMAP_THRESHOLD.
+
+    Raises:
+        ValueError: When the file ends before the requested length.
+    """
+    size = _regular_file_size(file)
+    if size is None:
+        return None
+    position = file.tell()
+    available = max(0, size - position)
+    if length is None:
+        length = available
+    elif length > available:
+        raise ValueError("Signed byte range exceeds document size")
+    name = getattr(file, "name", None)
+    # Files opened without a path, e.g. anonymous temporary files, cannot be located on a mount
+    if length < MMAP_THRESHOLD or not isinstance(name, str) or not mmap_allowed(name):
+        return None
+    return _chunks(file, position, length, window)
+
+
+def _chunks(file, position, length, window):
+    """
+    Map the windows covering a byte range and yield their parts within it.
+    """
+    end = position + length
+    offset = position
+    while offset < end:
+        # Mappings start at multiples of the allocation granularity
+        start = offset - offset % mmap.ALLOCATIONGRANULARITY
+        size = min(window, end - start)
+        mapping = mmap.mmap(file.fileno(), size, offset=start, access=mmap.ACCESS_READ)
+        try:
+            with memoryview(mapping) as view, view[offset - start:] as chunk:
+                yield chunk
+        finally:
+            mapping.close()
+        offset = start + size
+    file.seek(end)
@@ -0,0 +1,367 @@
+"""
+Module providing Merkle-tree batch signing, one private-key operation for many documents.
+
+Every document of a batch is prepared with an incremental update as in remote signing.
+Their to-be-signed digests become the leaves of a Merkle tree and only the root is
+signed. Each document then embeds the root signature together with its inclusion
+proof in /Contents, so it can still be verified on its own.
+
+Leaves and inner nodes are hashed with different prefixes, so an inner node can never
+be passed off as a document digest. A node without a sibling is promoted unchanged.
+"""
+
+import hashlib
+import struct
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.serialization import load_pem_private_key
+from common.atomic_output import DURABILITY_FSYNC
+from key_manager.algorithms import algorithm_for_key
+from pades_signer.remote_signing import PreparedSignature, prepare_document
+
+# Suffix of the /SubFilter of batch signatures, appended to the one of the algorithm
+MERKLE_SUBFILTER_SUFFIX = ".merkle"
+
+_LEAF_PREFIX = b"\x00"
+_NODE_PREFIX = b"\x01"
+
+# Payload: magic, leaf index, leaf count, number of proof steps, steps, signature length, signature
+_PAYLOAD_MAGIC = b"MRK1"
+_PAYLOAD_HEADER = struct.Struct(">4sIIB")
+_STEP_SIZE = 1 + hashlib.sha256().digest_size
+_SIGNATURE_LENGTH = struct.Struct(">H")
+
+
+def merkle_subfilter(algorithm):
+    """
+    Return the /SubFilter of batch signatures made with an algorithm.
+
+    Args:
+        algorithm (SignatureAlgorithm): Signature algorithm of the root signature.
+
+    Returns:
+        str: /SubFilter value, e.g. /raw.rsa_sha256.merkle.
+    """
+    return algorithm.subfilter + MERKLE_SUBFILTER_SUFFIX
+
+
+def split_subfilter(subfilter):
+    """
+    Separate the algorithm /SubFilter from the batch suffix.
+
+    Args:
+        subfilter (str): /SubFilter value of a signature.
+
+    Returns:
+        tuple: (algorithm_subfilter, is_merkle).
+    """
+    if subfilter.endswith(MERKLE_SUBFILTER_SUFFIX):
+        return subfilter[:-len(MERKLE_SUBFILTER_SUFFIX)], True
+    return subfilter, False
+
+
+def _leaf_hash(digest):
+    return hashlib.sha256(_LEAF_PREFIX + digest).digest()
+
+
+def _node_hash(left, right):
+    return hashlib.sha256(_NODE_PREFIX + left + right).digest()
+
+
+def build_tree(digests):
+    """
+    Build a Merkle tree over document digests.
+
+    Args:
+        digests (list): To-be-signed digests of the documents.
+
+    Returns:
+        list: Levels of the tree from the leaves to the root, each a list of hashes.
+
+    Raises:
+        ValueError: When no digests are given.
+    """
+    if not digests:
+        raise ValueError("Cannot build a Merkle tree without documents")
+    levels = [[_leaf_hash(digest) for digest in digests]]
+    while len(levels[-1]) > 1:
+        level = levels[-1]
+        parents = [_node_hash(level[i], level[i + 1]) for i in range(0, len(level) - 1, 2)]
+        if len(level) % 2:
+            parents.append(level[-1])
+        levels.append(parents)
+    return levels
+
+
+def inclusion_proof(levels, index):
+    """
+    Collect the sibling hashes linking a leaf to the root.
+
+    Args:
+        levels (list): Tree returned by build_tree.
+        index (int): Index of the leaf.
+
+    Returns:
+        list: Steps (sibling_is_left, sibling_hash) from the leaf up, promoted levels are skipped.
+    """
+    proof = []
+    for level in levels[:-1]:
+        sibling = index ^ 1
+        if sibling < len(level):
+            proof.append((sibling < index, level[sibling]))
+        index //= 2
+    return proof
+
+
+def root_from_proof(digest, proof):
+    """
+    Compute the root of the tree a document digest belongs to.
+
+    Args:
+        digest (bytes): To-be-signed digest of the document.
+        proof (list): Steps returned by inclusion_proof.
+
+    Returns:
+        bytes: Merkle root.
+    """
+    node = _leaf_hash(digest)
+    for sibling_is_left, sibling in proof:
+        node = _node_hash(sibling, node) if sibling_is_left else _node_hash(node, sibling)
+    return node
+
+
+def encode_proof(proof):
+    """
+    Encode the steps of an inclusion proof.
+
+    Args:
+        proof (list): Steps returned by inclusion_proof.
+
+    Returns:
+        bytes: One byte telling the side of the sibling followed by its hash, for every step.
+    """
+    return b"".join((b"\x01" if sibling_is_left else b"\x00") + sibling for sibling_is_left, sibling in proof)
+
+
+def decode_proof(data):
+    """
+    Decode the steps of an inclusion proof encoded by encode_proof.
+
+    Args:
+        data (bytes): Encoded steps.
+
+    Returns:
+        list: Steps (sibling_is_left, sibling_hash).
+
+    Raises:
+        ValueError: When the data is not a whole number of well-formed steps.
+    """
+    if len(data) % _STEP_SIZE:
+        raise ValueError("truncated inclusion proof")
+    if any(side not in (0, 1) for side in data[::_STEP_SIZE]):
+        raise ValueError("malformed inclusion proof")
+    return [(data[offset] == 1, bytes(data[offset + 1:offset + _STEP_SIZE]))
+            for offset in range(0, len(data), _STEP_SIZE)]
+
+
+def payload_size(count, signature_size):
+    """
+    Compute the space to reserve in /Contents for any document of a batch.
+
+    Args:
+        count (int): Number of documents in the batch.
+        signature_size (int): Size of the root signature.
+
+    Returns:
+        int: Payload size in bytes for the longest possible proof.
+    """
+    depth = max(0, (count - 1).bit_length())
+    return _PAYLOAD_HEADER.size + depth * _STEP_SIZE + _SIGNATURE_LENGTH.size + signature_size
+
+
+def encode_payload(index, count, proof, signature):
+    """
+    Encode the root signature and the inclusion proof of a document.
+
+    Returns:
+        bytes: Payload stored in /Contents.
+    """
+    return (_PAYLOAD_HEADER.pack(_PAYLOAD_MAGIC, index, count, len(proof)) + encode_proof(proof)
+            + _SIGNATURE_LENGTH.pack(len(signature)) + signature)
+
+
+def decode_payload(contents):
+    """
+    Decode the payload of a batch signature, trailing zero padding is ignored.
+
+    Args:
+        contents (bytes): Value of /Contents.
+
+    Returns:
+        tuple: (index, count, proof, signature).
+
+    Raises:
+        ValueError: When the payload is malformed.
+    """
+    try:
+        magic, index, count, steps = _PAYLOAD_HEADER.unpack_from(contents)
+        if magic != _PAYLOAD_MAGIC or index >= count:
+            raise ValueError("not a Merkle batch signature")
+        offset = _PAYLOAD_HEADER.size + steps * _STEP_SIZE
+        proof = decode_proof(contents[_PAYLOAD_HEADER.size:offset])
+        (length,) = _SIGNATURE_LENGTH.unpack_from(contents, offset)
+        offset += _SIGNATURE_LENGTH.size
+        signature = contents[offset:offset + length]
+        if len(signature) != length:
+            raise ValueError("truncated signature")
+    except struct.error:
+        raise ValueError("truncated Merkle batch signature")
+    return index, count, proof, signature
+
+
+def resolve_merkle_signature(contents, doc_hash):
+    """
+    Compute the signed root of a document from the inclusion proof in its /Contents.
+
+    Args:
+        contents (bytes): Value of /Contents.
+        doc_hash (bytes): To-be-signed digest of the document, hashed over its byte ranges.
+
+    Returns:
+        tuple: (signature, root) to be checked with the public key.
+
+    Raises:
+        ValueError: When the payload is malformed.
+    """
+    _, _, proof, signature = decode_payload(contents)
+    return signature, root_from_proof(doc_hash, proof)
+
+
+def _prepare_one(pdf_path, output_path, signer_name, public_key_pem, signing_date, contents_size, subfilter,
+                 durability):
+    """
+    Prepare a single document of a batch, isolating any failure in the result.
+
+    Returns:
+        tuple: (prepared_values, error) with PreparedSignature.to_dict values or an error message.
+    """
+    try:
+        public_key = serialization.load_pem_public_key(public_key_pem)
+        prepared = prepare_document(pdf_path, output_path, signer_name, public_key, signing_date,
+                                    contents_size, subfilter, durability)
+        return prepared.to_dict(), None
+    except Exception as e:
+        return None, str(e)
+
+
+class MerkleBatchSigner:
+    """
+    Class signing a batch of documents with a single private-key operation.
+    """
+
+    def __init__(self, private_key_pem, signer_name, workers=1, durability=DURABILITY_FSYNC):
+        """
+        Initialize the batch signer.
+
+        Args:
+            private_key_pem (bytes or private key): Private key in PEM format, or a parsed private key object.
+            signer_name (str): Name of the person signing the documents.
+            workers (int): Number of worker processes preparing documents, the current
+                process when 1 (default: 1).
+            durability (str): Durability of the signed documents, see common.atomic_output
+                (default: DURABILITY_FSYNC).
+        """
+        if isinstance(private_key_pem, bytes):
+            self.private_key = load_pem_private_key(private_key_pem, password=None)
+        else:
+            self.private_key = private_key_pem
+        self.algorithm = algorithm_for_key(self.private_key)
+        self.signer_name = signer_name
+        self.workers = workers
+        self.durability = durability
+
+    def sign(self, pdf_paths, output_paths):
+        """
+        Sign documents as one batch.
+
+        Documents that cannot be prepared are reported in their results and left out
+        of the tree, the rest of the batch is signed. A document whose signature cannot
+        be injected is reported as failed as well, without stopping the others, and none
+        is saved when the root cannot be signed.
+
+        Args:
+            pdf_paths (list): Paths to the PDF documents to be signed.
+            output_paths (list): Paths where the signed documents will be saved, in the same order.
+
+        Returns:
+            list: SignResult objects in input order, the duration of each document includes
+                its share of the root signature.
+        """
+        # Imported here, so verifiers reading batch signatures do not load the batch signer
+        from pades_signer.batch_signer import SignResult
+
+        public_key_pem = self.private_key.public_key().public_bytes(
+            encoding=serialization.Encoding.PEM,
+            format=serialization.PublicFormat.SubjectPublicKeyInfo
+        )
+        signature_size = self.algorithm.signature_size(self.private_key)
+        arguments = [(pdf_path, output_path, self.signer_name, public_key_pem, datetime.now(),
+                      payload_size(len(pdf_paths), signature_size), merkle_subfilter(self.algorithm),
+                      self.durability)
+                     for pdf_path, output_path in zip(pdf_paths, output_paths)]
+
+        start = time.perf_counter()
+        outcomes = self._prepare(arguments)
+        errors = [error for _, error in outcomes]
+        prepared = [(index, PreparedSignature.from_dict(values)) for index, (values, _) in enumerate(outcomes)
+                    if values]
+        try:
+            if prepared:
+                levels = build_tree([item.digest for _, item in prepared])
+                signature = self.algorithm.sign(self.private_key, levels[-1][0])
+                for leaf, (index, item) in enumerate(prepared):
+                    try:
+                        item.inject(encode_payload(leaf, len(prepared), inclusion_proof(levels, leaf), signature))
+                    except (OSError, ValueError) as e:
+                        errors[index] = str(e)
+        finally:
+            # Prepared documents that never got their signature are removed, their outputs were never written
+            for _, item in prepared:
+                item.discard()
+
+        duration = (time.perf_counter() - start) / max(1, len(pdf_paths))
+        return [SignResult(pdf_path, None if error else output_path, error, duration)
+                for error, pdf_path, output_path in zip(errors, pdf_paths, output_paths)]
+
+    def _prepare(self, arguments):
+        """
+        Prepare the documents of a batch, in worker processes when more than one is configured.
+
+        Args:
+            arguments (list): Arguments of _prepare_one for each document.
+
+        Returns:
+            list: (prepared_values, error) for each document in input order, documents lost
+                to a crashed worker are reported as failed.
+        """
+        if self.workers == 1:
+            return [_prepare_one(*args) for args in arguments]
+        outcomes = []
+        with ProcessPoolExecutor(max_workers=self.workers) as executor:
+            futures = []
+            try:
+                for args in arguments:
+                    futures.append(executor.submit(_prepare_one, *args))
+            except BrokenProcessPool:
+                # A worker crashed while the batch was submitted, the remaining documents are not prepared
+                pass
+            for future in futures:
+                try:
+                    outcomes.append(future.result())
+                except BrokenProcessPool as e:
+                    outcomes.append((None, f"Worker process crashed: {str(e)}"))
+        lost = len(arguments) - len(futures)
+        return outcomes + [(None, "Worker process crashed before the document was prepared")] * lost
@@ -0,0 +1,231 @@
+"""
+Module replacing the document information dictionary of a document written by PdfWriter
+without serializing its pages again.
+
+PdfWriter writes every object once, in object number order, followed by a single
+cross-reference section and the trailer. Replacing the information dictionary only
+shifts the objects after it, so the document is copied byte for byte around the new
+dictionary and the cross-reference offsets are moved by the difference in size.
+
+Documents signed by PDFSigner are hashed as written by PdfWriter before the signature
+metadata is added, so both the signed document and the hashed content can be produced
+from one serialization, and verifiers can recompute the hash from the signed file
+without copying a single page. Cost is bound by disk and hash speed, not page count.
+"""
+
+import io
+import re
+from PyPDF2.errors import PdfReadError
+from PyPDF2.generic import DictionaryObject, NameObject, create_string_object, read_object
+from pades_signer.hashing import update_from_file
+
+# Bytes at the end of the file searched for startxref
+_TAIL_SIZE = 1024
+
+_XREF_ENTRY_SIZE = 20
+_FREE_ENTRY = b"0000000000 65535 f \n"
+_XREF_HEADER = re.compile(rb"xref\n0 (\d+)\n")
+_XREF_ENTRY = re.compile(rb"(\d{10}) 00000 n \n")
+_STARTXREF = re.compile(rb"startxref\n(\d+)\n%%EOF\n?$")
+_INFO_REFERENCE = re.compile(rb"/Info (\d+) 0 R")
+
+
+class WriterLayout:
+    """
+    Object offsets of a document written by PdfWriter.
+
+    Attributes:
+        offsets (list): Offsets of objects 1 to n.
+        xref_offset (int): Offset of the cross-reference section.
+        trailer (bytes): Trailer section, from 'trailer' up to 'startxref'.
+        info_number (int): Object number of the information dictionary.
+    """
+
+    def __init__(self, offsets, xref_offset, trailer, info_number):
+        """
+        Initialize the layout.
+
+        Args:
+            offsets (list): Offsets of objects 1 to n.
+            xref_offset (int): Offset of the cross-reference section.
+            trailer (bytes): Trailer section, from 'trailer' up to 'startxref'.
+            info_number (int): Object number of the information dictionary.
+        """
+        self.offsets = offsets
+        self.xref_offset = xref_offset
+        self.trailer = trailer
+        self.info_number = info_number
+
+    @property
+    def info_start(self):
+        """
+        int: Offset of the information dictionary object.
+        """
+        return self.offsets[self.info_number - 1]
+
+    @property
+    def info_end(self):
+        """
+        int: Offset right after the information dictionary object.
+        """
+        if self.info_number < len(self.offsets):
+            return self.offsets[self.info_number]
+        return self.xref_offset
+
+
+def read_writer_layout(file):
+    """
+    Read the layout of a document, provided it has the structure written by PdfWriter.
+
+    Args:
+        file: Document opened in binary mode.
+
+    Returns:
+        WriterLayout or None: Layout of the document, None when it was not written by PdfWriter
+            in a single pass, e.g. when it has incremental updates or cross-reference streams.
+    """
+    file_size = file.seek(0, io.SEEK_END)
+    file.seek(max(0, file_size - _TAIL_SIZE))
+    tail = file.read()
+    startxref = _STARTXREF.search(tail)
+    if not startxref:
+        return None
+    startxref_offset = file_size - len(tail) + startxref.start()
+    xref_offset = int(startxref.group(1))
+    if xref_offset >= startxref_offset:
+        return None
+
+    file.seek(xref_offset)
+    section = file.read(startxref_offset - xref_offset)
+    header = _XREF_HEADER.match(section)
+    if not header:
+        return None
+    count = int(header.group(1))
+    entries_start = header.end()
+    trailer_start = entries_start + count * _XREF_ENTRY_SIZE
+    if count < 2 or section[entries_start:entries_start + _XREF_ENTRY_SIZE] != _FREE_ENTRY:
+        return None
+
+    offsets = []
+    for position in range(entries_start + _XREF_ENTRY_SIZE, trailer_start, _XREF_ENTRY_SIZE):
+        entry = _XREF_ENTRY.fullmatch(section, position, position + _XREF_ENTRY_SIZE)
+        if not entry:
+            return None
+        offsets.append(int(entry.group(1)))
+
+    trailer = section[trailer_start:]
+    info_reference = _INFO_REFERENCE.search(trailer)
+    if not trailer.startswith(b"trailer\n") or not info_reference:
+        return None
+    info_number = int(info_reference.group(1))
+    # Objects written one after another, without gaps for unused numbers
+    if not 0 < info_number <= len(offsets) or offsets != sorted(set(offsets)) or offsets[-1] >= xref_offset:
+        return None
+    return WriterLayout(offsets, xref_offset, trailer, info_number)
+
+
+def read_info(file, layout):
+    """
+    Parse the information dictionary of a document.
+
+    Args:
+        file: Document opened in binary mode.
+        layout (WriterLayout): Layout of the document.
+
+    Returns:
+        DictionaryObject: Information dictionary.
+
+    Raises:
+        ValueError: When the object is not a dictionary written by PdfWriter.
+    """
+    file.seek(layout.info_start)
+    data = file.read(layout.info_end - layout.info_start)
+    prefix = f"{layout.info_number} 0 obj\n".encode("ascii")
+    if not data.startswith(prefix) or not data.endswith(b"\nendobj\n"):
+        raise ValueError("Information dictionary is not a plain object")
+    try:
+        info = read_object(io.BytesIO(data[len(prefix):-len(b"\nendobj\n")]), None)
+    except PdfReadError as e:
+        raise ValueError(f"Information dictionary cannot be read: {str(e)}")
+    if not isinstance(info, DictionaryObject):
+        raise ValueError("Information dictionary is not a dictionary")
+    return info
+
+
+def updated_info(info, add=None, remove=()):
+    """
+    Copy an information dictionary with entries added and removed.
+
+    Entries are added as PdfWriter.add_metadata does, so the result serializes exactly
+    like a dictionary built by the writer.
+
+    Args:
+        info (DictionaryObject): Information dictionary.
+        add (dict): Entries to add, values are converted to PDF strings (default: None).
+        remove (iterable): Keys of entries to remove (default: ()).
+
+    Returns:
+        DictionaryObject: Updated copy.
+    """
+    updated = DictionaryObject((key, value) for key, value in info.items() if key not in remove)
+    for key, value in (add or {}).items():
+        updated[NameObject(key)] = create_string_object(value)
+    return updated
+
+
+def _emit(data, hasher, sink):
+    """
+    Feed generated bytes to the hash object and the sink.
+    """
+    hasher.update(data)
+    if sink is not None:
+        sink.write(data)
+
+
+class _NullHasher:
+    """
+    Hash object ignoring its input, used when the rewritten document is only written.
+    """
+
+    def update(self, data):
+        pass
+
+
+def write_with_info(file, layout, info, hasher=None, sink=None):
+    """
+    Produce a document with its information dictionary replaced, hashing and/or writing it.
+
+    Args:
+        file: Document opened in binary mode.
+        layout (WriterLayout): Layout of the document.
+        info (DictionaryObject): New information dictionary.
+        hasher: Hash object fed with the rewritten document (default: None).
+        sink: Binary file receiving the rewritten document (default: None).
+
+    Returns:
+        int: Size of the rewritten document in bytes.
+    """
+    hasher = hasher or _NullHasher()
+    info_object = io.BytesIO()
+    info_object.write(f"{layout.info_number} 0 obj\n".encode("ascii"))
+    info.write_to_stream(info_object, None)
+    info_object.write(b"\nendobj\n")
+    info_object = info_object.getvalue()
+    shift = len(info_object) - (layout.info_end - layout.info_start)
+
+    file.seek(0)
+    update_from_file(hasher, file, layout.info_start, sink=sink)
+    _emit(info_object, hasher, sink)
+    file.seek(layout.info_end)
+    update_from_file(hasher, file, layout.xref_offset - layout.info_end, sink=sink)
+
+    xref = [b"xref\n", f"0 {len(layout.offsets) + 1}\n".encode("ascii"), _FREE_ENTRY]
+    for number, offset in enumerate(layout.offsets, start=1):
+        if number > layout.info_number:
+            offset += shift
+        xref.append(f"{offset:010d} 00000 n \n".encode("ascii"))
+    xref.append(layout.trailer)
+    xref.append(f"startxref\n{layout.xref_offset + shift}\n%%EOF\n".encode("ascii"))
+    tail = b"".join(xref)
+    _emit(tail, hasher, sink)
+    return layout.xref_offset + shift + len(tail)
@@ -3,31 +3,86 @@ Module providing functionality for signing PDF documents using simplified PAdES
 """
 
 import hashlib
+import os
+import shutil
+import tempfile
 from datetime import datetime
 from cryptography.hazmat.primitives.serialization import load_pem_private_key
-from cryptography.hazmat.primitives.asymmetric import padding
-from cryptography.hazmat.primitives.hashes import SHA256
-from PyPDF2 import PdfReader, PdfWriter
-import io
+from PyPDF2 import PdfWriter
+from common.atomic_output import DURABILITY_FSYNC, AtomicOutput, check_durability
+from common.instrumentation import stage
+from key_manager.algorithms import DEFAULT_ALGORITHM, algorithm_for_key
+from key_manager.key_generator import public_key_fingerprint
+from pades_signer.detached import build_detached_record, detached_signature_path, signed_payload_hash, \
+    write_detached_signature
+from pades_signer.hashing import HashingStream, update_from_file
+from pades_signer.mapped_io import open_pdf, release_pdf
+from pades_signer.passthrough import read_info, read_writer_layout, updated_info, write_with_info
+from pades_signer.remote_signing import prepare_document
+from pades_signer.timestamping import signature_imprint, timestamp_fields, timestamp_metadata
+
 
 class PDFSigner:
     """
     Class responsible for signing PDF documents using simplified PAdES standard.
     """
 
-    def __init__(self, private_key_pem):
+    def __init__(self, private_key_pem, timestamp_client=None, durability=DURABILITY_FSYNC):
         """
         Initialize the PDF signer with a private key.
 
         Args:
-            private_key_pem (bytes): Private key in PEM format used for signing.
+            private_key_pem (bytes or private key): Private key in PEM format used for signing,
+                or an already parsed private key object, e.g. from UnlockSession.acquire_key.
+                The signature algorithm is determined by the type of the key.
+            timestamp_client (TimestampClient): Client of an RFC 3161 time-stamping authority
+                timestamping every signature, see pades_signer.timestamping (default: None).
+            durability (str): Durability of signed documents and detached signature files,
+                see common.atomic_output (default: DURABILITY_FSYNC).
+
+        Raises:
+            ValueError: When keys of this type are not supported, or the durability level is not known.
         """
-        self.private_key = load_pem_private_key(private_key_pem, password=None)
+        if isinstance(private_key_pem, bytes):
+            self.private_key = load_pem_private_key(private_key_pem, password=None)
+        else:
+            self.private_key = private_key_pem
+        self.algorithm = algorithm_for_key(self.private_key) if self.private_key else None
+        self.timestamp_client = timestamp_client
+        self.durability = check_durability(durability)
 
-    def sign_document(self, pdf_path, output_path, signer_name):
+    def sign_document(self, pdf_path, output_path, signer_name, incremental=False):
         """
         Sign a PDF document and save signed copy of PDF to the specified output path.
 
+        Args:
+            pdf_path (str): Path to the PDF document to be signed.
+            output_path (str): Path where the signed document will be saved.
+            signer_name (str): Name of the person signing the document.
+            incremental (bool): Append an incremental update with a /Sig dictionary instead
+                of rewriting the whole document (default: False).
+
+        Returns:
+            str: Path to the signed document.
+
+        Raises:
+            ValueError: When no private key is available for signing, or a timestamp is
+                requested for an incremental signature.
+        """
+        if not self.private_key:
+            raise ValueError("No private key available for signing")
+        if incremental and self.timestamp_client:
+            raise ValueError("Timestamps are not supported for incremental signatures")
+
+        with stage("sign.document", algorithm=self.algorithm.name, incremental=incremental):
+            if incremental:
+                return self._sign_incremental(pdf_path, output_path, signer_name)
+            return self._sign_rewrite(pdf_path, output_path, signer_name)
+
+    def _sign_rewrite(self, pdf_path, output_path, signer_name):
+        """
+        Sign a PDF document by rewriting it with the signature stored in its metadata.
+
         Args:
             pdf_path (str): Path to the PDF document to be signed.
             output_path (str): Path where the signed document will be saved.
@@ -35,6 +90,24 @@ class PDFSigner:
 
         Returns:
             str: Path to the signed document.
+        """
+        return self.prepare_rewrite(pdf_path, output_path, signer_name, self.timestamp_client).write()
+
+    def prepare_rewrite(self, pdf_path, output_path, signer_name, timestamp_client=None):
+        """
+        Serialize and sign a PDF document without writing the signed copy yet.
+
+        The unsigned serialization is kept in a temporary file next to the output, so the
+        document can be written by another process, e.g. once a batch is timestamped.
+
+        Args:
+            pdf_path (str): Path to the PDF document to be signed.
+            output_path (str): Path where the signed document will be saved.
+            signer_name (str): Name of the person signing the document.
+            timestamp_client (TimestampClient): Client timestamping the signature right away (default: None).
+
+        Returns:
+            PreparedRewrite: Signed document, saved by its write method.
 
         Raises:
             ValueError: When no private key is available for signing.
@@ -42,40 +115,262 @@ class PDFSigner:
         if not self.private_key:
             raise ValueError("No private key available for signing")
 
-        # Open PDF file
-        reader = PdfReader(pdf_path)
-        writer = PdfWriter()
-
-        # Copying input file to output PDF
-        for page in reader.pages:
-            writer.add_page(page)
-
-        # Temporary saving document without metadata
-        temp_stream = io.BytesIO()
-        writer.write(temp_stream)
-        temp_stream.seek(0)
-
-        # Hashing the document
-        hasher = hashlib.sha256()
-        hasher.update(temp_stream.getvalue())
-        doc_hash = hasher.digest()
-
-        # Signing PDF hash using our private key
-        signature = self.private_key.sign(
-            doc_hash,
-            padding.PKCS1v15(),
-            SHA256()
-        )
-
-        # Adding sign metadata
-        writer.add_metadata({
-            '/SignedBy': signer_name,
-            '/Signature': signature.hex(),
-            '/SigningDate': datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        })
-
-        # Save signer pdf file
-        with open(output_path, "wb") as output_file:
-            writer.write(output_file)
-
-        return output_path
+        with stage("sign.parse") as parse:
+            # Open PDF file, mapped so pages are read from the page cache without a private copy
+            reader = open_pdf(pdf_path)
+            writer = PdfWriter()
+
+            # Copying input file to output PDF
+            for page in reader.pages:
+                writer.add_page(page)
+            parse.add_bytes(os.path.getsize(pdf_path))
+
+        # Key fingerprint is added before hashing, so it is covered by the signature
+        # and kept by verifiers rebuilding the document without signature metadata
+        writer.add_metadata({'/KeyFingerprint': public_key_fingerprint(self.private_key.public_key())})
+
+        # The document is serialized once, to a temporary file next to the output, and
+        # the signature metadata is spliced into that copy instead of writing all pages again
+        output_dir, output_name = os.path.split(os.path.abspath(output_path))
+        descriptor, unsigned_path = tempfile.mkstemp(prefix=f".{output_name}.", suffix=".unsigned", dir=output_dir)
+        try:
+            with os.fdopen(descriptor, "w+b") as unsigned_file:
+                with stage("sign.serialize_hash") as serialize:
+                    # Hashing the document without signature metadata while it is serialized
+                    hashing_stream = HashingStream(sink=unsigned_file)
+                    writer.write(hashing_stream)
+                    doc_hash = hashing_stream.digest()
+                    serialize.add_bytes(hashing_stream.tell())
+
+                with stage("sign.sign", algorithm=self.algorithm.name):
+                    # Signing PDF hash using our private key
+                    signature = self.algorithm.sign(self.private_key, doc_hash)
+
+                # Adding sign metadata
+                metadata = {
+                    '/SignedBy': signer_name,
+                    '/Signature': signature.hex(),
+                    '/SigningDate': datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+                }
+                # RSA signatures carry no identifier, so they stay readable by earlier versions
+                if self.algorithm.name != DEFAULT_ALGORITHM:
+                    metadata['/SignatureAlgorithm'] = self.algorithm.name
+                if timestamp_client:
+                    with stage("sign.timestamp"):
+                        metadata['/Timestamp'] = timestamp_client.timestamp(signature_imprint(signature)).der.hex()
+
+                unsigned_file.flush()
+                spliced = read_writer_layout(unsigned_file) is not None
+                if not spliced:
+                    # Serialized again with the metadata, while the input is still mapped
+                    writer.add_metadata(metadata)
+                    unsigned_file.seek(0)
+                    unsigned_file.truncate()
+                    writer.write(unsigned_file)
+            # The input is no longer read, unmapped before the output may replace it
+            release_pdf(reader)
+        except BaseException:
+            os.remove(unsigned_path)
+            raise
+        return PreparedRewrite(output_path, unsigned_path, signature, metadata if spliced else None, self.durability)
+
+    def prepare_detached(self, pdf_path, signer_name, signature_path=None):
+        """
+        Sign a document by its hash without writing the signature file yet.
+
+        Args:
+            pdf_path (str): Path to the document to be signed, it does not have to be a PDF.
+            signer_name (str): Name of the person signing the document.
+            signature_path (str): Path of the signature file, the document path with
+                DETACHED_SUFFIX appended when None (default: None).
+
+        Returns:
+            PreparedDetached: Signed record, saved by its write method.
+
+        Raises:
+            ValueError: When no private key is available for signing.
+        """
+        if not self.private_key:
+            raise ValueError("No private key available for signing")
+
+        with stage("sign.hash") as hashing:
+            hasher = hashlib.sha256()
+            with open(pdf_path, "rb") as pdf_file:
+                size = update_from_file(hasher, pdf_file)
+            hashing.add_bytes(size)
+
+        record = build_detached_record(hasher.digest(), size, signer_name, self.algorithm.name)
+        # Unsigned hint for choosing the verification key, the signature decides validity
+        record['key_fingerprint'] = public_key_fingerprint(self.private_key.public_key())
+        with stage("sign.sign", algorithm=self.algorithm.name):
+            signature = self.algorithm.sign(self.private_key, signed_payload_hash(record))
+        record['signature'] = signature.hex()
+        return PreparedDetached(signature_path or detached_signature_path(pdf_path), signature, record,
+                                self.durability)
+
+    def _sign_incremental(self, pdf_path, output_path, signer_name):
+        """
+        Sign a PDF document by appending an incremental update to an untouched copy of it.
+
+        The document is prepared and signed in two stages, see pades_signer.remote_signing.
+
+        Args:
+            pdf_path (str): Path to the PDF document to be signed.
+            output_path (str): Path where the signed document will be saved, may equal pdf_path.
+            signer_name (str): Name of the person signing the document.
+
+        Returns:
+            str: Path to the signed document.
+        """
+        with stage("sign.prepare") as prepare:
+            prepared = prepare_document(pdf_path, output_path, signer_name, self.private_key.public_key(),
+                                        durability=self.durability)
+            prepare.add_bytes(os.path.getsize(prepared.temp_path))
+        try:
+            with stage("sign.sign", algorithm=self.algorithm.name):
+                signature = self.algorithm.sign(self.private_key, prepared.digest)
+        except BaseException:
+            prepared.discard()
+            raise
+        with stage("sign.inject") as inject:
+            inject.add_bytes(len(signature))
+            return prepared.inject(signature)
+
+    def sign_detached(self, pdf_path, signer_name, signature_path=None):
+        """
+        Sign a document by its hash and save the signature to a separate file.
+
+        The document is streamed through SHA-256 without being parsed or rewritten.
+
+        Args:
+            pdf_path (str): Path to the document to be signed, it does not have to be a PDF.
+            signer_name (str): Name of the person signing the document.
+            signature_path (str): Path of the signature file, the document path with
+                DETACHED_SUFFIX appended when None (default: None).
+
+        Returns:
+            str: Path to the signature file.
+
+        Raises:
+            ValueError: When no private key is available for signing.
+        """
+        prepared = self.prepare_detached(pdf_path, signer_name, signature_path)
+        if self.timestamp_client:
+            with stage("sign.timestamp"):
+                prepared.record['timestamp'] = \
+                    self.timestamp_client.timestamp(signature_imprint(prepared.signature)).der.hex()
+        return prepared.write()
+
+
+class PreparedRewrite:
+    """
+    Document signed by PDFSigner.prepare_rewrite, waiting to be written with its metadata.
+
+    Attributes:
+        output_path (str): Path where the signed document will be saved.
+        unsigned_path (str): Temporary file holding the document without signature metadata.
+        signature (bytes): Signature value.
+        metadata (dict): Entries added to the information dictionary, None when the
+            temporary file already holds them and nothing can be added anymore.
+        durability (str): Durability of the output, see common.atomic_output.
+    """
+
+    def __init__(self, output_path, unsigned_path, signature, metadata, durability=DURABILITY_FSYNC):
+        """
+        Initialize a prepared document.
+        """
+        self.output_path = output_path
+        self.unsigned_path = unsigned_path
+        self.signature = signature
+        self.metadata = metadata
+        self.durability = durability
+
+    def add_timestamp(self, token, proof):
+        """
+        Store a timestamp of the signature in the metadata written with the document.
+
+        Args:
+            token (TimestampToken): Token covering the signature, directly or through the proof.
+            proof (list): Inclusion proof of the signature in the time-stamped Merkle root.
+
+        Raises:
+            ValueError: When the document does not have the layout the metadata is spliced into.
+        """
+        if self.metadata is None:
+            raise ValueError("Document was not written by the signer")
+        self.metadata.update(timestamp_metadata(token, proof))
+
+    def write(self):
+        """
+        Save the signed document, replacing the output only once it is complete.
+
+        Returns:
+            str: Path to the signed document.
+        """
+        try:
+            with stage("sign.write") as write, open(self.unsigned_path, "rb") as unsigned_file:
+                with AtomicOutput(self.output_path, self.durability) as output_file:
+                    if self.metadata is not None:
+                        layout = read_writer_layout(unsigned_file)
+                        info = updated_info(read_info(unsigned_file, layout), add=self.metadata)
+                        write_with_info(unsigned_file, layout, info, sink=output_file)
+                    else:
+                        shutil.copyfileobj(unsigned_file, output_file)
+                    write.add_bytes(output_file.tell())
+        finally:
+            self.discard()
+        return self.output_path
+
+    def discard(self):
+        """
+        Remove the temporary file without writing the document.
+        """
+        try:
+            os.remove(self.unsigned_path)
+        except FileNotFoundError:
+            pass
+
+
+class PreparedDetached:
+    """
+    Detached signature made by PDFSigner.prepare_detached, waiting to be written.
+
+    Attributes:
+        signature_path (str): Path of the signature file.
+        signature (bytes): Signature value.
+        record (dict): Signed record, see pades_signer.detached.
+        durability (str): Durability of the signature file, see common.atomic_output.
+    """
+
+    def __init__(self, signature_path, signature, record, durability=DURABILITY_FSYNC):
+        """
+        Initialize a prepared detached signature.
+        """
+        self.signature_path = signature_path
+        self.signature = signature
+        self.record = record
+        self.durability = durability
+
+    def add_timestamp(self, token, proof):
+        """
+        Store a timestamp of the signature in the record.
+
+        Args:
+            token (TimestampToken): Token covering the signature, directly or through the proof.
+            proof (list): Inclusion proof of the signature in the time-stamped Merkle root.
+        """
+        self.record.update(timestamp_fields(token, proof))
+
+    def write(self):
+        """
+        Save the signature file, replacing it atomically.
+
+        Returns:
+            str: Path to the signature file.
+        """
+        return write_detached_signature(self.signature_path, self.record, self.durability)
+
+    def discard(self):
+        """
+        Drop the signature without writing it.
+        """
@@ -0,0 +1,275 @@
+"""
+Module splitting signing into document preparation and digest signing.
+
+Documents are prepared where they are stored: the incremental update with an empty
+signature placeholder is written and the to-be-signed digest is computed. Only the
+32-byte digests are sent to the machine holding the private key, which signs them
+in batches with DigestSigner. The returned signatures are then injected into the
+prepared documents.
+
+A prepared document is kept in a temporary file next to its output path and renamed
+over it only once its signature is in place, so the output path never holds a document
+with an empty placeholder and signing in place leaves the original intact until then.
+
+Usage:
+    prepared = prepare_document("input.pdf", "signed.pdf", "John Doe", public_key)
+    signature = DigestSigner(private_key_pem).sign_digests([prepared.digest])[0]   # key holder
+    prepared.inject(signature)
+"""
+
+import os
+from cryptography.hazmat.primitives.serialization import load_pem_private_key
+from common.atomic_output import DURABILITY_FSYNC, AtomicOutput
+from key_manager.algorithms import algorithm_for_key
+from key_manager.key_generator import public_key_fingerprint
+from pades_signer.incremental_update import build_signature_update, copy_and_hash
+from pades_signer.mapped_io import open_pdf, release_pdf
+
+# Size of the SHA-256 digests accepted by DigestSigner
+DIGEST_SIZE = 32
+
+
+class PreparedSignature:
+    """
+    Document with an incremental update waiting for its signature.
+
+    Only plain values are kept, so a prepared signature can be stored with to_dict
+    while the digest is being signed elsewhere.
+
+    Attributes:
+        output_path (str): Path where the signed document will be saved.
+        digest (bytes): SHA-256 digest to be signed.
+        algorithm (str): Identifier of the signature algorithm the placeholder was sized for.
+        contents_offset (int): Offset of the hex digits of the /Contents placeholder in the document.
+        contents_capacity (int): Number of signature bytes the placeholder can hold.
+        temp_path (str): Temporary file holding the prepared document, None once it was
+            injected or discarded.
+        durability (str): Durability level of the signed document, see common.atomic_output.
+    """
+
+    def __init__(self, output_path, digest, algorithm, contents_offset, contents_capacity, temp_path,
+                 durability=DURABILITY_FSYNC):
+        """
+        Initialize the prepared signature.
+
+        Args:
+            output_path (str): Path where the signed document will be saved.
+            digest (bytes): SHA-256 digest to be signed.
+            algorithm (str): Identifier of the signature algorithm.
+            contents_offset (int): Offset of the hex digits of the /Contents placeholder.
+            contents_capacity (int): Number of signature bytes the placeholder can hold.
+            temp_path (str): Temporary file holding the prepared document.
+            durability (str): Durability level of the signed document (default: DURABILITY_FSYNC).
+        """
+        self.output_path = output_path
+        self.digest = digest
+        self.algorithm = algorithm
+        self.contents_offset = contents_offset
+        self.contents_capacity = contents_capacity
+        self.temp_path = temp_path
+        self.durability = durability
+
+    def to_dict(self):
+        """
+        Convert the prepared signature to JSON-serializable values.
+
+        Returns:
+            dict: Values accepted by from_dict.
+        """
+        return {
+            "output_path": self.output_path,
+            "digest": self.digest.hex(),
+            "algorithm": self.algorithm,
+            "contents_offset": self.contents_offset,
+            "contents_capacity": self.contents_capacity,
+            "temp_path": self.temp_path,
+            "durability": self.durability,
+        }
+
+    @classmethod
+    def from_dict(cls, values):
+        """
+        Restore a prepared signature stored with to_dict.
+
+        Args:
+            values (dict): Values returned by to_dict.
+
+        Returns:
+            PreparedSignature: The prepared signature.
+        """
+        return cls(values["output_path"], bytes.fromhex(values["digest"]), values["algorithm"],
+                   values["contents_offset"], values["contents_capacity"], values["temp_path"],
+                   values.get("durability", DURABILITY_FSYNC))
+
+    def inject(self, signature):
+        """
+        Write the signature into the placeholder of the prepared document and save it to the output path.
+
+        A signature that does not fit leaves the prepared document untouched, any later failure
+        discards it, so the output path is only ever replaced by a signed document.
+
+        Args:
+            signature (bytes): Signature of the digest.
+
+        Returns:
+            str: Path to the signed document.
+
+        Raises:
+            ValueError: When the signature does not fit into the placeholder or the prepared
+                document has already been signed or discarded.
+            OSError: When the signed document cannot be saved.
+        """
+        if len(signature) > self.contents_capacity:
+            raise ValueError(f"Signature of {len(signature)} bytes does not fit into "
+                             f"{self.contents_capacity} reserved bytes")
+        hex_contents = signature.hex().encode("ascii").ljust(self.contents_capacity * 2, b"0")
+
+        if self.temp_path is None:
+            raise ValueError("Prepared document has already been signed or discarded")
+        try:
+            output = AtomicOutput.resume(self.output_path, self.temp_path, self.durability)
+        except FileNotFoundError:
+            raise ValueError("Prepared document no longer exists, it has already been signed or discarded")
+        self.temp_path = None
+        try:
+            output.file.seek(self.contents_offset)
+            if output.file.read(len(hex_contents)).strip(b"0"):
+                raise ValueError("Signature placeholder of the document has already been filled")
+            output.file.seek(self.contents_offset)
+            output.file.write(hex_contents)
+            output.file.seek(0, os.SEEK_END)
+        except BaseException:
+            output.abort()
+            raise
+        output.commit()
+        return self.output_path
+
+    def discard(self):
+        """
+        Remove the prepared document when it will not be signed, the output path is left untouched.
+        """
+        if self.temp_path is not None:
+            try:
+                os.remove(self.temp_path)
+            except FileNotFoundError:
+                pass
+            self.temp_path = None
+
+
+def prepare_document(pdf_path, output_path, signer_name, public_key, signing_date=None, contents_size=None,
+                     subfilter=None, durability=DURABILITY_FSYNC):
+    """
+    Write a document with an empty signature placeholder and compute its to-be-signed digest.
+
+    Only the public key is needed, it determines the algorithm and the size of the placeholder.
+    The prepared document is kept in a temporary file until the signature is injected.
+
+    Args:
+        pdf_path (str): Path to the PDF document to be signed.
+        output_path (str): Path where the prepared document will be saved, may equal pdf_path.
+        signer_name (str): Name of the person signing the document.
+        public_key: Public key belonging to the private key that will sign the digest.
+        signing_date (datetime): Signing date, current time when None (default: None).
+        contents_size (int): Bytes reserved for the signature, the signature size of the key when None.
+            Formats embedding more than a bare signature, such as Merkle batches, reserve more (default: None).
+        subfilter (str): /SubFilter of the signature, the one of the key algorithm when None (default: None).
+        durability (str): Durability level of the signed document, see common.atomic_output
+            (default: DURABILITY_FSYNC).
+
+    Returns:
+        PreparedSignature: Prepared document and the digest to sign.
+
+    Raises:
+        ValueError: When the document cannot be signed incrementally or the key type is not supported.
+    """
+    output = AtomicOutput(output_path, durability)
+    algorithm = algorithm_for_key(public_key)
+    reader = open_pdf(pdf_path)
+    file_size = os.path.getsize(pdf_path)
+    update = build_signature_update(reader, pdf_path, signer_name,
+                                    contents_size or algorithm.signature_size(public_key),
+                                    signing_date, subfilter=subfilter or algorithm.subfilter,
+                                    key_fingerprint=public_key_fingerprint(public_key))
+    # Only the trailer and a few objects were read, the update is appended once the input is unmapped
+    release_pdf(reader)
+
+    # Hashing the original bytes while copying them, then the signed parts of the update
+    output_file = output.open()
+    try:
+        hasher = copy_and_hash(pdf_path, output_file)
+        for part in update.signed_parts:
+            hasher.update(part)
+        output_file.write(update.section)
+    except BaseException:
+        output.abort()
+        raise
+    temp_path = output.detach()
+
+    return PreparedSignature(output_path, hasher.digest(), algorithm.name,
+                             file_size + update.contents_start + 1, update.contents_capacity,
+                             temp_path, durability)
+
+
+class DigestSigner:
+    """
+    Class signing to-be-signed digests on the machine holding the private key.
+
+    It never sees documents, only the 32-byte digests computed by prepare_document.
+    """
+
+    def __init__(self, private_key_pem):
+        """
+        Initialize the digest signer.
+
+        Args:
+            private_key_pem (bytes or private key): Private key in PEM format, see decrypt_private_key,
+                or an already parsed private key object.
+
+        Raises:
+            ValueError: When keys of this type are not supported.
+        """
+        if isinstance(private_key_pem, bytes):
+            self.private_key = load_pem_private_key(private_key_pem, password=None)
+        else:
+            self.private_key = private_key_pem
+        self.algorithm = algorithm_for_key(self.private_key)
+
+    def sign_digests(self, digests):
+        """
+        Sign a batch of digests.
+
+        Args:
+            digests (list): SHA-256 digests of 32 bytes each.
+
+        Returns:
+            list: Signatures in the order of the digests.
+
+        Raises:
+            ValueError: When any digest is not 32 bytes long, nothing is signed then.
+        """
+        digests = list(digests)
+        for index, digest in enumerate(digests):
+            if not isinstance(digest, bytes) or len(digest) != DIGEST_SIZE:
+                raise ValueError(f"Digest {index} is not a {DIGEST_SIZE}-byte SHA-256 digest")
+        return [self.algorithm.sign(self.private_key, digest) for digest in digests]
+
+
+def inject_signatures(prepared_signatures, signatures):
+    """
+    Inject a batch of signatures into their prepared documents.
+
+    Args:
+        prepared_signatures (list): PreparedSignature objects.
+        signatures (list): Signatures in the same order, as returned by DigestSigner.sign_digests.
+
+    Returns:
+        list: Paths to the signed documents.
+
+    Raises:
+        ValueError: When the number of signatures does not match the number of documents.
+    """
+    prepared_signatures = list(prepared_signatures)
+    signatures = list(signatures)
+    if len(prepared_signatures) != len(signatures):
+        raise ValueError(f"Got {len(signatures)} signatures for {len(prepared_signatures)} documents")
+    return [prepared.inject(signature) for prepared, signature in zip(prepared_signatures, signatures)]
@@ -0,0 +1,586 @@
+"""
+Module implementing the RFC 3161 Time-Stamp Protocol: requests, responses and tokens.
+
+Only the subset of DER needed by the protocol is encoded and decoded here, so no ASN.1
+library is required. Tokens are CMS SignedData structures (RFC 5652) whose content is
+a TSTInfo; they are checked against the certificate of the time-stamping authority
+with the cryptography package. SHA-256 is the only supported message imprint and
+signed attributes digest.
+"""
+
+import hashlib
+from datetime import datetime, timezone
+from cryptography import x509
+from cryptography.exceptions import InvalidSignature
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.asymmetric import ec, padding, rsa
+from cryptography.x509.oid import ExtendedKeyUsageOID
+
+# Media types of the HTTP transport, RFC 3161 section 3.4
+REQUEST_CONTENT_TYPE = "application/timestamp-query"
+RESPONSE_CONTENT_TYPE = "application/timestamp-reply"
+
+# Status values of PKIStatusInfo
+STATUS_GRANTED = 0
+STATUS_GRANTED_WITH_MODS = 1
+STATUS_REJECTION = 2
+
+# Bits of PKIFailureInfo
+FAILURE_BAD_ALG = 0
+FAILURE_BAD_REQUEST = 2
+FAILURE_BAD_DATA_FORMAT = 5
+
+OID_SHA256 = "2.16.840.1.101.3.4.2.1"
+OID_SIGNED_DATA = "1.2.840.113549.1.7.2"
+OID_TST_INFO = "1.2.840.113549.1.9.16.1.4"
+OID_CONTENT_TYPE = "1.2.840.113549.1.9.3"
+OID_MESSAGE_DIGEST = "1.2.840.113549.1.9.4"
+OID_SIGNING_CERTIFICATE_V2 = "1.2.840.113549.1.9.16.2.47"
+OID_RSA_ENCRYPTION = "1.2.840.113549.1.1.1"
+OID_SHA256_WITH_RSA = "1.2.840.113549.1.1.11"
+OID_ECDSA_WITH_SHA256 = "1.2.840.10045.4.3.2"
+
+# Signature algorithms accepted per key type, RSA signer infos often only name the key algorithm
+_RSA_SIGNATURE_ALGORITHMS = (OID_RSA_ENCRYPTION, OID_SHA256_WITH_RSA)
+_ECDSA_SIGNATURE_ALGORITHMS = (OID_ECDSA_WITH_SHA256,)
+
+_INTEGER = 0x02
+_BOOLEAN = 0x01
+_BIT_STRING = 0x03
+_OCTET_STRING = 0x04
+_NULL = 0x05
+_OID = 0x06
+_UTF8_STRING = 0x0C
+_GENERALIZED_TIME = 0x18
+_SEQUENCE = 0x30
+_SET = 0x31
+_CONTEXT_0 = 0xA0
+
+
+def encode(tag, content):
+    """
+    Encode a DER value.
+
+    Args:
+        tag (int): Identifier octet.
+        content (bytes): Encoded content.
+
+    Returns:
+        bytes: Tag, definite length and content.
+    """
+    length = len(content)
+    if length < 0x80:
+        return bytes((tag, length)) + content
+    size = (length.bit_length() + 7) // 8
+    return bytes((tag, 0x80 | size)) + length.to_bytes(size, "big") + content
+
+
+def encode_integer(value):
+    """
+    Encode a DER INTEGER.
+    """
+    size = value.bit_length() // 8 + 1
+    return encode(_INTEGER, value.to_bytes(size, "big", signed=True))
+
+
+def encode_oid(dotted):
+    """
+    Encode a DER OBJECT IDENTIFIER from its dotted form.
+    """
+    arcs = [int(arc) for arc in dotted.split(".")]
+    content = bytearray((arcs[0] * 40 + arcs[1],))
+    for arc in arcs[2:]:
+        chunk = [arc & 0x7F]
+        arc >>= 7
+        while arc:
+            chunk.append(0x80 | (arc & 0x7F))
+            arc >>= 7
+        content.extend(reversed(chunk))
+    return encode(_OID, bytes(content))
+
+
+def encode_sequence(*items):
+    """
+    Encode a DER SEQUENCE of already encoded items.
+    """
+    return encode(_SEQUENCE, b"".join(items))
+
+
+def encode_set(*items):
+    """
+    Encode a DER SET OF, sorting the encoded items as DER requires.
+    """
+    return encode(_SET, b"".join(sorted(items)))
+
+
+def encode_octet_string(data):
+    """
+    Encode a DER OCTET STRING.
+    """
+    return encode(_OCTET_STRING, bytes(data))
+
+
+def encode_generalized_time(moment):
+    """
+    Encode a DER GeneralizedTime in UTC with a whole number of seconds.
+    """
+    moment = moment.astimezone(timezone.utc)
+    return encode(_GENERALIZED_TIME, moment.strftime("%Y%m%d%H%M%SZ").encode("ascii"))
+
+
+def algorithm_identifier(oid, null_parameters=True):
+    """
+    Encode an AlgorithmIdentifier.
+
+    Args:
+        oid (str): Dotted algorithm identifier.
+        null_parameters (bool): Add an explicit NULL parameter (default: True).
+
+    Returns:
+        bytes: Encoded AlgorithmIdentifier.
+    """
+    return encode_sequence(encode_oid(oid), encode(_NULL, b"") if null_parameters else b"")
+
+
+def read_value(data, offset=0):
+    """
+    Decode the DER value starting at an offset.
+
+    Args:
+        data (bytes): Encoded data.
+        offset (int): Offset of the identifier octet (default: 0).
+
+    Returns:
+        tuple: (tag, content, end) with the content bytes and the offset after the value.
+
+    Raises:
+        ValueError: When the value is truncated or not DER.
+    """
+    if offset + 2 > len(data):
+        raise ValueError("Truncated DER value")
+    tag = data[offset]
+    length = data[offset + 1]
+    offset += 2
+    if length & 0x80:
+        size = length & 0x7F
+        if size == 0 or size > 4 or offset + size > len(data):
+            raise ValueError("Unsupported DER length")
+        length = int.from_bytes(data[offset:offset + size], "big")
+        offset += size
+    end = offset + length
+    if end > len(data):
+        raise ValueError("Truncated DER value")
+    return tag, data[offset:end], end
+
+
+def read_children(content):
+    """
+    Decode the values of a constructed value.
+
+    Args:
+        content (bytes): Content of a SEQUENCE, SET or constructed tagged value.
+
+    Returns:
+        list: (tag, content, encoded) tuples, encoded being the whole DER value.
+    """
+    children = []
+    offset = 0
+    while offset < len(content):
+        tag, value, end = read_value(content, offset)
+        children.append((tag, value, content[offset:end]))
+        offset = end
+    return children
+
+
+def _expect(child, tag, name):
+    """
+    Check the tag of a decoded value and return its content.
+    """
+    if child[0] != tag:
+        raise ValueError(f"Malformed {name}")
+    return child[1]
+
+
+def decode_integer(content):
+    """
+    Decode the content of a DER INTEGER.
+    """
+    return int.from_bytes(content, "big", signed=True)
+
+
+def decode_oid(content):
+    """
+    Decode the content of a DER OBJECT IDENTIFIER to its dotted form.
+    """
+    if not content:
+        raise ValueError("Empty object identifier")
+    arcs = [min(content[0] // 40, 2)]
+    arcs.append(content[0] - arcs[0] * 40)
+    arc = 0
+    for byte in content[1:]:
+        arc = (arc << 7) | (byte & 0x7F)
+        if not byte & 0x80:
+            arcs.append(arc)
+            arc = 0
+    return ".".join(str(arc) for arc in arcs)
+
+
+def decode_generalized_time(content):
+    """
+    Decode the content of a GeneralizedTime, with optional fractional seconds, in UTC.
+    """
+    text = content.decode("ascii")
+    if not text.endswith("Z"):
+        raise ValueError("Time is not in UTC")
+    seconds, _, fraction = text[:-1].partition(".")
+    moment = datetime.strptime(seconds, "%Y%m%d%H%M%S").replace(tzinfo=timezone.utc)
+    if fraction:
+        moment = moment.replace(microsecond=int(fraction[:6].ljust(6, "0")))
+    return moment
+
+
+def message_imprint(digest):
+    """
+    Encode the MessageImprint of a SHA-256 digest.
+    """
+    return encode_sequence(algorithm_identifier(OID_SHA256), encode_octet_string(digest))
+
+
+def _decode_message_imprint(content):
+    """
+    Decode a MessageImprint, only SHA-256 is accepted.
+
+    Returns:
+        bytes: The hashed message.
+    """
+    algorithm, hashed = read_children(content)
+    algorithm_oid = decode_oid(_expect(read_children(_expect(algorithm, _SEQUENCE, "hash algorithm"))[0],
+                                       _OID, "hash algorithm"))
+    if algorithm_oid != OID_SHA256:
+        raise ValueError(f"Unsupported message imprint algorithm {algorithm_oid}")
+    digest = _expect(hashed, _OCTET_STRING, "message imprint")
+    if len(digest) != hashlib.sha256().digest_size:
+        raise ValueError("Message imprint has the wrong length")
+    return digest
+
+
+def build_request(digest, nonce=None, cert_req=True, policy=None):
+    """
+    Encode a TimeStampReq for a SHA-256 digest.
+
+    Args:
+        digest (bytes): SHA-256 digest to be time-stamped.
+        nonce (int): Random number echoed in the token, against replayed responses (default: None).
+        cert_req (bool): Ask the authority to include its certificate in the token (default: True).
+        policy (str): Dotted identifier of the requested policy (default: None).
+
+    Returns:
+        bytes: DER encoded request.
+    """
+    items = [encode_integer(1), message_imprint(digest)]
+    if policy:
+        items.append(encode_oid(policy))
+    if nonce is not None:
+        items.append(encode_integer(nonce))
+    if cert_req:
+        items.append(encode(_BOOLEAN, b"\xff"))
+    return encode_sequence(*items)
+
+
+class TimestampRequest:
+    """
+    Decoded TimeStampReq, as received by an authority.
+
+    Attributes:
+        digest (bytes): SHA-256 digest to be time-stamped.
+        nonce (int): Nonce of the request, None when absent.
+        cert_req (bool): Whether the certificate of the authority is requested.
+        policy (str): Requested policy, None when absent.
+    """
+
+    def __init__(self, digest, nonce=None, cert_req=False, policy=None):
+        """
+        Initialize a decoded request.
+        """
+        self.digest = digest
+        self.nonce = nonce
+        self.cert_req = cert_req
+        self.policy = policy
+
+    @classmethod
+    def from_der(cls, data):
+        """
+        Decode a TimeStampReq.
+
+        Args:
+            data (bytes): DER encoded request.
+
+        Returns:
+            TimestampRequest: Decoded request.
+
+        Raises:
+            ValueError: When the request is malformed or uses another hash than SHA-256.
+        """
+        tag, content, end = read_value(data)
+        if tag != _SEQUENCE or end != len(data):
+            raise ValueError("Malformed time-stamp request")
+        children = read_children(content)
+        if len(children) < 2 or decode_integer(_expect(children[0], _INTEGER, "request version")) != 1:
+            raise ValueError("Unsupported time-stamp request version")
+        request = cls(_decode_message_imprint(_expect(children[1], _SEQUENCE, "message imprint")))
+        for child in children[2:]:
+            if child[0] == _OID:
+                request.policy = decode_oid(child[1])
+            elif child[0] == _INTEGER:
+                request.nonce = decode_integer(child[1])
+            elif child[0] == _BOOLEAN:
+                request.cert_req = child[1] != b"\x00"
+        return request
+
+
+def build_response(status, token=None, status_text=None, failure=None):
+    """
+    Encode a TimeStampResp.
+
+    Args:
+        status (int): PKIStatus, e.g. STATUS_GRANTED.
+        token (bytes): DER encoded token, required when granted (default: None).
+        status_text (str): Free text explaining the status (default: None).
+        failure (int): PKIFailureInfo bit number, e.g. FAILURE_BAD_ALG (default: None).
+
+    Returns:
+        bytes: DER encoded response.
+    """
+    status_info = [encode_integer(status)]
+    if status_text:
+        status_info.append(encode_sequence(encode(_UTF8_STRING, status_text.encode("utf-8"))))
+    if failure is not None:
+        bits = 1 << (7 - failure % 8)
+        octets = bytearray(failure // 8 + 1)
+        octets[-1] = bits
+        status_info.append(encode(_BIT_STRING, bytes((7 - failure % 8,)) + bytes(octets)))
+    return encode_sequence(encode_sequence(*status_info), token or b"")
+
+
+def parse_response(data):
+    """
+    Extract the token from a TimeStampResp.
+
+    Args:
+        data (bytes): DER encoded response.
+
+    Returns:
+        TimestampToken: Token of a granted request.
+
+    Raises:
+        ValueError: When the request was rejected or the response is malformed.
+    """
+    tag, content, _ = read_value(data)
+    if tag != _SEQUENCE:
+        raise ValueError("Malformed time-stamp response")
+    children = read_children(content)
+    status_info = read_children(_expect(children[0], _SEQUENCE, "status"))
+    status = decode_integer(_expect(status_info[0], _INTEGER, "status"))
+    if status not in (STATUS_GRANTED, STATUS_GRANTED_WITH_MODS):
+        text = ""
+        if len(status_info) > 1 and status_info[1][0] == _SEQUENCE:
+            text = "; ".join(item[1].decode("utf-8", "replace") for item in read_children(status_info[1][1]))
+        raise ValueError(f"Time-stamp request rejected with status {status}" + (f": {text}" if text else ""))
+    if len(children) < 2:
+        raise ValueError("Time-stamp response carries no token")
+    return TimestampToken(children[1][2])
+
+
+def _not_valid_before(certificate):
+    """
+    Start of the validity of a certificate in UTC, also with cryptography before 42.
+    """
+    if hasattr(certificate, "not_valid_before_utc"):
+        return certificate.not_valid_before_utc
+    return certificate.not_valid_before.replace(tzinfo=timezone.utc)
+
+
+def _not_valid_after(certificate):
+    """
+    End of the validity of a certificate in UTC, also with cryptography before 42.
+    """
+    if hasattr(certificate, "not_valid_after_utc"):
+        return certificate.not_valid_after_utc
+    return certificate.not_valid_after.replace(tzinfo=timezone.utc)
+
+
+class TimestampToken:
+    """
+    RFC 3161 time-stamp token, a CMS SignedData over a TSTInfo.
+
+    Attributes:
+        der (bytes): Encoded token.
+        digest (bytes): SHA-256 digest the token was issued for.
+        gen_time (datetime): Time asserted by the authority, in UTC.
+        serial_number (int): Serial number of the token.
+        policy (str): Policy the token was issued under.
+        nonce (int): Nonce echoed from the request, None when absent.
+        certificates (list): Certificates included in the token.
+    """
+
+    def __init__(self, der):
+        """
+        Decode a token.
+
+        Args:
+            der (bytes): Encoded token, the ContentInfo of the SignedData.
+
+        Raises:
+            ValueError: When the token is malformed.
+        """
+        self.der = bytes(der)
+        try:
+            self._decode()
+        except (IndexError, UnicodeDecodeError) as e:
+            raise ValueError(f"Malformed time-stamp token: {str(e)}")
+
+    def _decode(self):
+        """
+        Decode the SignedData, the TSTInfo and the signer info of the token.
+        """
+        tag, content, _ = read_value(self.der)
+        content_type, signed_content = read_children(_expect((tag, content), _SEQUENCE, "token"))
+        if decode_oid(_expect(content_type, _OID, "content type")) != OID_SIGNED_DATA:
+            raise ValueError("Time-stamp token is not signed data")
+        signed_data = read_children(_expect(read_children(_expect(signed_content, _CONTEXT_0, "signed data"))[0],
+                                            _SEQUENCE, "signed data"))
+
+        encapsulated = read_children(_expect(signed_data[2], _SEQUENCE, "encapsulated content"))
+        if decode_oid(_expect(encapsulated[0], _OID, "content type")) != OID_TST_INFO:
+            raise ValueError("Time-stamp token does not contain a TSTInfo")
+        self.tst_info = _expect(read_children(_expect(encapsulated[1], _CONTEXT_0, "TSTInfo"))[0],
+                                _OCTET_STRING, "TSTInfo")
+
+        self.certificates = []
+        signer_infos = None
+        for child in signed_data[3:]:
+            if child[0] == _CONTEXT_0:
+                self.certificates = [x509.load_der_x509_certificate(item[2]) for item in read_children(child[1])]
+            elif child[0] == _SET:
+                signer_infos = read_children(child[1])
+        if not signer_infos:
+            raise ValueError("Time-stamp token has no signer")
+        self._decode_signer_info(read_children(_expect(signer_infos[0], _SEQUENCE, "signer info")))
+        self._decode_tst_info()
+
+    def _decode_signer_info(self, signer_info):
+        """
+        Decode the signer identifier, signed attributes and signature of the token.
+        """
+        issuer, serial = read_children(_expect(signer_info[1], _SEQUENCE, "signer identifier"))
+        self.signer_issuer = issuer[2]
+        self.signer_serial = decode_integer(_expect(serial, _INTEGER, "signer serial number"))
+        digest_oid = decode_oid(read_children(_expect(signer_info[2], _SEQUENCE, "digest algorithm"))[0][1])
+        if digest_oid != OID_SHA256:
+            raise ValueError(f"Unsupported token digest algorithm {digest_oid}")
+
+        attributes = _expect(signer_info[3], _CONTEXT_0, "signed attributes")
+        # Signed attributes are signed as an explicit SET OF, not with their implicit tag
+        self.signed_attributes = encode(_SET, attributes)
+        self.attributes = {}
+        for attribute in read_children(attributes):
+            attribute_type, values = read_children(_expect(attribute, _SEQUENCE, "attribute"))
+            self.attributes[decode_oid(attribute_type[1])] = read_children(_expect(values, _SET, "attribute values"))
+        self.signature_algorithm = decode_oid(read_children(_expect(signer_info[4], _SEQUENCE,
+                                                                    "signature algorithm"))[0][1])
+        self.signature = _expect(signer_info[5], _OCTET_STRING, "signature")
+
+    def _decode_tst_info(self):
+        """
+        Decode the fields of the TSTInfo.
+        """
+        tag, content, _ = read_value(self.tst_info)
+        fields = read_children(_expect((tag, content), _SEQUENCE, "TSTInfo"))
+        if decode_integer(_expect(fields[0], _INTEGER, "TSTInfo version")) != 1:
+            raise ValueError("Unsupported TSTInfo version")
+        self.policy = decode_oid(_expect(fields[1], _OID, "policy"))
+        self.digest = _decode_message_imprint(_expect(fields[2], _SEQUENCE, "message imprint"))
+        self.serial_number = decode_integer(_expect(fields[3], _INTEGER, "serial number"))
+        self.gen_time = decode_generalized_time(_expect(fields[4], _GENERALIZED_TIME, "time"))
+        self.nonce = None
+        for field in fields[5:]:
+            if field[0] == _INTEGER:
+                self.nonce = decode_integer(field[1])
+
+    def signing_certificate(self, certificates=None):
+        """
+        Find the certificate of the authority that issued the token.
+
+        Args:
+            certificates (list): Trusted authority certificates, the certificates included in the
+                token are used when None (default: None).
+
+        Returns:
+            Certificate: Certificate matching the signer identifier of the token.
+
+        Raises:
+            ValueError: When no certificate matches.
+        """
+        for certificate in (self.certificates if certificates is None else certificates):
+            if (certificate.serial_number == self.signer_serial
+                    and certificate.issuer.public_bytes() == self.signer_issuer):
+                return certificate
+        if certificates is None:
+            raise ValueError("Time-stamp token does not include the authority certificate")
+        raise ValueError("Time-stamp authority is not trusted")
+
+    def verify(self, digest, certificates=None):
+        """
+        Check that the token was issued by the authority for a digest.
+
+        Args:
+            digest (bytes): SHA-256 digest the token must cover.
+            certificates (list): Trusted authority certificates; when None, the certificate
+                included in the token is used, which proves integrity but not trust (default: None).
+
+        Returns:
+            datetime: Time asserted by the authority, in UTC.
+
+        Raises:
+            ValueError: When the token does not cover the digest, is not signed by the
+                authority with an algorithm matching its key, or the certificate is not
+                meant for time-stamping.
+        """
+        if self.digest != digest:
+            raise ValueError("Time-stamp token covers other data")
+
+        certificate = self.signing_certificate(certificates)
+        try:
+            usage = certificate.extensions.get_extension_for_class(x509.ExtendedKeyUsage).value
+        except x509.ExtensionNotFound:
+            usage = ()
+        if ExtendedKeyUsageOID.TIME_STAMPING not in usage:
+            raise ValueError("Certificate is not a time-stamping certificate")
+        if not _not_valid_before(certificate) <= self.gen_time <= _not_valid_after(certificate):
+            raise ValueError("Time-stamp is outside the validity of the authority certificate")
+
+        content_type = self.attributes.get(OID_CONTENT_TYPE)
+        message_digest = self.attributes.get(OID_MESSAGE_DIGEST)
+        if not content_type or decode_oid(content_type[0][1]) != OID_TST_INFO:
+            raise ValueError("Time-stamp token lacks the content type attribute")
+        if not message_digest or message_digest[0][1] != hashlib.sha256(self.tst_info).digest():
+            raise ValueError("Time-stamp token content does not match its signature")
+
+        public_key = certificate.public_key()
+        if isinstance(public_key, rsa.RSAPublicKey):
+            algorithms = _RSA_SIGNATURE_ALGORITHMS
+        elif isinstance(public_key, ec.EllipticCurvePublicKey):
+            algorithms = _ECDSA_SIGNATURE_ALGORITHMS
+        else:
+            raise ValueError("Unsupported time-stamp authority key")
+        if self.signature_algorithm not in algorithms:
+            raise ValueError(f"Time-stamp token signature algorithm {self.signature_algorithm} "
+                             "does not match the authority key")
+        try:
+            if isinstance(public_key, rsa.RSAPublicKey):
+                public_key.verify(self.signature, self.signed_attributes, padding.PKCS1v15(), hashes.SHA256())
+            else:
+                public_key.verify(self.signature, self.signed_attributes, ec.ECDSA(hashes.SHA256()))
+        except InvalidSignature:
+            raise ValueError("Time-stamp token signature is invalid")
+        return self.gen_time
@@ -3,11 +3,26 @@ Module providing functionality for verifying digital signatures in PDF documents
 """
 
 import hashlib
-from cryptography.hazmat.primitives.asymmetric import padding
-from cryptography.hazmat.primitives.hashes import SHA256
+import os
 from cryptography.exceptions import InvalidSignature
+from cryptography.hazmat.primitives import hashes
 from PyPDF2 import PdfReader, PdfWriter
-import io
+from common.instrumentation import stage
+from key_manager.algorithms import DEFAULT_ALGORITHM, algorithm_for_key, algorithm_for_subfilter, \
+    get_algorithm
+from key_manager.key_generator import public_key_fingerprint
+from pades_signer.detached import detached_signature_path, read_detached_signature, signed_payload_hash
+from pades_signer.hashing import HashingStream, hash_byte_ranges, update_from_file
+from pades_signer.incremental_update import check_signature_coverage, find_signature_dictionary, \
+    find_signature_in_tail
+from pades_signer.mapped_io import open_pdf
+from pades_signer.merkle import resolve_merkle_signature, split_subfilter
+from pades_signer.passthrough import read_info, read_writer_layout, updated_info, write_with_info
+from pades_signer.timestamping import TIMESTAMP_METADATA_KEYS, verify_timestamp
+
+# Metadata entries added after hashing, removed to recompute the hash of a legacy signature
+SIGNATURE_METADATA_KEYS = ('/Signature', '/SignedBy', '/SigningDate', '/SignatureAlgorithm') \
+    + TIMESTAMP_METADATA_KEYS
 
 
 def extract_signature_data(pdf_path):
@@ -15,12 +30,12 @@ def extract_signature_data(pdf_path):
     Extract signature data from PDF metadata.
 
     Args:
-        pdf_path (str): Path to the signed PDF file.
+        pdf_path (str or PdfReader): Path to the signed PDF file, or an already parsed document.
 
     Returns:
         dict or None: Dictionary containing signature data if present, None otherwise.
     """
-    reader = PdfReader(pdf_path)
+    reader = pdf_path if isinstance(pdf_path, PdfReader) else open_pdf(pdf_path)
     metadata = reader.metadata
 
     if not metadata:
@@ -33,6 +48,10 @@ def extract_signature_data(pdf_path):
         signature_data['signed_by'] = metadata['/SignedBy']
     if '/SigningDate' in metadata:
         signature_data['signing_date'] = metadata['/SigningDate']
+    signature_data['algorithm'] = metadata.get('/SignatureAlgorithm', DEFAULT_ALGORITHM)
+    signature_data['key_fingerprint'] = metadata.get('/KeyFingerprint')
+    signature_data['timestamp'] = metadata.get('/Timestamp')
+    signature_data['timestamp_proof'] = metadata.get('/TimestampProof')
 
     if not signature_data.get('signature'):
         return None
@@ -43,21 +62,38 @@ def extract_signature_data(pdf_path):
 class SignatureVerifier:
     """
     Class responsible for verifying digital signatures in PDF documents.
+
+    With a key registry, each signature is checked with the registered key matching the
+    fingerprint stored in it. Signatures without a fingerprint fall back to public_key.
     """
 
-    def __init__(self, public_key=None):
+    def __init__(self, public_key=None, cache=None, registry=None, tsa_certificates=None):
         """
         Initialize the signature verifier with a public key.
 
         Args:
             public_key: Public key used for signature verification (default: None).
+            cache (VerificationCache): Cache of results of verify_signature, see
+                pades_signer.verification_cache (default: None).
+            registry (KeyRegistry): Registry of public keys looked up by the fingerprint
+                stored in signatures, see key_manager.key_registry (default: None).
+            tsa_certificates (list): Trusted certificates of time-stamping authorities; without them
+                timestamps are checked with the certificate they include and reported as
+                untrusted (default: None).
         """
         self.public_key = public_key
+        self.cache = cache
+        self.registry = registry
+        self.tsa_certificates = tsa_certificates
 
     def verify_signature(self, pdf_path):
         """
         Verify the digital signature in a PDF document.
 
+        Incremental-update signatures are found at the end of the file and checked by
+        hashing the signed byte ranges, without parsing the document. Otherwise the
+        document is parsed exactly once.
+
         Args:
             pdf_path (str): Path to the signed PDF file.
 
@@ -65,10 +101,83 @@ class SignatureVerifier:
             tuple: (is_valid, message) where is_valid is a boolean indicating if the signature is valid,
                    and message is a string with verification details or error information.
         """
-        if not self.public_key:
+        if not self.public_key and not self.registry:
             return False, "No public key provided"
 
-        signature_data = extract_signature_data(pdf_path)
+        with stage("verify.document"):
+            if self.cache is None:
+                return self._verify_document(pdf_path)
+
+            with stage("verify.cache_lookup"):
+                document, result = self.cache.lookup(pdf_path, self._cache_fingerprint())
+            if result is None:
+                result = self._verify_document(pdf_path)
+                self.cache.store(document, result)
+            return result
+
+    def _cache_fingerprint(self):
+        """
+        Identify the keys results depend on, so cached results are invalidated when they change.
+
+        Returns:
+            str: Fingerprint of the public key, combined with the digest of the registry and
+                the fingerprints of the trusted time-stamping authorities if any.
+        """
+        fingerprint = public_key_fingerprint(self.public_key) if self.public_key else ""
+        if self.registry is not None:
+            fingerprint = f"{fingerprint}+registry:{self.registry.digest}"
+        if self.tsa_certificates:
+            tsa_fingerprints = sorted(certificate.fingerprint(hashes.SHA256()).hex()
+                                      for certificate in self.tsa_certificates)
+            fingerprint = f"{fingerprint}+tsa:{hashlib.sha256(','.join(tsa_fingerprints).encode()).hexdigest()}"
+        return fingerprint
+
+    def _select_key(self, signature_data):
+        """
+        Choose the public key to check a signature with.
+
+        Args:
+            signature_data (dict): Signature data, with 'key_fingerprint' when the signature stores it.
+
+        Returns:
+            tuple: (public_key, error_message), the key is None when no key can be chosen.
+        """
+        fingerprint = signature_data.get('key_fingerprint')
+        if self.registry is not None and fingerprint:
+            public_key = self.registry.get(str(fingerprint))
+            if public_key is None:
+                return None, f"Unknown signing key: {str(fingerprint)[:16]}"
+            return public_key, None
+        if not self.public_key:
+            return None, "Unknown signing key: signature carries no key fingerprint"
+        return self.public_key, None
+
+    def _verify_document(self, pdf_path):
+        """
+        Verify the signature of a document without the cache.
+
+        Args:
+            pdf_path (str): Path to the signed PDF file.
+
+        Returns:
+            tuple: (is_valid, message) as returned by verify_signature.
+        """
+        with stage("verify.tail_scan"):
+            incremental_data = find_signature_in_tail(pdf_path)
+        if incremental_data:
+            return self._verify_incremental(pdf_path, incremental_data)
+
+        # Not found in the tail, e.g. pushed out of it by a large update appended after signing;
+        # signatures found by parsing go through the same coverage check in _verify_incremental
+        with stage("verify.parse") as parse:
+            reader = open_pdf(pdf_path)
+            incremental_data = find_signature_dictionary(reader)
+            if not incremental_data:
+                signature_data = extract_signature_data(reader)
+            parse.add_bytes(os.path.getsize(pdf_path))
+        if incremental_data:
+            return self._verify_incremental(pdf_path, incremental_data)
+
         if not signature_data:
             return False, "No signature provided"
 
@@ -76,47 +185,184 @@ class SignatureVerifier:
             # Decode signature
             signature_hex = signature_data.get('signature')
             signature = bytes.fromhex(signature_hex)
+            algorithm = get_algorithm(signature_data['algorithm'])
         except Exception as e:
             return False, f"Invalid signing format: {str(e)}"
 
-        # Temporary file without signature metadata
-        reader = PdfReader(pdf_path)
+        # Documents written by this signer are hashed straight from the file, without
+        # copying pages; anything else, or a mismatch, falls back to rebuilding the document
+        with stage("verify.passthrough_hash") as passthrough:
+            doc_hash = self._passthrough_hash(pdf_path)
+            if doc_hash:
+                passthrough.add_bytes(os.path.getsize(pdf_path))
+        if doc_hash:
+            result = self._check_signature(algorithm, signature, doc_hash, signature_data)
+            if result[0]:
+                return result
+
+        # Rebuilding the document without signature metadata, as it was hashed when signing
         writer = PdfWriter()
 
         # Copy content without metadata
-        for page in reader.pages:
-            writer.add_page(page)
+        with stage("verify.copy_pages"):
+            for page in reader.pages:
+                writer.add_page(page)
 
         # Deleting metadata
         temp_metadata = reader.metadata.copy()
-        if '/Signature' in temp_metadata:
-            del temp_metadata['/Signature']
-        if '/SignedBy' in temp_metadata:
-            del temp_metadata['/SignedBy']
-        if '/SigningDate' in temp_metadata:
-            del temp_metadata['/SigningDate']
+        for key in SIGNATURE_METADATA_KEYS:
+            if key in temp_metadata:
+                del temp_metadata[key]
 
         writer.add_metadata(temp_metadata)
 
-        # Save file to memory
-        temp_stream = io.BytesIO()
-        writer.write(temp_stream)
-        temp_stream.seek(0)
+        # Compute sha-256 hash without metadata while the document is serialized
+        with stage("verify.serialize_hash") as serialize:
+            hashing_stream = HashingStream()
+            writer.write(hashing_stream)
+            doc_hash = hashing_stream.digest()
+            serialize.add_bytes(hashing_stream.tell())
+
+        return self._check_signature(algorithm, signature, doc_hash, signature_data)
+
+    def _passthrough_hash(self, pdf_path):
+        """
+        Hash a document with its signature metadata removed, as written by PdfWriter when signing.
+
+        Args:
+            pdf_path (str): Path to the signed PDF file.
+
+        Returns:
+            bytes or None: SHA-256 hash, None when the document does not have the layout
+                written by PDFSigner.
+        """
+        with open(pdf_path, "rb") as pdf_file:
+            layout = read_writer_layout(pdf_file)
+            if not layout:
+                return None
+            try:
+                info = updated_info(read_info(pdf_file, layout), remove=SIGNATURE_METADATA_KEYS)
+            except ValueError:
+                return None
+            hasher = hashlib.sha256()
+            write_with_info(pdf_file, layout, info, hasher=hasher)
+            return hasher.digest()
+
+    def verify_detached(self, pdf_path, signature_path=None):
+        """
+        Verify a document against its detached signature, without parsing the document.
+
+        Args:
+            pdf_path (str): Path to the signed document.
+            signature_path (str): Path of the signature file, the document path with
+                DETACHED_SUFFIX appended when None (default: None).
+
+        Returns:
+            tuple: (is_valid, message) as returned by verify_signature.
+        """
+        if not self.public_key and not self.registry:
+            return False, "No public key provided"
+
+        try:
+            record = read_detached_signature(signature_path or detached_signature_path(pdf_path))
+            if record is None:
+                return False, "No signature provided"
+            algorithm = get_algorithm(record['algorithm'])
+        except ValueError as e:
+            return False, f"Invalid signing format: {str(e)}"
+
+        with stage("verify.hash") as hashing:
+            hasher = hashlib.sha256()
+            with open(pdf_path, "rb") as pdf_file:
+                size = update_from_file(hasher, pdf_file)
+            hashing.add_bytes(size)
+        if size != record['size'] or hasher.hexdigest() != record['digest']:
+            return False, "Signature verification failed!"
+
+        return self._check_signature(algorithm, record['signature'], signed_payload_hash(record), record)
+
+    def _verify_incremental(self, pdf_path, signature_data):
+        """
+        Verify a signature stored in a /Sig dictionary appended as an incremental update.
+
+        The byte range must cover the whole file except the /Contents value, so nothing can
+        be appended after signing. Signatures of Merkle batches carry an inclusion proof, the
+        root of the batch is recomputed from it and the document hash before checking the
+        root signature.
+
+        Args:
+            pdf_path (str): Path to the signed PDF file.
+            signature_data (dict): Signature data returned by find_signature_dictionary.
+
+        Returns:
+            tuple: (is_valid, message) as returned by verify_signature.
+        """
+        subfilter, merkle = split_subfilter(signature_data['subfilter'])
+        try:
+            algorithm = algorithm_for_subfilter(subfilter)
+        except ValueError as e:
+            return False, f"Invalid signing format: {str(e)}"
+
+        byte_range = signature_data['byte_range']
+        try:
+            check_signature_coverage(pdf_path, signature_data)
+        except (OSError, ValueError) as e:
+            return False, str(e)
+        try:
+            with stage("verify.hash") as hashing:
+                doc_hash = hash_byte_ranges(pdf_path, byte_range)
+                hashing.add_bytes(sum(byte_range[1::2]))
+        except ValueError as e:
+            return False, f"Invalid byte range: {str(e)}"
+
+        signature = signature_data['contents']
+        if merkle:
+            try:
+                signature, doc_hash = resolve_merkle_signature(signature, doc_hash)
+            except ValueError as e:
+                return False, f"Invalid signing format: {str(e)}"
 
-        # Compute sha-256 hash without metadata
-        hasher = hashlib.sha256()
-        hasher.update(temp_stream.getvalue())
-        doc_hash = hasher.digest()
+        return self._check_signature(algorithm, signature, doc_hash, signature_data)
 
+    def _check_signature(self, algorithm, signature, doc_hash, signature_data):
+        """
+        Check the signature of a document hash against the selected public key.
+
+        Args:
+            algorithm (SignatureAlgorithm): Algorithm the signature was made with.
+            signature (bytes): Signature to check, trailing padding is ignored.
+            doc_hash (bytes): SHA-256 hash of the signed content.
+            signature_data (dict): Signature data with 'signed_by', 'signing_date' and optionally
+                'key_fingerprint', 'timestamp' and 'timestamp_proof'.
+
+        Returns:
+            tuple: (is_valid, message) as returned by verify_signature.
+        """
+        public_key, error = self._select_key(signature_data)
+        if public_key is None:
+            return False, error
+        if not algorithm.supports(public_key):
+            return False, f"Signature algorithm mismatch: document signed with {algorithm.label}"
+
+        # Signature may be padded with zeros up to the reserved size of /Contents
+        signature = signature[:algorithm.signature_size(public_key)]
         try:
-            self.public_key.verify(
-                signature,
-                doc_hash,
-                padding.PKCS1v15(),
-                SHA256()
-            )
-            return True, f"Signature valid! Signed by: {signature_data.get('signed_by')} date: {signature_data.get('signing_date')}"
+            with stage("verify.check", algorithm=algorithm.name):
+                algorithm.verify(public_key, signature, doc_hash)
         except InvalidSignature:
             return False, "Signature verification failed!"
         except Exception as e:
-            return False, f"Error during signature verification: {str(e)}"
\ No newline at end of file
+            return False, f"Error during signature verification: {str(e)}"
+
+        message = f"Signature valid! Signed by: {signature_data.get('signed_by')} date: {signature_data.get('signing_date')}"
+        if not signature_data.get('timestamp'):
+            return True, message
+        try:
+            with stage("verify.timestamp"):
+                timestamp = verify_timestamp(signature, bytes.fromhex(str(signature_data['timestamp'])),
+                                             bytes.fromhex(str(signature_data.get('timestamp_proof') or "")),
+                                             self.tsa_certificates)
+        except ValueError as e:
+            return False, f"Timestamp verification failed: {str(e)}"
+        trust = "" if self.tsa_certificates else " (untrusted TSA)"
+        return True, f"{message} timestamp: {timestamp.strftime('%Y-%m-%d %H:%M:%S')} UTC{trust}"
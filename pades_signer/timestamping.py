@@ -0,0 +1,387 @@
+"""
+Module providing RFC 3161 timestamps of signatures from a time-stamping authority (TSA).
+
+A timestamp proves that a signature existed at the time asserted by the authority,
+unlike /SigningDate which is taken from the clock of the signing machine. The token
+covers the SHA-256 hash of the signature value, as signature timestamps in CAdES do.
+
+Batches are timestamped with a single request: the signature hashes become the leaves
+of a Merkle tree, built as for Merkle batch signatures, and only the root is sent to the
+authority. Every document stores the token with its inclusion proof, so it can still be
+checked on its own. HTTP connections to the authority are pooled and kept alive across
+requests, so a batch costs one round trip on an open connection.
+
+Rewritten documents store the token in the /Timestamp and /TimestampProof metadata
+entries, detached signatures in the 'timestamp' and 'timestamp_proof' fields; neither
+is covered by the signature, the token itself is signed by the authority.
+"""
+
+import hashlib
+import http.client
+import queue
+import secrets
+import threading
+from urllib.parse import urlsplit
+from cryptography import x509
+from common.atomic_output import DURABILITY_FSYNC, AtomicOutput
+from pades_signer.detached import read_detached_signature, write_detached_signature
+from pades_signer.merkle import build_tree, decode_proof, encode_proof, inclusion_proof, root_from_proof
+from pades_signer.passthrough import read_info, read_writer_layout, updated_info, write_with_info
+from pades_signer.rfc3161 import REQUEST_CONTENT_TYPE, RESPONSE_CONTENT_TYPE, TimestampToken, build_request, \
+    parse_response
+
+# Metadata entries holding the timestamp of a rewritten document
+TIMESTAMP_METADATA_KEYS = ('/Timestamp', '/TimestampProof')
+
+
+def signature_imprint(signature):
+    """
+    Compute the digest a timestamp of a signature covers.
+
+    Args:
+        signature (bytes): Signature value.
+
+    Returns:
+        bytes: SHA-256 hash of the signature.
+    """
+    return hashlib.sha256(signature).digest()
+
+
+def load_tsa_certificates(path):
+    """
+    Load the certificates of trusted time-stamping authorities.
+
+    Args:
+        path (str): PEM file with one or more certificates.
+
+    Returns:
+        list: Certificates found in the file.
+
+    Raises:
+        ValueError: When the file contains no certificate.
+    """
+    with open(path, "rb") as certificate_file:
+        data = certificate_file.read()
+    try:
+        return x509.load_pem_x509_certificates(data)
+    except ValueError:
+        raise ValueError(f"No certificate found in {path}")
+
+
+class TimestampClient:
+    """
+    Client requesting timestamps from an RFC 3161 authority over HTTP.
+
+    Connections are kept in a pool and reused, so the client can be shared by threads
+    and successive batches without reconnecting.
+
+    Attributes:
+        url (str): Address of the authority.
+        timeout (float): Socket timeout in seconds.
+        certificates (list): Certificates the authority may sign with, any certificate
+            included in the token is accepted when None.
+        requests (int): Number of requests sent.
+        connections (int): Number of connections opened.
+    """
+
+    def __init__(self, url, timeout=10, pool_size=4, certificates=None):
+        """
+        Initialize the client.
+
+        Args:
+            url (str): Address of the authority, http:// or https://.
+            timeout (float): Socket timeout in seconds (default: 10).
+            pool_size (int): Maximum number of idle connections kept open (default: 4).
+            certificates (list): Certificates the authority may sign with (default: None).
+
+        Raises:
+            ValueError: When the URL is not an HTTP address.
+        """
+        parts = urlsplit(url)
+        if parts.scheme not in ("http", "https") or not parts.hostname:
+            raise ValueError(f"Unsupported time-stamping authority address: {url}")
+        self.url = url
+        self.timeout = timeout
+        self.certificates = certificates
+        self.requests = 0
+        self.connections = 0
+        self._scheme = parts.scheme
+        self._host = parts.hostname
+        self._port = parts.port
+        self._path = parts.path or "/"
+        if parts.query:
+            self._path += f"?{parts.query}"
+        self._pool = queue.LifoQueue(maxsize=pool_size)
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        """
+        Open a new connection to the authority.
+        """
+        with self._lock:
+            self.connections += 1
+        if self._scheme == "https":
+            return http.client.HTTPSConnection(self._host, self._port, timeout=self.timeout)
+        return http.client.HTTPConnection(self._host, self._port, timeout=self.timeout)
+
+    def _post(self, body):
+        """
+        Send a request on a pooled connection, reconnecting once when the authority closed it.
+
+        Args:
+            body (bytes): DER encoded request.
+
+        Returns:
+            bytes: DER encoded response.
+
+        Raises:
+            OSError: When the authority cannot be reached or answers with an HTTP error.
+        """
+        headers = {"Content-Type": REQUEST_CONTENT_TYPE, "Accept": RESPONSE_CONTENT_TYPE}
+        for attempt in range(2):
+            try:
+                connection = self._pool.get_nowait()
+                reused = True
+            except queue.Empty:
+                connection = self._connect()
+                reused = False
+            try:
+                connection.request("POST", self._path, body, headers)
+                response = connection.getresponse()
+                data = response.read()
+            except (http.client.HTTPException, OSError):
+                connection.close()
+                # Idle connections may have been closed by the authority in the meantime
+                if reused and attempt == 0:
+                    continue
+                raise
+            with self._lock:
+                self.requests += 1
+            if response.will_close:
+                connection.close()
+            else:
+                try:
+                    self._pool.put_nowait(connection)
+                except queue.Full:
+                    connection.close()
+            if response.status != 200:
+                raise OSError(f"Time-stamping authority answered HTTP {response.status} {response.reason}")
+            return data
+
+    def timestamp(self, digest):
+        """
+        Request a timestamp of a single SHA-256 digest.
+
+        Args:
+            digest (bytes): SHA-256 digest to be time-stamped.
+
+        Returns:
+            TimestampToken: Token issued for the digest, checked against the certificates of the client.
+
+        Raises:
+            ValueError: When the request is rejected or the token does not match it.
+            OSError: When the authority cannot be reached.
+        """
+        nonce = secrets.randbits(63)
+        token = parse_response(self._post(build_request(digest, nonce)))
+        if token.nonce != nonce:
+            raise ValueError("Time-stamp token does not answer the request")
+        token.verify(digest, self.certificates)
+        return token
+
+    def timestamp_batch(self, digests):
+        """
+        Timestamp many digests with a single request over the root of their Merkle tree.
+
+        Args:
+            digests (list): SHA-256 digests to be time-stamped.
+
+        Returns:
+            list: (token, proof) per digest in input order, the proof links the digest to
+                the root covered by the shared token. A single digest is time-stamped
+                directly, with an empty proof.
+
+        Raises:
+            ValueError: When no digests are given or the request is rejected.
+            OSError: When the authority cannot be reached.
+        """
+        if len(digests) == 1:
+            return [(self.timestamp(digests[0]), [])]
+        levels = build_tree(digests)
+        token = self.timestamp(levels[-1][0])
+        return [(token, inclusion_proof(levels, index)) for index in range(len(digests))]
+
+    def close(self):
+        """
+        Close the idle connections.
+        """
+        while True:
+            try:
+                self._pool.get_nowait().close()
+            except queue.Empty:
+                break
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def verify_timestamp(signature, token, proof=b"", certificates=None):
+    """
+    Check the timestamp of a signature.
+
+    Args:
+        signature (bytes): Signature value the timestamp must cover.
+        token (bytes): DER encoded token.
+        proof (bytes): Inclusion proof encoded by encode_proof, empty for a token covering
+            the signature directly (default: b"").
+        certificates (list): Trusted authority certificates, the certificate included in
+            the token is used when None (default: None).
+
+    Returns:
+        datetime: Time asserted by the authority, in UTC.
+
+    Raises:
+        ValueError: When the token is malformed or does not cover the signature.
+    """
+    digest = signature_imprint(signature)
+    if proof:
+        digest = root_from_proof(digest, decode_proof(proof))
+    return TimestampToken(token).verify(digest, certificates)
+
+
+def _read_legacy_signature(pdf_path):
+    """
+    Read the signature value of a document signed by rewriting.
+    """
+    with open(pdf_path, "rb") as pdf_file:
+        layout = read_writer_layout(pdf_file)
+        if not layout:
+            raise ValueError("Document was not written by the signer")
+        signature = read_info(pdf_file, layout).get('/Signature')
+    if not signature:
+        raise ValueError("Document is not signed")
+    return bytes.fromhex(str(signature))
+
+
+def timestamp_metadata(token, proof):
+    """
+    Format a timestamp as metadata entries of a document signed by rewriting.
+
+    Args:
+        token (TimestampToken): Token covering the signature, directly or through the proof.
+        proof (list): Inclusion proof of the signature in the time-stamped Merkle root.
+
+    Returns:
+        dict: '/Timestamp' and '/TimestampProof' entries.
+    """
+    return {'/Timestamp': token.der.hex(), '/TimestampProof': encode_proof(proof).hex()}
+
+
+def timestamp_fields(token, proof):
+    """
+    Format a timestamp as fields of a detached signature record.
+
+    Args:
+        token (TimestampToken): Token covering the signature, directly or through the proof.
+        proof (list): Inclusion proof of the signature in the time-stamped Merkle root.
+
+    Returns:
+        dict: 'timestamp' and 'timestamp_proof' fields.
+    """
+    return {'timestamp': token.der.hex(), 'timestamp_proof': encode_proof(proof).hex()}
+
+
+def _store_legacy_timestamp(pdf_path, token, proof, durability=DURABILITY_FSYNC):
+    """
+    Add a timestamp to the metadata of a document signed by rewriting, replacing the file atomically.
+    """
+    output = AtomicOutput(pdf_path, durability)
+    try:
+        with open(pdf_path, "rb") as pdf_file:
+            layout = read_writer_layout(pdf_file)
+            info = updated_info(read_info(pdf_file, layout), add=timestamp_metadata(token, proof))
+            write_with_info(pdf_file, layout, info, sink=output.open())
+    except BaseException:
+        output.abort()
+        raise
+    # Renamed once the document is closed, open files cannot be replaced on Windows
+    output.commit()
+
+
+def timestamp_prepared(documents, client):
+    """
+    Timestamp the signatures of documents signed but not written yet with one request to the authority.
+
+    Each document is written once, with its timestamp, instead of being rewritten after signing.
+
+    Args:
+        documents (list): Prepared documents, see PDFSigner.prepare_rewrite and PDFSigner.prepare_detached.
+        client (TimestampClient): Client of the authority.
+
+    Returns:
+        list: Error message per document, None for documents that received their timestamp.
+
+    Raises:
+        ValueError: When the request is rejected, no document receives a timestamp.
+        OSError: When the authority cannot be reached, no document receives a timestamp.
+    """
+    stamps = client.timestamp_batch([signature_imprint(document.signature) for document in documents])
+    errors = []
+    for document, (token, proof) in zip(documents, stamps):
+        try:
+            document.add_timestamp(token, proof)
+            errors.append(None)
+        except ValueError as e:
+            errors.append(str(e))
+    return errors
+
+
+def timestamp_documents(paths, client, detached=False, durability=DURABILITY_FSYNC):
+    """
+    Timestamp the signatures of signed documents with one request to the authority.
+
+    Args:
+        paths (list): Documents signed by rewriting, or detached signature files.
+        client (TimestampClient): Client of the authority.
+        detached (bool): The paths are detached signature files (default: False).
+        durability (str): Durability of the rewritten files, see common.atomic_output
+            (default: DURABILITY_FSYNC).
+
+    Returns:
+        list: Error message per path, None for documents that were timestamped.
+
+    Raises:
+        ValueError: When the request is rejected, the documents are left unchanged.
+        OSError: When the authority cannot be reached, the documents are left unchanged.
+    """
+    errors = [None] * len(paths)
+    signatures = {}
+    records = {}
+    for index, path in enumerate(paths):
+        try:
+            if detached:
+                records[index] = read_detached_signature(path)
+                if records[index] is None:
+                    raise ValueError("Signature file does not exist")
+                signatures[index] = records[index]['signature']
+            else:
+                signatures[index] = _read_legacy_signature(path)
+        except (OSError, ValueError) as e:
+            errors[index] = str(e)
+    if not signatures:
+        return errors
+
+    stamps = client.timestamp_batch([signature_imprint(signature) for signature in signatures.values()])
+    for index, (token, proof) in zip(signatures, stamps):
+        try:
+            if detached:
+                record = dict(records[index], signature=signatures[index].hex(), **timestamp_fields(token, proof))
+                write_detached_signature(paths[index], record, durability)
+            else:
+                _store_legacy_timestamp(paths[index], token, proof, durability)
+        except (OSError, ValueError) as e:
+            errors[index] = str(e)
+    return errors
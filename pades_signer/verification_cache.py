@@ -0,0 +1,268 @@
+"""
+Module providing a persistent cache of signature verification results.
+
+Results are stored in SQLite, keyed by the SHA-256 hash and size of the document plus the
+fingerprint of the public key, so a document is verified again only when its content or
+the key changes. Hashing the whole document is still much cheaper than parsing it, and
+it is skipped entirely for files whose identity (device, inode, size, modification and
+change time) is unchanged since they were last hashed. The change time cannot be set
+back by users, so a modified file is always hashed again.
+
+Usage:
+    cache = VerificationCache("verification_cache.sqlite")
+    verifier = SignatureVerifier(public_key, cache=cache)
+    verifier.verify_signature("signed.pdf")    # verified and stored
+    verifier.verify_signature("signed.pdf")    # returned from the cache
+    print(cache.stats()["hit_ratio"])
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from pades_signer.hashing import hash_file
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    device INTEGER NOT NULL,
+    inode INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    ctime_ns INTEGER NOT NULL,
+    content_hash TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS results (
+    content_hash TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    key_fingerprint TEXT NOT NULL,
+    is_valid INTEGER NOT NULL,
+    message TEXT NOT NULL,
+    last_used REAL NOT NULL,
+    PRIMARY KEY (content_hash, size, key_fingerprint)
+);
+CREATE INDEX IF NOT EXISTS results_last_used ON results (last_used);
+CREATE INDEX IF NOT EXISTS files_content_hash ON files (content_hash);
+"""
+
+
+def _file_stat(path):
+    """
+    Get the identity of a file: (device, inode, size, mtime_ns, ctime_ns).
+    """
+    stat = os.stat(path)
+    return stat.st_dev, stat.st_ino, stat.st_size, stat.st_mtime_ns, stat.st_ctime_ns
+
+
+class CachedDocument:
+    """
+    Identity of a document looked up in the cache.
+
+    Attributes:
+        path (str): Absolute path to the document.
+        stat (tuple): (device, inode, size, mtime_ns, ctime_ns) when the document was looked up.
+        content_hash (str): Hex-encoded SHA-256 hash of the document.
+        key_fingerprint (str): Fingerprint of the public key.
+    """
+
+    def __init__(self, path, stat, content_hash, key_fingerprint):
+        """
+        Initialize the document identity.
+
+        Args:
+            path (str): Absolute path to the document.
+            stat (tuple): (device, inode, size, mtime_ns, ctime_ns) of the document.
+            content_hash (str): Hex-encoded SHA-256 hash of the document.
+            key_fingerprint (str): Fingerprint of the public key.
+        """
+        self.path = path
+        self.stat = stat
+        self.content_hash = content_hash
+        self.key_fingerprint = key_fingerprint
+
+    @property
+    def size(self):
+        """
+        int: Size of the document in bytes.
+        """
+        return self.stat[2]
+
+
+class VerificationCache:
+    """
+    Class storing verification results in an SQLite database, shared by threads and processes.
+
+    The least recently used results are evicted once more than max_entries are stored,
+    together with the file hashes no remaining result refers to.
+
+    Attributes:
+        path (str): Path to the database, ':memory:' for a cache private to this object.
+        max_entries (int): Maximum number of stored results.
+    """
+
+    def __init__(self, path, max_entries=100000):
+        """
+        Open the cache, creating the database when it does not exist.
+
+        Args:
+            path (str): Path to the database file.
+            max_entries (int): Maximum number of stored results (default: 100000).
+        """
+        self.path = path
+        self.max_entries = max_entries
+        self._connection = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.executescript(_SCHEMA)
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._stale = 0
+        self._evicted = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _content_hash(self, path, stat):
+        """
+        Get the content hash of a file, hashing it only when its identity changed.
+        """
+        row = self._connection.execute(
+            "SELECT device, inode, size, mtime_ns, ctime_ns, content_hash FROM files WHERE path = ?",
+            (path,)).fetchone()
+        if row and tuple(row[:5]) == stat:
+            return row[5]
+
+        if row:
+            self._stale += 1
+        content_hash = hash_file(path).hex()
+        self._connection.execute(
+            "INSERT OR REPLACE INTO files (path, device, inode, size, mtime_ns, ctime_ns, content_hash) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)", (path, *stat, content_hash))
+        return content_hash
+
+    def lookup(self, pdf_path, key_fingerprint):
+        """
+        Look up the verification result of a document.
+
+        Args:
+            pdf_path (str): Path to the document.
+            key_fingerprint (str): Fingerprint of the public key, see public_key_fingerprint.
+
+        Returns:
+            tuple: (document, result) where document identifies the document for store and
+                result is (is_valid, message), or None on a miss.
+
+        Raises:
+            OSError: When the document cannot be read.
+        """
+        path = os.path.abspath(pdf_path)
+        stat = _file_stat(path)
+        with self._lock:
+            content_hash = self._content_hash(path, stat)
+            document = CachedDocument(path, stat, content_hash, key_fingerprint)
+            row = self._connection.execute(
+                "SELECT is_valid, message FROM results WHERE content_hash = ? AND size = ? AND key_fingerprint = ?",
+                (content_hash, document.size, key_fingerprint)).fetchone()
+            if row is None:
+                self._misses += 1
+                return document, None
+
+            self._hits += 1
+            self._connection.execute(
+                "UPDATE results SET last_used = ? WHERE content_hash = ? AND size = ? AND key_fingerprint = ?",
+                (time.time(), content_hash, document.size, key_fingerprint))
+            return document, (bool(row[0]), row[1])
+
+    def store(self, document, result):
+        """
+        Store the verification result of a document returned by lookup.
+
+        Nothing is stored when the document changed since it was looked up, as the result
+        may then belong to different content than the hash.
+
+        Args:
+            document (CachedDocument): Document returned by lookup.
+            result (tuple): (is_valid, message) returned by the verifier.
+
+        Returns:
+            bool: True when the result was stored.
+        """
+        try:
+            if _file_stat(document.path) != document.stat:
+                return False
+        except OSError:
+            return False
+
+        is_valid, message = result
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO results (content_hash, size, key_fingerprint, is_valid, message, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (document.content_hash, document.size, document.key_fingerprint, int(is_valid), message,
+                 time.time()))
+            self._evict()
+        return True
+
+    def _evict(self):
+        """
+        Remove the least recently used results above max_entries, and the file hashes left without a result.
+        """
+        excess = self._connection.execute("SELECT COUNT(*) FROM results").fetchone()[0] - self.max_entries
+        if excess <= 0:
+            return
+        # One transaction, so other processes never see results evicted with their files still present
+        self._connection.execute("BEGIN IMMEDIATE")
+        try:
+            evicted = self._connection.execute(
+                "SELECT rowid, content_hash FROM results ORDER BY last_used LIMIT ?", (excess,)).fetchall()
+            self._connection.executemany("DELETE FROM results WHERE rowid = ?", [(row[0],) for row in evicted])
+            self._connection.executemany(
+                "DELETE FROM files WHERE content_hash = ? AND NOT EXISTS "
+                "(SELECT 1 FROM results WHERE results.content_hash = files.content_hash)",
+                [(content_hash,) for content_hash in {row[1] for row in evicted}])
+            self._connection.execute("COMMIT")
+        except BaseException:
+            self._connection.execute("ROLLBACK")
+            raise
+        self._evicted += len(evicted)
+
+    def clear(self):
+        """
+        Remove every stored result and file hash.
+        """
+        with self._lock:
+            self._connection.execute("DELETE FROM results")
+            self._connection.execute("DELETE FROM files")
+
+    def stats(self):
+        """
+        Report cache statistics of this process.
+
+        Returns:
+            dict: Hits, misses, hit_ratio, stale (files hashed again after they changed),
+                evicted results, the number of stored entries and of stored file hashes.
+        """
+        with self._lock:
+            entries = self._connection.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+            files = self._connection.execute("SELECT COUNT(*) FROM files").fetchone()[0]
+            lookups = self._hits + self._misses
+            return {
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_ratio": self._hits / lookups if lookups else 0.0,
+                "stale": self._stale,
+                "evicted": self._evicted,
+                "entries": entries,
+                "files": files,
+                "max_entries": self.max_entries,
+            }
+
+    def close(self):
+        """
+        Close the database connection.
+        """
+        with self._lock:
+            self._connection.close()
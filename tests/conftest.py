@@ -0,0 +1,42 @@
+"""
+Fixtures shared by the tests: signing keys and small PDF documents.
+"""
+
+import pytest
+from cryptography.hazmat.primitives.asymmetric import ed25519
+from PyPDF2 import PdfWriter
+
+
+def write_pdf(path, pages=1):
+    """
+    Write a PDF document with blank pages.
+
+    Args:
+        path (str): Path of the document.
+        pages (int): Number of pages (default: 1).
+
+    Returns:
+        str: Path of the document.
+    """
+    writer = PdfWriter()
+    for _ in range(pages):
+        writer.add_blank_page(width=200, height=200)
+    with open(path, "wb") as pdf_file:
+        writer.write(pdf_file)
+    return str(path)
+
+
+@pytest.fixture
+def private_key():
+    """
+    Ed25519 private key, the fastest key type to generate and sign with.
+    """
+    return ed25519.Ed25519PrivateKey.generate()
+
+
+@pytest.fixture
+def pdf_path(tmp_path):
+    """
+    Path to a one-page PDF document.
+    """
+    return write_pdf(tmp_path / "document.pdf")
@@ -0,0 +1,75 @@
+import hashlib
+
+import pytest
+from cryptography.exceptions import InvalidSignature
+from cryptography.hazmat.primitives.asymmetric import ec, rsa
+from cryptography.hazmat.primitives.asymmetric.utils import decode_dss_signature, encode_dss_signature
+from cryptography.hazmat.primitives.hashes import SHA256
+
+from key_manager.algorithms import ALGORITHMS, EcdsaP256Algorithm, algorithm_for_key, algorithm_for_subfilter, \
+    get_algorithm
+
+DOC_HASH = hashlib.sha256(b"document").digest()
+
+
+@pytest.fixture(scope="module")
+def ecdsa_key():
+    return ec.generate_private_key(ec.SECP256R1())
+
+
+def _raw_signature(ecdsa_key, predicate):
+    """
+    Sign until the DER signature satisfies a predicate on (r, s).
+    """
+    for _ in range(10000):
+        r, s = decode_dss_signature(ecdsa_key.sign(DOC_HASH, ec.ECDSA(SHA256())))
+        if predicate(r, s):
+            return r, s
+    pytest.fail("no matching signature")
+
+
+def test_ecdsa_signature_is_raw_r_and_s(ecdsa_key):
+    algorithm = EcdsaP256Algorithm()
+    signature = algorithm.sign(ecdsa_key, DOC_HASH)
+
+    assert len(signature) == algorithm.signature_size(ecdsa_key) == 64
+    r, s = int.from_bytes(signature[:32], "big"), int.from_bytes(signature[32:], "big")
+    ecdsa_key.public_key().verify(encode_dss_signature(r, s), DOC_HASH, ec.ECDSA(SHA256()))
+
+
+def test_short_r_and_s_are_padded_to_fixed_width(ecdsa_key):
+    # One signature in 256 has an r or s whose first byte is zero, DER drops it
+    r, s = _raw_signature(ecdsa_key, lambda r, s: r < 1 << 248)
+    signature = r.to_bytes(32, "big") + s.to_bytes(32, "big")
+
+    EcdsaP256Algorithm().verify(ecdsa_key.public_key(), signature, DOC_HASH)
+
+
+@pytest.mark.parametrize("name", sorted(ALGORITHMS))
+def test_signatures_round_trip_and_tampering_is_detected(name):
+    algorithm = get_algorithm(name)
+    if name == "rsa":
+        # Generating the default RSA-4096 key is slow, the signature format does not depend on its size
+        private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    else:
+        private_key = algorithm.generate_private_key()
+    signature = algorithm.sign(private_key, DOC_HASH)
+
+    assert len(signature) == algorithm.signature_size(private_key.public_key())
+    algorithm.verify(private_key.public_key(), signature, DOC_HASH)
+    tampered = bytes([signature[0] ^ 1]) + signature[1:]
+    with pytest.raises(InvalidSignature):
+        algorithm.verify(private_key.public_key(), tampered, DOC_HASH)
+
+
+def test_algorithms_are_found_by_key_and_subfilter(ecdsa_key):
+    algorithm = algorithm_for_key(ecdsa_key.public_key())
+
+    assert algorithm.name == "ecdsa-p256"
+    assert algorithm_for_subfilter(algorithm.subfilter) is algorithm
+    with pytest.raises(ValueError, match="Unsupported key type"):
+        algorithm_for_key(ec.generate_private_key(ec.SECP384R1()))
+    with pytest.raises(ValueError, match="Unsupported signature format"):
+        algorithm_for_subfilter("/adbe.pkcs7.detached")
+    with pytest.raises(ValueError, match="Unsupported signature algorithm"):
+        get_algorithm("dsa")
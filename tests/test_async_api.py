@@ -0,0 +1,19 @@
+import asyncio
+import time
+
+from pades_signer.async_api import AsyncExecutor
+
+
+def test_cancelled_job_keeps_its_slot_until_it_finishes():
+    async def scenario():
+        async with AsyncExecutor(workers=1) as executor:
+            task = asyncio.ensure_future(executor.run(time.sleep, 1.0))
+            await asyncio.sleep(0.3)
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+            # The job still runs in its worker, so it still occupies the only slot
+            assert executor._semaphore.locked()
+            assert await executor.run(abs, -1) == 1
+            assert not executor._semaphore.locked()
+
+    asyncio.run(scenario())
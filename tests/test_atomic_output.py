@@ -0,0 +1,76 @@
+import os
+
+import pytest
+
+from common import atomic_output
+from common.atomic_output import DURABILITY_LEVELS, AtomicOutput, check_durability, write_atomic
+
+
+@pytest.fixture
+def target(tmp_path):
+    path = tmp_path / "signed.pdf"
+    path.write_bytes(b"previous")
+    return path
+
+
+@pytest.mark.parametrize("durability", DURABILITY_LEVELS)
+def test_target_is_replaced_once_complete(tmp_path, target, durability):
+    with AtomicOutput(str(target), durability) as output_file:
+        output_file.write(b"new")
+        assert target.read_bytes() == b"previous"
+
+    assert target.read_bytes() == b"new"
+    assert os.listdir(tmp_path) == ["signed.pdf"]
+
+
+def test_exception_removes_the_temporary_file(tmp_path, target):
+    with pytest.raises(RuntimeError):
+        with AtomicOutput(str(target)) as output_file:
+            output_file.write(b"partial")
+            raise RuntimeError("serialization failed")
+
+    assert target.read_bytes() == b"previous"
+    assert os.listdir(tmp_path) == ["signed.pdf"]
+
+
+def test_failed_commit_removes_the_temporary_file(tmp_path, target, monkeypatch):
+    def fail(*args):
+        raise OSError("No space left on device")
+
+    monkeypatch.setattr(atomic_output.os, "fsync", fail)
+    with pytest.raises(OSError):
+        write_atomic(str(target), b"new")
+
+    assert target.read_bytes() == b"previous"
+    assert os.listdir(tmp_path) == ["signed.pdf"]
+
+
+def test_detached_file_is_committed_after_resuming(tmp_path, target):
+    output = AtomicOutput(str(target))
+    output.open().write(b"new document")
+    temp_path = output.detach()
+    assert os.path.exists(temp_path) and target.read_bytes() == b"previous"
+
+    resumed = AtomicOutput.resume(str(target), temp_path)
+    resumed.file.seek(4)
+    resumed.file.write(b"DOC")
+    resumed.commit()
+
+    assert target.read_bytes() == b"new DOCument"
+    assert os.listdir(tmp_path) == ["signed.pdf"]
+
+
+def test_abort_after_resuming_keeps_the_target(tmp_path, target):
+    output = AtomicOutput(str(target))
+    output.open().write(b"new")
+    resumed = AtomicOutput.resume(str(target), output.detach())
+    resumed.abort()
+    resumed.abort()
+
+    assert target.read_bytes() == b"previous"
+    assert os.listdir(tmp_path) == ["signed.pdf"]
+
+
+def test_unknown_durability_is_rejected():
+    with pytest.raises(ValueError, match="Unknown durability level"):
+        check_durability("eventually")
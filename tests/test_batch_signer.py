@@ -0,0 +1,106 @@
+import os
+
+import pytest
+from cryptography.hazmat.primitives import serialization
+
+from pades_signer.batch_signer import BatchSigner, collect_documents
+from pades_signer.local_tsa import LocalTSA
+from pades_signer.signature_verifier import SignatureVerifier
+from pades_signer.timestamping import TimestampClient
+from tests.conftest import write_pdf
+
+
+def _private_key_pem(private_key):
+    return private_key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8,
+                                     serialization.NoEncryption())
+
+
+def test_signed_copies_are_not_collected_again(tmp_path, private_key):
+    write_pdf(tmp_path / "a.pdf")
+    signer = BatchSigner(_private_key_pem(private_key), "Tester", workers=1)
+    assert signer.sign(collect_documents(str(tmp_path))).failed == 0
+
+    assert collect_documents(str(tmp_path)) == [os.path.join(str(tmp_path), "a.pdf")]
+
+
+def test_documents_inside_output_dir_are_skipped(tmp_path):
+    output_dir = tmp_path / "out"
+    output_dir.mkdir()
+    write_pdf(tmp_path / "a.pdf")
+    write_pdf(output_dir / "b.pdf")
+
+    paths = collect_documents(str(tmp_path / "**" / "*.pdf"), output_dir=str(output_dir))
+
+    assert paths == [str(tmp_path / "a.pdf")]
+
+
+def test_colliding_output_paths_are_rejected(tmp_path, private_key):
+    (tmp_path / "x").mkdir()
+    (tmp_path / "y").mkdir()
+    paths = [write_pdf(tmp_path / "x" / "a.pdf"), write_pdf(tmp_path / "y" / "a.pdf")]
+    signer = BatchSigner(_private_key_pem(private_key), "Tester", output_dir=str(tmp_path / "out"), workers=1)
+
+    with pytest.raises(ValueError, match="would both be saved"):
+        signer.sign(paths)
+    assert not (tmp_path / "out").exists()
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_timestamped_batch_writes_each_document_once(tmp_path, private_key, workers):
+    paths = [write_pdf(tmp_path / f"{index}.pdf") for index in range(3)]
+    output_dir = tmp_path / "out"
+    with LocalTSA() as tsa, TimestampClient(tsa.serve(), certificates=[tsa.certificate]) as client:
+        signer = BatchSigner(_private_key_pem(private_key), "Tester", output_dir=str(output_dir),
+                             workers=workers, timestamp_client=client)
+        batch_result = signer.sign(paths)
+
+    assert batch_result.failed == 0
+    assert tsa.issued == 1
+    # Nothing but the signed documents, no temporary files left behind
+    assert sorted(os.listdir(output_dir)) == ["signed_0.pdf", "signed_1.pdf", "signed_2.pdf"]
+    verifier = SignatureVerifier(private_key.public_key(), tsa_certificates=[tsa.certificate])
+    for result in batch_result.results:
+        assert result.prepared is None
+        is_valid, message = verifier.verify_signature(result.output_path)
+        assert is_valid and "timestamp:" in message, message
+
+
+def test_failed_timestamp_leaves_no_output(tmp_path, private_key):
+    paths = [write_pdf(tmp_path / f"{index}.pdf") for index in range(2)]
+    output_dir = tmp_path / "out"
+    with LocalTSA() as tsa:
+        url = tsa.serve()
+    with TimestampClient(url, timeout=1) as client:
+        signer = BatchSigner(_private_key_pem(private_key), "Tester", output_dir=str(output_dir), workers=1,
+                             timestamp_client=client)
+        batch_result = signer.sign(paths)
+
+    assert batch_result.failed == 2
+    assert all(result.error.startswith("Timestamping failed") for result in batch_result.results)
+    assert os.listdir(output_dir) == []
+
+
+def test_documents_named_explicitly_are_collected_whatever_their_name(tmp_path):
+    path = write_pdf(tmp_path / "signed_contract.pdf")
+    manifest = tmp_path / "manifest.txt"
+    manifest.write_text("signed_contract.pdf\n", encoding="utf-8")
+
+    assert collect_documents(str(manifest)) == [path]
+    assert collect_documents(str(tmp_path / "*.pdf")) == [path]
+    with pytest.raises(ValueError, match="No PDF documents"):
+        collect_documents(str(tmp_path))
+
+
+def test_unexpected_timestamp_error_leaves_no_temporary_files(tmp_path, private_key, monkeypatch):
+    def fail(documents, client):
+        raise RuntimeError("interrupted")
+
+    monkeypatch.setattr("pades_signer.batch_signer.timestamp_prepared", fail)
+    paths = [write_pdf(tmp_path / f"{index}.pdf") for index in range(2)]
+    output_dir = tmp_path / "out"
+    signer = BatchSigner(_private_key_pem(private_key), "Tester", output_dir=str(output_dir), workers=1,
+                         timestamp_client=object())
+
+    with pytest.raises(RuntimeError):
+        signer.sign(paths)
+    assert os.listdir(output_dir) == []
@@ -0,0 +1,62 @@
+import os
+
+from cryptography.hazmat.primitives import serialization
+
+from pades_signer import bulk_verifier
+from pades_signer.bulk_verifier import BulkVerifier
+from tests.conftest import write_pdf
+
+
+def _crash_on_marker(pdf_paths):
+    """
+    Verify a chunk, killing the worker process when a path contains 'crash'.
+    """
+    if any("crash" in os.path.basename(pdf_path) for pdf_path in pdf_paths):
+        os._exit(1)
+    return bulk_verifier._verify_chunk_original(pdf_paths)
+
+
+def _public_key_pem(private_key):
+    return private_key.public_key().public_bytes(serialization.Encoding.PEM,
+                                                 serialization.PublicFormat.SubjectPublicKeyInfo)
+
+
+def test_crashed_worker_does_not_abort_the_run(tmp_path, monkeypatch, private_key):
+    names = ["a.pdf", "crash.pdf"] + [f"doc{index}.pdf" for index in range(12)]
+    paths = [write_pdf(tmp_path / name) for name in names]
+    monkeypatch.setattr(bulk_verifier, "_verify_chunk_original", bulk_verifier._verify_chunk, raising=False)
+    monkeypatch.setattr(bulk_verifier, "_verify_chunk", _crash_on_marker)
+
+    results = list(BulkVerifier(_public_key_pem(private_key), workers=1, chunk_size=1).iter_results(paths))
+
+    assert sorted(result["path"] for result in results) == sorted(paths)
+    buckets = {result["path"]: result["bucket"] for result in results}
+    assert buckets[str(tmp_path / "crash.pdf")] == "worker_crash"
+    assert buckets[paths[-1]] == "unsigned"
+
+
+def test_run_writes_a_record_for_every_document_after_a_crash(tmp_path, monkeypatch, private_key):
+    paths = [write_pdf(tmp_path / name) for name in ["crash.pdf"] + [f"doc{index}.pdf" for index in range(8)]]
+    monkeypatch.setattr(bulk_verifier, "_verify_chunk_original", bulk_verifier._verify_chunk, raising=False)
+    monkeypatch.setattr(bulk_verifier, "_verify_chunk", _crash_on_marker)
+    output_path = str(tmp_path / "results.jsonl")
+
+    report = BulkVerifier(_public_key_pem(private_key), workers=1, chunk_size=1).run(paths, output_path)
+
+    assert report.verified == len(paths)
+    assert bulk_verifier.load_checkpoint(output_path, "jsonl") == set(paths)
+
+
+def test_only_the_crashing_document_is_reported_as_crashed(tmp_path, monkeypatch, private_key):
+    names = [f"doc{index}.pdf" for index in range(5)] + ["crash.pdf"] + [f"doc{index}.pdf" for index in range(5, 16)]
+    paths = [write_pdf(tmp_path / name) for name in names]
+    monkeypatch.setattr(bulk_verifier, "_verify_chunk_original", bulk_verifier._verify_chunk, raising=False)
+    monkeypatch.setattr(bulk_verifier, "_verify_chunk", _crash_on_marker)
+
+    # All chunks are in flight when the worker crashes, the crash shares a chunk with healthy documents
+    results = list(BulkVerifier(_public_key_pem(private_key), workers=2, chunk_size=4).iter_results(paths))
+
+    assert sorted(result["path"] for result in results) == sorted(paths)
+    crashed = [result["path"] for result in results if result["bucket"] == "worker_crash"]
+    assert crashed == [str(tmp_path / "crash.pdf")]
+    assert all(result["bucket"] == "unsigned" for result in results if result["path"] not in crashed)
@@ -0,0 +1,130 @@
+import http.client
+import json
+import os
+import stat
+import threading
+import time
+
+import pytest
+
+from pades_signer.daemon import ServiceBusy, SigningService, create_server, write_token_file
+
+
+class _Service:
+    """
+    Stand-in service answering health checks without worker processes.
+    """
+
+    def health(self):
+        return {"status": "ok"}
+
+    def lock(self, key_path):
+        return False
+
+
+@pytest.fixture
+def server():
+    server = create_server(_Service(), port=0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def _request(server, method, path, body=None, headers=None, host=None):
+    connection = http.client.HTTPConnection("127.0.0.1", server.server_address[1], timeout=5)
+    all_headers = {"Host": host or f"127.0.0.1:{server.server_address[1]}",
+                   "Authorization": f"Bearer {server.token}"}
+    all_headers.update(headers or {})
+    connection.request(method, path, body, all_headers)
+    response = connection.getresponse()
+    status = response.status
+    response.read()
+    connection.close()
+    return status
+
+
+def test_token_is_generated_when_not_given(server):
+    assert len(server.token) >= 32
+    assert create_server(_Service(), port=0).token != server.token
+
+
+def test_request_without_token_is_rejected(server):
+    assert _request(server, "GET", "/health", headers={"Authorization": ""}) == 401
+    assert _request(server, "GET", "/health") == 200
+
+
+def test_foreign_host_is_rejected(server):
+    assert _request(server, "GET", "/health", host=f"attacker.example:{server.server_address[1]}") == 403
+    assert _request(server, "GET", "/health", host=f"localhost:{server.server_address[1]}") == 200
+
+
+def test_post_must_be_json(server):
+    body = json.dumps({"key": "a.key"})
+    assert _request(server, "POST", "/lock", body, {"Content-Type": "text/plain"}) == 415
+    assert _request(server, "POST", "/lock", body) == 415
+    assert _request(server, "POST", "/lock", body, {"Content-Type": "application/json; charset=utf-8"}) == 200
+
+
+@pytest.mark.skipif(os.name == "nt", reason="POSIX permissions")
+def test_token_file_is_private(tmp_path):
+    path = tmp_path / "token"
+    path.write_text("old")
+    path.chmod(0o644)
+
+    write_token_file(str(path), "secret")
+
+    assert path.read_text() == "secret"
+    assert stat.S_IMODE(path.stat().st_mode) == 0o600
+
+
+def test_timed_out_job_keeps_its_slot_until_it_finishes():
+    service = SigningService(workers=2, max_queue=1, job_timeout=0.2)
+    try:
+        assert len(service.executor._processes) == 2
+        with pytest.raises(TimeoutError):
+            service._run("verify", time.sleep, 1.0)
+        with pytest.raises(ServiceBusy):
+            service._run("verify", time.sleep, 0)
+        time.sleep(1.5)
+        assert service._run("verify", time.sleep, 0) is None
+        assert service.metrics()["queued"] == 0
+    finally:
+        service.close()
+
+
+class _Session:
+    """
+    Stand-in unlock session counting the signatures taken from its budget.
+    """
+
+    def __init__(self, private_key):
+        self.private_key = private_key
+        self.signatures = 0
+
+    def acquire_key(self):
+        self.signatures += 1
+        return self.private_key
+
+    def lock(self):
+        pass
+
+
+def test_rejected_job_does_not_use_the_signature_budget(private_key):
+    service = SigningService(workers=1, max_queue=1)
+    session = _Session(private_key)
+    service.sessions["a.key"] = session
+    try:
+        blocker = threading.Thread(target=service._run, args=("verify", time.sleep, 1.0))
+        blocker.start()
+        while service.metrics()["queued"] == 0:
+            time.sleep(0.01)
+        with pytest.raises(ServiceBusy):
+            service.sign_digests([bytes(32)])
+        assert session.signatures == 0
+
+        blocker.join()
+        assert len(service.sign_digests([bytes(32)])) == 1
+        assert session.signatures == 1
+    finally:
+        service.close()
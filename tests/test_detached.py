@@ -0,0 +1,72 @@
+import json
+
+import pytest
+
+from pades_signer.detached import DETACHED_FORMAT, detached_signature_path, read_detached_signature
+from pades_signer.pdf_signer import PDFSigner
+from pades_signer.signature_verifier import SignatureVerifier
+
+
+@pytest.fixture
+def signed(tmp_path, private_key):
+    # Any file can be signed, it is never parsed
+    document_path = tmp_path / "report.bin"
+    document_path.write_bytes(b"\x00\x01 not a PDF" * 1000)
+    signature_path = PDFSigner(private_key).sign_detached(str(document_path), "Tester")
+    return document_path, signature_path
+
+
+def _edit_record(signature_path, **changes):
+    with open(signature_path, encoding="utf-8") as signature_file:
+        record = json.load(signature_file)
+    record.update(changes)
+    with open(signature_path, "w", encoding="utf-8") as signature_file:
+        json.dump(record, signature_file)
+
+
+def test_detached_signature_is_valid(signed, private_key):
+    document_path, signature_path = signed
+
+    assert signature_path == detached_signature_path(str(document_path))
+    record = read_detached_signature(signature_path)
+    assert record["format"] == DETACHED_FORMAT and record["signed_by"] == "Tester"
+    is_valid, message = SignatureVerifier(private_key.public_key()).verify_detached(str(document_path))
+    assert is_valid, message
+
+
+@pytest.mark.parametrize("change", [lambda data: data[:-1] + b"!", lambda data: data + b"\n"])
+def test_changed_document_is_rejected(signed, private_key, change):
+    document_path, _ = signed
+    document_path.write_bytes(change(document_path.read_bytes()))
+
+    assert not SignatureVerifier(private_key.public_key()).verify_detached(str(document_path))[0]
+
+
+def test_changed_signed_field_is_rejected(signed, private_key):
+    document_path, signature_path = signed
+    _edit_record(signature_path, signed_by="Mallory")
+
+    assert not SignatureVerifier(private_key.public_key()).verify_detached(str(document_path))[0]
+
+
+def test_missing_signature_file(tmp_path, private_key):
+    document_path = tmp_path / "unsigned.bin"
+    document_path.write_bytes(b"data")
+
+    assert read_detached_signature(detached_signature_path(str(document_path))) is None
+    assert SignatureVerifier(private_key.public_key()).verify_detached(str(document_path)) == \
+        (False, "No signature provided")
+
+
+@pytest.mark.parametrize("content, error", [
+    ("{", "not valid JSON"),
+    ('{"format": "other"}', "not a detached signature"),
+    (json.dumps({"format": DETACHED_FORMAT, "version": 2, "hash": "sha256"}), "Unsupported"),
+    (json.dumps({"format": DETACHED_FORMAT, "version": 1, "hash": "sha256", "signature": "00"}), "Incomplete"),
+])
+def test_malformed_signature_file_is_rejected(tmp_path, content, error):
+    signature_path = tmp_path / "document.pdf.sig"
+    signature_path.write_text(content, encoding="utf-8")
+
+    with pytest.raises(ValueError, match=error):
+        read_detached_signature(str(signature_path))
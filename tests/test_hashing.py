@@ -0,0 +1,56 @@
+import hashlib
+import io
+import os
+
+import pytest
+
+from pades_signer.hashing import HashingStream, hash_byte_ranges, hash_file, update_from_file
+
+DATA = os.urandom(10000)
+
+
+@pytest.fixture
+def data_path(tmp_path):
+    path = tmp_path / "data.bin"
+    path.write_bytes(DATA)
+    return str(path)
+
+
+def test_hashing_stream_hashes_and_copies_writes():
+    sink = io.BytesIO()
+    stream = HashingStream(sink)
+    for offset in range(0, len(DATA), 3000):
+        stream.write(DATA[offset:offset + 3000])
+
+    assert stream.tell() == len(DATA)
+    assert stream.digest() == hashlib.sha256(DATA).digest()
+    assert sink.getvalue() == DATA
+
+
+@pytest.mark.parametrize("chunk_size", [1, 999, len(DATA), len(DATA) * 2])
+def test_file_is_hashed_whatever_the_chunk_size(data_path, chunk_size):
+    assert hash_file(data_path, chunk_size) == hashlib.sha256(DATA).digest()
+
+
+def test_length_limits_the_hashed_bytes(data_path):
+    hasher = hashlib.sha256()
+    sink = io.BytesIO()
+    with open(data_path, "rb") as file:
+        file.seek(100)
+        assert update_from_file(hasher, file, 5000, chunk_size=777, sink=sink) == 5000
+        assert file.tell() == 5100
+
+    assert hasher.digest() == hashlib.sha256(DATA[100:5100]).digest()
+    assert sink.getvalue() == DATA[100:5100]
+
+
+def test_byte_ranges_skip_the_gap(data_path):
+    byte_range = [0, 4000, 4500, len(DATA) - 4500]
+    expected = hashlib.sha256(DATA[:4000] + DATA[4500:]).digest()
+
+    assert hash_byte_ranges(data_path, byte_range, chunk_size=1024) == expected
+
+
+def test_byte_ranges_beyond_the_document_are_rejected(data_path):
+    with pytest.raises(ValueError, match="exceeds document size"):
+        hash_byte_ranges(data_path, [0, 4000, 4500, len(DATA)])
@@ -0,0 +1,12 @@
+from benchmarks.import_time import HEAVY_MODULES, IMPORT_CHECKS, heavy_imports
+
+
+def test_cli_help_loads_no_heavy_module():
+    loaded = heavy_imports()
+    assert loaded == {name: [] for name in IMPORT_CHECKS}
+
+
+def test_heavy_import_is_detected(monkeypatch):
+    monkeypatch.setitem(IMPORT_CHECKS, "import_cli", (["-c"], "import pades_signer.cli, PyPDF2"))
+    assert heavy_imports()["import_cli"] == ["PyPDF2"]
+    assert "PyPDF2" in HEAVY_MODULES
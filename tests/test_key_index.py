@@ -0,0 +1,66 @@
+import os
+
+import pytest
+from cryptography.hazmat.primitives import serialization
+
+from key_manager.key_generator import public_key_fingerprint
+from key_manager.usb_storage import KeyIndex
+
+
+def _write_public_key(path, private_key):
+    path.write_bytes(private_key.public_key().public_bytes(serialization.Encoding.PEM,
+                                                           serialization.PublicFormat.SubjectPublicKeyInfo))
+
+
+@pytest.fixture
+def volume(tmp_path, private_key):
+    (tmp_path / "b.key").write_bytes(b"encrypted")
+    (tmp_path / "a.key").write_bytes(b"encrypted key")
+    _write_public_key(tmp_path / "a.pub.pem", private_key)
+    (tmp_path / "notes.txt").write_text("not a key")
+    return tmp_path
+
+
+def test_key_files_are_indexed_with_fingerprints(volume, private_key):
+    entries = KeyIndex().refresh(str(volume))
+
+    assert [entry.name for entry in entries] == ["a.key", "b.key"]
+    assert entries[0].size == len(b"encrypted key")
+    assert entries[0].fingerprint == public_key_fingerprint(private_key.public_key())
+    assert entries[0].describe() == f"a.key ({entries[0].fingerprint[:16]})"
+    assert entries[1].fingerprint is None and entries[1].describe() == "b.key"
+
+
+def test_unchanged_files_are_not_read_again(volume, monkeypatch):
+    index = KeyIndex()
+    first = index.refresh(str(volume))
+    monkeypatch.setattr(KeyIndex, "_fingerprint", staticmethod(lambda path: pytest.fail("fingerprint recomputed")))
+
+    assert index.refresh(str(volume)) == first
+
+
+def test_changed_and_new_files_are_picked_up(volume, private_key):
+    index = KeyIndex()
+    index.refresh(str(volume))
+    _write_public_key(volume / "b.pub.pem", private_key)
+    (volume / "c.key").write_bytes(b"new key")
+    (volume / "a.key").unlink()
+    # The listing is reused only while the directory modification time is unchanged
+    stat = os.stat(volume)
+    os.utime(volume, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+
+    entries = index.refresh(str(volume))
+
+    assert [entry.name for entry in entries] == ["b.key", "c.key"]
+    assert entries[0].fingerprint == public_key_fingerprint(private_key.public_key())
+
+
+def test_unreadable_volume_is_forgotten(volume):
+    index = KeyIndex()
+    index.refresh(str(volume))
+    assert index.volumes() == [str(volume)]
+
+    assert index.refresh(str(volume / "missing")) == []
+    index.forget(str(volume))
+    assert index.volumes() == []
+    assert index.keys(str(volume)) == []
@@ -0,0 +1,42 @@
+import os
+import time
+
+import pytest
+
+from key_manager import key_pool
+from key_manager.key_pool import KeyPool
+
+
+def _crash(algorithm_name):
+    """
+    Kill the worker process instead of generating a key.
+    """
+    os._exit(1)
+
+
+def _wait_for(pool, **expected):
+    deadline = time.monotonic() + 30
+    while any(pool.metrics()[name] != value for name, value in expected.items()):
+        assert time.monotonic() < deadline, pool.metrics()
+        time.sleep(0.01)
+
+
+def test_taken_keys_are_replaced():
+    with KeyPool("ed25519", target_depth=2, workers=1) as pool:
+        first, public_key = pool.take(timeout=30)
+        assert public_key.public_bytes_raw() == first.public_key().public_bytes_raw()
+        _wait_for(pool, depth=2, pending=0)
+
+        second, _ = pool.take(timeout=30)
+        assert second is not first
+        _wait_for(pool, depth=2, pending=0, generated=4, taken=2)
+
+
+def test_broken_pool_is_reported_and_not_refilled(monkeypatch):
+    # Workers are forked with the first generation, so they inherit the crashing generator
+    monkeypatch.setattr(key_pool, "_generate_key", _crash)
+    with KeyPool("ed25519", target_depth=2, workers=1) as pool:
+        for _ in range(2):
+            with pytest.raises(ValueError, match="worker process crashed"):
+                pool.take(timeout=30)
+        assert pool.metrics()["pending"] == 0
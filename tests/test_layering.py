@@ -0,0 +1,12 @@
+import subprocess
+import sys
+
+
+def test_key_manager_does_not_import_pades_signer():
+    code = ("import sys, key_manager.algorithms, key_manager.key_generator, key_manager.key_pool, "
+            "key_manager.key_registry, key_manager.unlock_session, key_manager.usb_storage, "
+            "common.atomic_output, common.instrumentation; "
+            "print(sorted(name for name in sys.modules if name.split('.')[0] == 'pades_signer'))")
+    output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout
+
+    assert output.strip() == "[]"
@@ -0,0 +1,105 @@
+import os
+import threading
+import time
+
+import pytest
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+QtWidgets = pytest.importorskip("PyQt5.QtWidgets")
+
+from gui.main_window import MainWindow
+from key_manager.key_generator import KeyGenerator
+from key_manager.usb_storage import KeyIndex, UsbStorage
+from tests.conftest import write_pdf
+
+
+@pytest.fixture(scope="module")
+def application():
+    return QtWidgets.QApplication.instance() or QtWidgets.QApplication([])
+
+
+def test_close_waits_for_running_jobs(application):
+    window = MainWindow()
+    started = threading.Event()
+    finished = []
+
+    def work(job):
+        started.set()
+        time.sleep(0.3)
+        finished.append(job)
+
+    window.start_job(work, window.sign_status, lambda result: None, "Error")
+    assert started.wait(5)
+
+    window.close()
+
+    assert finished
+    assert window.thread_pool.activeThreadCount() == 0
+    assert not window.jobs
+
+
+def _wait_for_jobs(application, window):
+    deadline = time.monotonic() + 30
+    while window.jobs and time.monotonic() < deadline:
+        application.processEvents()
+        time.sleep(0.01)
+
+
+def _sign_with_pin(application, monkeypatch, tmp_path, key_data, pin):
+    """
+    Sign a document through the sign tab, returning the window and the titles of error dialogs.
+    """
+    usb_path = tmp_path / "usb"
+    usb_path.mkdir()
+    (usb_path / "private_key.key").write_bytes(key_data)
+    monkeypatch.setattr(UsbStorage, "get_usb_drives", staticmethod(lambda: [str(usb_path)]))
+    answers = {"PIN Required": pin, "Signer Information": "Tester"}
+    monkeypatch.setattr(QtWidgets.QInputDialog, "getText", lambda parent, title, *args: (answers[title], True))
+    dialogs = []
+    monkeypatch.setattr(QtWidgets.QMessageBox, "critical", lambda parent, title, text: dialogs.append(title))
+
+    window = MainWindow()
+    window.update_usb_status([str(usb_path)])
+    window.pdf_path_label.setText(write_pdf(tmp_path / "document.pdf"))
+    window.sign_document()
+    _wait_for_jobs(application, window)
+    window.close()
+    return window, dialogs
+
+
+def test_wrong_pin_is_reported_as_invalid_pin(application, monkeypatch, tmp_path):
+    key_generator = KeyGenerator("ed25519")
+    key_generator.generate_key_pair()
+    window, dialogs = _sign_with_pin(application, monkeypatch, tmp_path, key_generator.encrypt_private_key("1234"),
+                                     "0000")
+
+    assert dialogs == ["Invalid PIN"]
+    assert window.sign_status.text() == "Invalid PIN. Operation cancelled."
+
+
+def test_damaged_key_file_is_not_reported_as_invalid_pin(application, monkeypatch, tmp_path):
+    window, dialogs = _sign_with_pin(application, monkeypatch, tmp_path, b"truncated key", "1234")
+
+    assert dialogs == []
+    assert window.sign_status.text().startswith("Error! Failed to sign document: Key file is damaged")
+
+
+def test_keys_are_looked_up_off_the_ui_thread(application, monkeypatch, tmp_path):
+    (tmp_path / "private_key.key").write_bytes(b"encrypted key")
+    monkeypatch.setattr(UsbStorage, "get_usb_drives", staticmethod(lambda: [str(tmp_path)]))
+    refresh = KeyIndex.refresh
+    threads = []
+
+    def recording_refresh(index, volume):
+        threads.append(threading.current_thread())
+        return refresh(index, volume)
+
+    monkeypatch.setattr(KeyIndex, "refresh", recording_refresh)
+    window = MainWindow()
+    window.update_usb_status([str(tmp_path)])
+    _wait_for_jobs(application, window)
+    window.close()
+
+    assert threads and threading.main_thread() not in threads
+    assert window.usb_status.text() == f"USB Connected: {tmp_path} (Key found)"
+    assert window.encrypted_key_path == str(tmp_path / "private_key.key")
@@ -0,0 +1,126 @@
+import hashlib
+import io
+import mmap
+import os
+import types
+
+import psutil
+import pytest
+
+from benchmarks.corpus import write_synthetic_pdf
+from benchmarks.measure import run_isolated
+from pades_signer import mapped_io
+from pades_signer.hashing import hash_file
+from pades_signer.mapped_io import mapped_chunks, mmap_allowed, open_pdf, release_pdf, set_mmap_enabled
+from tests.conftest import write_pdf
+
+WINDOW = mmap.ALLOCATIONGRANULARITY
+
+
+@pytest.fixture(autouse=True)
+def mmap_state(monkeypatch):
+    # Decisions are cached per device, every test starts from an empty cache
+    monkeypatch.setattr(mapped_io, "_device_decisions", {})
+    yield
+    set_mmap_enabled(True)
+
+
+@pytest.fixture
+def data_path(tmp_path):
+    data = os.urandom(WINDOW * 3 + 1234)
+    path = tmp_path / "data.bin"
+    path.write_bytes(data)
+    return str(path), data
+
+
+def _read(chunks):
+    return b"".join(bytes(chunk) for chunk in chunks)
+
+
+@pytest.mark.parametrize("position, length", [(0, None), (100, WINDOW), (WINDOW - 1, WINDOW * 2 + 2),
+                                              (WINDOW * 2 + 5, None)])
+def test_chunks_cross_window_boundaries(monkeypatch, data_path, position, length):
+    monkeypatch.setattr(mapped_io, "MMAP_THRESHOLD", 0)
+    path, data = data_path
+    with open(path, "rb") as file:
+        file.seek(position)
+        chunks = mapped_chunks(file, length, window=WINDOW)
+        assert chunks is not None
+        expected = data[position:] if length is None else data[position:position + length]
+        assert _read(chunks) == expected
+        assert file.tell() == position + len(expected)
+
+
+def test_length_beyond_end_of_file_is_rejected(data_path):
+    path, data = data_path
+    with open(path, "rb") as file:
+        file.seek(10)
+        with pytest.raises(ValueError, match="exceeds document size"):
+            mapped_chunks(file, len(data))
+
+
+def test_small_ranges_and_unmappable_files_are_not_mapped(monkeypatch, data_path):
+    path, data = data_path
+    with open(path, "rb") as file:
+        assert mapped_chunks(file) is None
+    monkeypatch.setattr(mapped_io, "MMAP_THRESHOLD", 0)
+    assert mapped_chunks(io.BytesIO(data)) is None
+
+
+def test_disabled_mappings_fall_back_to_regular_reads(monkeypatch, data_path):
+    monkeypatch.setattr(mapped_io, "MMAP_THRESHOLD", 0)
+    path, data = data_path
+    set_mmap_enabled(False)
+    assert not mmap_allowed(path)
+    with open(path, "rb") as file:
+        assert mapped_chunks(file) is None
+    assert hash_file(path) == hashlib.sha256(data).digest()
+
+    set_mmap_enabled(True)
+    assert mmap_allowed(path)
+    assert hash_file(path) == hashlib.sha256(data).digest()
+
+
+def test_network_filesystems_are_not_mapped(monkeypatch, data_path):
+    path, _ = data_path
+    mount = types.SimpleNamespace(mountpoint=os.path.dirname(os.path.realpath(path)), fstype="nfs4", opts="rw")
+    monkeypatch.setattr(psutil, "disk_partitions", lambda all=False: [mount])
+    assert not mmap_allowed(path)
+
+
+def test_open_pdf_parses_from_a_mapping(monkeypatch, tmp_path):
+    monkeypatch.setattr(mapped_io, "MMAP_THRESHOLD", 0)
+    path = write_pdf(tmp_path / "document.pdf", pages=3)
+    reader = open_pdf(path)
+    assert isinstance(reader.stream, mmap.mmap)
+    assert len(reader.pages) == 3
+    release_pdf(reader)
+    assert reader.stream.closed
+
+    set_mmap_enabled(False)
+    reader = open_pdf(path)
+    assert not isinstance(reader.stream, mmap.mmap)
+    assert len(reader.pages) == 3
+
+
+def _sign_incremental(pdf_path, output_path, mapped):
+    """
+    Sign a document incrementally in a fresh process, with or without mappings.
+    """
+    from cryptography.hazmat.primitives.asymmetric import ed25519
+    from pades_signer.pdf_signer import PDFSigner
+    set_mmap_enabled(mapped)
+    PDFSigner(ed25519.Ed25519PrivateKey.generate()).sign_document(pdf_path, output_path, "Tester", incremental=True)
+
+
+def test_incremental_signing_does_not_load_the_document(tmp_path):
+    pdf_path = write_synthetic_pdf(str(tmp_path / "large.pdf"), image_bytes=64 * 1024 * 1024)
+    output_path = str(tmp_path / "signed.pdf")
+    file_size = os.path.getsize(pdf_path)
+
+    mapped = run_isolated(_sign_incremental, (pdf_path, output_path, True))["peak_rss_growth_bytes"]
+    buffered = run_isolated(_sign_incremental, (pdf_path, output_path, False))["peak_rss_growth_bytes"]
+
+    # Buffered parsing copies the whole document, mapped parsing reads a few objects
+    assert buffered > file_size
+    assert mapped < file_size // 2
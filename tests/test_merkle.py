@@ -0,0 +1,71 @@
+import os
+
+import pytest
+
+from pades_signer import merkle
+from pades_signer.merkle import MerkleBatchSigner
+from pades_signer.remote_signing import PreparedSignature
+from pades_signer.signature_verifier import SignatureVerifier
+from tests.conftest import write_pdf
+
+
+def _crash_on_marker(pdf_path, *args):
+    """
+    Prepare a document, killing the worker process when its path contains 'crash'.
+    """
+    if "crash" in os.path.basename(pdf_path):
+        os._exit(1)
+    return merkle._prepare_one_original(pdf_path, *args)
+
+
+@pytest.fixture
+def batch(tmp_path):
+    (tmp_path / "out").mkdir()
+    pdf_paths = [write_pdf(tmp_path / f"{index}.pdf") for index in range(4)]
+    return pdf_paths, [str(tmp_path / "out" / f"{index}.pdf") for index in range(4)]
+
+
+def test_failed_injection_does_not_stop_the_batch(tmp_path, batch, private_key, monkeypatch):
+    pdf_paths, output_paths = batch
+    inject = PreparedSignature.inject
+
+    def fail_second(prepared, signature):
+        if prepared.output_path == output_paths[1]:
+            raise OSError("No space left on device")
+        return inject(prepared, signature)
+
+    monkeypatch.setattr(PreparedSignature, "inject", fail_second)
+    results = MerkleBatchSigner(private_key, "Tester").sign(pdf_paths, output_paths)
+
+    assert [result.ok for result in results] == [True, False, True, True]
+    assert results[1].error == "No space left on device"
+    # The document that got no signature leaves no placeholder file behind
+    assert sorted(os.listdir(tmp_path / "out")) == ["0.pdf", "2.pdf", "3.pdf"]
+    verifier = SignatureVerifier(private_key.public_key())
+    assert all(verifier.verify_signature(output_paths[index])[0] for index in (0, 2, 3))
+
+
+def test_failed_root_signature_leaves_no_output(tmp_path, batch, private_key, monkeypatch):
+    pdf_paths, output_paths = batch
+    signer = MerkleBatchSigner(private_key, "Tester")
+    monkeypatch.setattr(signer.algorithm, "sign", lambda private_key, digest: 1 / 0)
+
+    with pytest.raises(ZeroDivisionError):
+        signer.sign(pdf_paths, output_paths)
+    assert os.listdir(tmp_path / "out") == []
+
+
+def test_crashed_worker_fails_documents_instead_of_the_batch(tmp_path, batch, private_key, monkeypatch):
+    pdf_paths, output_paths = batch
+    pdf_paths[2] = write_pdf(tmp_path / "crash.pdf")
+    monkeypatch.setattr(merkle, "_prepare_one_original", merkle._prepare_one, raising=False)
+    monkeypatch.setattr(merkle, "_prepare_one", _crash_on_marker)
+
+    results = MerkleBatchSigner(private_key, "Tester", workers=2).sign(pdf_paths, output_paths)
+
+    assert not results[2].ok and "Worker process crashed" in results[2].error
+    verifier = SignatureVerifier(private_key.public_key())
+    for result, output_path in zip(results, output_paths):
+        assert os.path.exists(output_path) == result.ok
+        if result.ok:
+            assert verifier.verify_signature(output_path)[0]
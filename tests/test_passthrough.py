@@ -0,0 +1,55 @@
+import hashlib
+import io
+
+import pytest
+from PyPDF2 import PdfReader, PdfWriter
+
+from pades_signer.passthrough import read_info, read_writer_layout, updated_info, write_with_info
+
+METADATA = {"/Producer": "Tester", "/Title": "Report"}
+
+
+def _written(metadata, pages=3):
+    writer = PdfWriter()
+    for _ in range(pages):
+        writer.add_blank_page(width=200, height=200)
+    writer.add_metadata(metadata)
+    output = io.BytesIO()
+    writer.write(output)
+    return output.getvalue()
+
+
+@pytest.mark.parametrize("add, remove", [({"/Signature": "a" * 500}, ()), ({}, ("/Title",))])
+def test_replaced_info_matches_a_fresh_serialization(add, remove):
+    original = _written(METADATA)
+    expected = _written({**{key: value for key, value in METADATA.items() if key not in remove}, **add})
+
+    file = io.BytesIO(original)
+    layout = read_writer_layout(file)
+    # The information dictionary is followed by the pages, their offsets have to move
+    assert layout.info_number < len(layout.offsets)
+    info = updated_info(read_info(file, layout), add, remove)
+    hasher = hashlib.sha256()
+    sink = io.BytesIO()
+
+    assert write_with_info(file, layout, info, hasher, sink) == len(expected)
+    assert sink.getvalue() == expected
+    assert hasher.digest() == hashlib.sha256(expected).digest()
+
+
+def test_shifted_offsets_are_readable():
+    file = io.BytesIO(_written(METADATA))
+    layout = read_writer_layout(file)
+    sink = io.BytesIO()
+    write_with_info(file, layout, updated_info(read_info(file, layout), {"/Signature": "x" * 1000}), sink=sink)
+
+    reader = PdfReader(io.BytesIO(sink.getvalue()), strict=True)
+    assert len(reader.pages) == 3
+    assert reader.metadata["/Signature"] == "x" * 1000
+    assert all(page.mediabox.width == 200 for page in reader.pages)
+
+
+@pytest.mark.parametrize("change", [lambda data: data + b"% appended\n",
+                                    lambda data: data.replace(b"xref\n0 ", b"xref\n1 ", 1)])
+def test_documents_not_written_in_one_pass_are_refused(change):
+    assert read_writer_layout(io.BytesIO(change(_written(METADATA)))) is None
@@ -0,0 +1,96 @@
+import json
+import os
+
+import pytest
+from cryptography.hazmat.primitives import serialization
+
+from common.atomic_output import AtomicOutput
+from pades_signer.pdf_signer import PDFSigner
+from pades_signer.remote_signing import DigestSigner, PreparedSignature, inject_signatures, prepare_document
+from pades_signer.signature_verifier import SignatureVerifier
+
+
+def _read(path):
+    with open(path, "rb") as pdf_file:
+        return pdf_file.read()
+
+
+def test_signing_in_place(tmp_path, pdf_path, private_key):
+    original = _read(pdf_path)
+    PDFSigner(private_key).sign_document(pdf_path, pdf_path, "Tester", incremental=True)
+
+    assert _read(pdf_path).startswith(original)
+    assert SignatureVerifier(private_key.public_key()).verify_signature(pdf_path)[0]
+    assert os.listdir(tmp_path) == ["document.pdf"]
+
+
+def test_prepared_document_replaces_the_output_only_once_signed(tmp_path, pdf_path, private_key):
+    original = _read(pdf_path)
+    prepared = prepare_document(pdf_path, pdf_path, "Tester", private_key.public_key())
+    assert _read(pdf_path) == original
+
+    # A stored prepared signature is injected like the original one
+    prepared = PreparedSignature.from_dict(prepared.to_dict())
+    prepared.inject(DigestSigner(private_key).sign_digests([prepared.digest])[0])
+    assert SignatureVerifier(private_key.public_key()).verify_signature(pdf_path)[0]
+    assert os.listdir(tmp_path) == ["document.pdf"]
+    with pytest.raises(ValueError, match="already been signed"):
+        prepared.inject(bytes(64))
+
+
+def test_failed_injection_leaves_the_original_intact(tmp_path, pdf_path, private_key, monkeypatch):
+    original = _read(pdf_path)
+    prepared = prepare_document(pdf_path, pdf_path, "Tester", private_key.public_key())
+    with pytest.raises(ValueError, match="does not fit"):
+        prepared.inject(bytes(prepared.contents_capacity + 1))
+
+    def fail(output):
+        output.abort()
+        raise OSError("No space left on device")
+
+    monkeypatch.setattr(AtomicOutput, "commit", fail)
+    with pytest.raises(OSError):
+        prepared.inject(bytes(64))
+    assert _read(pdf_path) == original
+    assert os.listdir(tmp_path) == ["document.pdf"]
+
+
+def test_discarded_document_is_removed(tmp_path, pdf_path, private_key):
+    output_path = str(tmp_path / "signed.pdf")
+    prepared = prepare_document(pdf_path, output_path, "Tester", private_key.public_key())
+    prepared.discard()
+
+    assert os.listdir(tmp_path) == ["document.pdf"]
+    with pytest.raises(ValueError, match="already been signed or discarded"):
+        prepared.inject(bytes(64))
+
+
+def test_prepared_signature_survives_a_json_round_trip(tmp_path, pdf_path, private_key):
+    prepared = prepare_document(pdf_path, str(tmp_path / "signed.pdf"), "Tester", private_key.public_key())
+    restored = PreparedSignature.from_dict(json.loads(json.dumps(prepared.to_dict())))
+
+    assert vars(restored) == vars(prepared)
+    prepared.discard()
+
+
+@pytest.mark.parametrize("digest", [bytes(31), bytes(33), b"", "00" * 32])
+def test_digests_of_wrong_length_are_rejected(private_key, digest):
+    private_key_pem = private_key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8,
+                                                serialization.NoEncryption())
+    signer = DigestSigner(private_key_pem)
+
+    with pytest.raises(ValueError, match="Digest 1 is not a 32-byte"):
+        signer.sign_digests([bytes(32), digest])
+
+
+def test_signatures_are_injected_in_order(tmp_path, pdf_path, private_key):
+    prepared = [prepare_document(pdf_path, str(tmp_path / f"signed{index}.pdf"), f"Signer {index}",
+                                 private_key.public_key()) for index in range(2)]
+    signatures = DigestSigner(private_key).sign_digests([item.digest for item in prepared])
+    with pytest.raises(ValueError, match="Got 1 signatures for 2 documents"):
+        inject_signatures(prepared, signatures[:1])
+
+    paths = inject_signatures(prepared, signatures)
+
+    verifier = SignatureVerifier(private_key.public_key())
+    assert all(verifier.verify_signature(path)[0] for path in paths)
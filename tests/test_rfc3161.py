@@ -0,0 +1,89 @@
+import hashlib
+from datetime import timedelta
+import pytest
+from cryptography.hazmat.primitives import serialization
+from pades_signer.local_tsa import LocalTSA
+from pades_signer.rfc3161 import OID_ECDSA_WITH_SHA256, TimestampToken, algorithm_identifier, encode_generalized_time
+from pades_signer.timestamping import TimestampClient
+
+DIGEST = hashlib.sha256(b"signature").digest()
+
+
+@pytest.fixture(scope="module")
+def tsa():
+    return LocalTSA()
+
+
+def _tamper(der, original, replacement):
+    # The signer info follows the certificate, its values are the last occurrences
+    head, found, tail = der.rpartition(original)
+    assert found and len(original) == len(replacement)
+    return head + replacement + tail
+
+
+def test_valid_token(tsa):
+    token = TimestampToken(tsa.issue(DIGEST, nonce=42))
+    assert token.nonce == 42
+    assert token.verify(DIGEST, [tsa.certificate]) == token.gen_time
+    assert token.verify(DIGEST) == token.gen_time
+
+
+def test_wrong_imprint_is_rejected(tsa):
+    token = TimestampToken(tsa.issue(DIGEST))
+    with pytest.raises(ValueError, match="covers other data"):
+        token.verify(hashlib.sha256(b"other").digest(), [tsa.certificate])
+
+
+def test_wrong_nonce_is_rejected(tsa, monkeypatch):
+    issue = tsa.issue
+    monkeypatch.setattr(tsa, "issue", lambda digest, nonce=None, *args: issue(digest, nonce + 1, *args))
+    try:
+        with TimestampClient(tsa.serve(), certificates=[tsa.certificate]) as client:
+            with pytest.raises(ValueError, match="does not answer the request"):
+                client.timestamp(DIGEST)
+    finally:
+        tsa.shutdown()
+
+
+def test_tampered_signed_attributes_are_rejected(tsa):
+    der = tsa.issue(DIGEST)
+    certificate_hash = hashlib.sha256(tsa.certificate.public_bytes(serialization.Encoding.DER)).digest()
+    tampered = _tamper(der, certificate_hash, bytes(32))
+    with pytest.raises(ValueError, match="signature is invalid"):
+        TimestampToken(tampered).verify(DIGEST, [tsa.certificate])
+
+
+def test_tampered_content_is_rejected(tsa):
+    token = TimestampToken(tsa.issue(DIGEST))
+    earlier = token.gen_time - timedelta(minutes=1)
+    tampered = _tamper(token.der, encode_generalized_time(token.gen_time), encode_generalized_time(earlier))
+    with pytest.raises(ValueError, match="does not match its signature"):
+        TimestampToken(tampered).verify(DIGEST, [tsa.certificate])
+
+
+def test_signature_algorithm_must_match_the_key(tsa):
+    # ecdsa-with-SHA384 has the same encoded length as ecdsa-with-SHA256
+    ecdsa_sha384 = algorithm_identifier("1.2.840.10045.4.3.3", null_parameters=False)
+    ecdsa_sha256 = algorithm_identifier(OID_ECDSA_WITH_SHA256, null_parameters=False)
+    tampered = _tamper(tsa.issue(DIGEST), ecdsa_sha256, ecdsa_sha384)
+    with pytest.raises(ValueError, match="does not match the authority key"):
+        TimestampToken(tampered).verify(DIGEST, [tsa.certificate])
+
+
+def test_untrusted_certificate_is_rejected(tsa):
+    token = TimestampToken(tsa.issue(DIGEST))
+    with pytest.raises(ValueError, match="not trusted"):
+        token.verify(DIGEST, [LocalTSA().certificate])
+
+
+def test_truncated_token_is_rejected(tsa):
+    der = tsa.issue(DIGEST)
+    for length in range(len(der)):
+        with pytest.raises(ValueError):
+            TimestampToken(der[:length])
+
+
+@pytest.mark.parametrize("der", [b"", b"\x00", b"\x30\x03abc", b"\x30\x84\xff\xff\xff\xff", bytes(range(256))])
+def test_garbage_token_is_rejected(der):
+    with pytest.raises(ValueError):
+        TimestampToken(der)
@@ -0,0 +1,95 @@
+import pytest
+from PyPDF2 import PdfReader
+
+from pades_signer.incremental_update import TAIL_SIZE
+from pades_signer.pdf_signer import PDFSigner
+from pades_signer.signature_verifier import SignatureVerifier
+
+
+def append_update(pdf_path, content, padding=0):
+    """
+    Append an incremental update replacing the content of the first page.
+
+    Args:
+        pdf_path (str): Path to the document, modified in place.
+        content (bytes): New content stream of the page.
+        padding (int): Size of an unused stream added before the page, pushing earlier
+            objects out of the tail of the file (default: 0).
+    """
+    reader = PdfReader(pdf_path)
+    page_reference = reader.trailer["/Root"]["/Pages"].raw_get("/Kids")[0]
+    page = reader.pages[0]
+    size = int(reader.trailer["/Size"])
+    with open(pdf_path, "rb") as pdf_file:
+        data = pdf_file.read()
+    prev = int(data[data.rindex(b"startxref") + len(b"startxref"):].split()[0])
+
+    objects = {}
+    if padding:
+        objects[size + 1] = b"<< /Length %d >>\nstream\n" % padding + b"%" * padding + b"\nendstream"
+    objects[size] = b"<< /Length %d >>\nstream\n" % len(content) + content + b"\nendstream"
+    media_box = " ".join(str(value) for value in page.mediabox)
+    objects[page_reference.idnum] = (f"<< /Type /Page /Parent {page.raw_get('/Parent').idnum} 0 R "
+                                     f"/MediaBox [{media_box}] /Contents {size} 0 R >>").encode("ascii")
+
+    update = b"\n"
+    offsets = {}
+    for number in sorted(objects, reverse=True):
+        offsets[number] = len(data) + len(update)
+        update += b"%d 0 obj\n" % number + objects[number] + b"\nendobj\n"
+    xref_offset = len(data) + len(update)
+    update += b"xref\n"
+    for number in sorted(offsets):
+        update += b"%d 1\n%010d 00000 n \n" % (number, offsets[number])
+    root = reader.trailer.raw_get("/Root").idnum
+    update += (f"trailer\n<< /Size {max(objects) + 1} /Root {root} 0 R /Prev {prev} >>\n"
+               f"startxref\n{xref_offset}\n%%EOF\n").encode("ascii")
+    with open(pdf_path, "ab") as pdf_file:
+        pdf_file.write(update)
+
+
+@pytest.fixture
+def signed_path(tmp_path, pdf_path, private_key):
+    output_path = str(tmp_path / "signed.pdf")
+    PDFSigner(private_key).sign_document(pdf_path, output_path, "Tester", incremental=True)
+    return output_path
+
+
+def test_incremental_signature_is_valid(signed_path, private_key):
+    is_valid, message = SignatureVerifier(private_key.public_key()).verify_signature(signed_path)
+
+    assert is_valid, message
+
+
+def test_update_appended_after_signing_is_rejected(signed_path, private_key):
+    append_update(signed_path, b"BT /F1 12 Tf 10 10 Td (Pay 1000000) Tj ET")
+
+    assert PdfReader(signed_path).pages[0].get_contents().get_data().startswith(b"BT")
+    assert SignatureVerifier(private_key.public_key()).verify_signature(signed_path) == \
+        (False, "Document was modified after signing")
+
+
+def test_update_pushing_signature_out_of_the_tail_is_rejected(signed_path, private_key):
+    append_update(signed_path, b"BT (Pay 1000000) Tj ET", padding=TAIL_SIZE)
+
+    assert SignatureVerifier(private_key.public_key()).verify_signature(signed_path) == \
+        (False, "Document was modified after signing")
+
+
+def test_trailing_bytes_after_signing_are_rejected(signed_path, private_key):
+    with open(signed_path, "ab") as pdf_file:
+        pdf_file.write(b"\n% comment\n")
+
+    is_valid, message = SignatureVerifier(private_key.public_key()).verify_signature(signed_path)
+
+    assert not is_valid
+    assert message == "Document was modified after signing"
+
+
+def test_document_signed_again_is_valid(signed_path, private_key):
+    PDFSigner(private_key).sign_document(signed_path, signed_path, "Second", incremental=True)
+
+    is_valid, message = SignatureVerifier(private_key.public_key()).verify_signature(signed_path)
+
+    assert is_valid, message
+    assert "Second" in message
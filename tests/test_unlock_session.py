@@ -0,0 +1,83 @@
+import pytest
+
+from key_manager.key_generator import KeyGenerator
+from key_manager.unlock_session import UnlockSession
+
+PIN = "1234"
+
+
+class _Clock:
+    """
+    Manually advanced time source.
+    """
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def key_path(tmp_path):
+    key_generator = KeyGenerator("ed25519")
+    key_generator.generate_key_pair()
+    path = tmp_path / "private_key.key"
+    path.write_bytes(key_generator.encrypt_private_key(PIN))
+    return str(path)
+
+
+def test_key_is_handed_out_within_the_signature_budget(key_path):
+    session = UnlockSession(max_signatures=2)
+    session.unlock(key_path, PIN)
+    assert session.remaining_signatures == 2
+
+    private_key = session.acquire_key()
+    assert session.acquire_key() is private_key
+    assert session.remaining_signatures == 0
+    assert not session.is_unlocked
+    with pytest.raises(ValueError, match="locked"):
+        session.acquire_key()
+
+
+def test_key_is_wiped_when_the_session_expires(key_path):
+    clock = _Clock()
+    session = UnlockSession(max_age=60, max_signatures=None, clock=clock)
+    session.unlock(key_path, PIN)
+    assert session.remaining_signatures is None
+
+    clock.now = 59.9
+    assert session.public_key is not None
+    clock.now = 60
+    assert session.public_key is None
+    with pytest.raises(ValueError, match="locked"):
+        session.acquire_key()
+
+
+def test_key_is_wiped_when_the_drive_is_removed(tmp_path, key_path):
+    session = UnlockSession()
+    session.unlock(key_path, PIN)
+    session.check_device([str(tmp_path)])
+    assert session.is_unlocked
+
+    session.check_device([])
+    assert not session.is_unlocked
+
+
+def test_key_is_wiped_when_the_key_file_disappears(tmp_path, key_path):
+    session = UnlockSession()
+    session.unlock(key_path, PIN)
+    (tmp_path / "private_key.key").unlink()
+
+    assert not session.is_unlocked
+
+
+def test_wrong_pin_leaves_the_session_locked(key_path):
+    session = UnlockSession()
+    with pytest.raises(ValueError):
+        session.unlock(key_path, "0000")
+    assert not session.is_unlocked
+
+    session.unlock(key_path, PIN)
+    session.lock()
+    assert not session.is_unlocked
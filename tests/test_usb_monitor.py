@@ -0,0 +1,71 @@
+import pytest
+
+from key_manager import usb_storage
+from key_manager.usb_storage import UsbMonitor, UsbStorage
+
+
+class _FakeUdevMonitor:
+    """
+    Stand-in pyudev monitor returning queued events, None once they are used up.
+    """
+
+    def __init__(self, events):
+        self.events = list(events)
+
+    def poll(self, timeout=None):
+        return self.events.pop(0) if self.events else None
+
+
+@pytest.fixture
+def drives(monkeypatch):
+    """
+    Successive results of UsbStorage.get_usb_drives, the last one repeats.
+    """
+    results = []
+
+    def get_usb_drives():
+        return results.pop(0) if len(results) > 1 else results[0]
+
+    monkeypatch.setattr(UsbStorage, "get_usb_drives", staticmethod(get_usb_drives))
+    monkeypatch.setattr(usb_storage.time, "sleep", lambda seconds: None)
+    # Without udev the monitor polls, tests hand it fake udev monitors explicitly
+    monkeypatch.setattr(usb_storage.platform, "system", lambda: "Windows")
+    return results
+
+
+def test_polling_reports_a_stable_change(drives):
+    drives.extend([["/media/a"], ["/media/a"]])
+    monitor = UsbMonitor()
+
+    assert not monitor.event_driven
+    assert monitor.wait_for_change([]) == ["/media/a"]
+
+
+def test_polling_ignores_an_unchanged_or_unstable_list(drives):
+    drives.extend([["/media/a"], ["/media/a", "/media/b"], ["/media/a"]])
+    monitor = UsbMonitor()
+
+    assert monitor.wait_for_change(["/media/a"]) is None
+    # The new drive disappeared again within the debounce period
+    assert monitor.wait_for_change(["/media/a"]) is None
+
+
+def test_burst_of_events_enumerates_drives_once(drives):
+    drives.extend([["/media/a"], ["/media/b"]])
+    monitor = UsbMonitor()
+    monitor._monitor = _FakeUdevMonitor(["add", "change", "add"])
+
+    assert monitor.event_driven
+    assert monitor.wait_for_change([]) == ["/media/a"]
+    assert monitor._monitor.events == []
+    # No further event, nothing is enumerated
+    assert monitor.wait_for_change(["/media/a"]) is None
+    assert drives == [["/media/b"]]
+
+
+def test_events_without_a_change_are_not_reported(drives):
+    drives.append(["/media/a"])
+    monitor = UsbMonitor()
+    monitor._monitor = _FakeUdevMonitor(["change"])
+
+    assert monitor.wait_for_change(["/media/a"]) is None
@@ -0,0 +1,36 @@
+from pades_signer.verification_cache import VerificationCache
+
+
+def _verify(cache, path):
+    document, result = cache.lookup(path, "fingerprint")
+    if result is None:
+        cache.store(document, (True, "Signature valid!"))
+
+
+def test_eviction_removes_unreferenced_file_hashes(tmp_path):
+    with VerificationCache(str(tmp_path / "cache.sqlite"), max_entries=3) as cache:
+        for index in range(10):
+            path = tmp_path / f"document{index}.pdf"
+            path.write_bytes(b"%%PDF-1.4 %d" % index)
+            _verify(cache, str(path))
+
+        stats = cache.stats()
+
+    assert stats["entries"] == 3
+    assert stats["files"] == 3
+    assert stats["evicted"] == 7
+
+
+def test_every_file_of_an_evicted_result_is_removed(tmp_path):
+    with VerificationCache(str(tmp_path / "cache.sqlite"), max_entries=1) as cache:
+        first, second = tmp_path / "a.pdf", tmp_path / "b.pdf"
+        first.write_bytes(b"%PDF-1.4 same")
+        second.write_bytes(b"%PDF-1.4 same")
+        _verify(cache, str(first))
+        _verify(cache, str(second))
+        other = tmp_path / "c.pdf"
+        other.write_bytes(b"%PDF-1.4 other")
+        _verify(cache, str(other))
+
+        assert cache.stats()["files"] == 1
+        assert cache.lookup(str(other), "fingerprint")[1] == (True, "Signature valid!")